@@ -1,7 +1,9 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import text
 from datetime import datetime, timedelta
+import threading
+import time
 import jwt
 from db import engine
 from security import verify_password
@@ -11,7 +13,51 @@ SECRET_KEY = "CHANGE_THIS_SECRET"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480
 
+# get_current_user keeps user rows this long per process. Endpoints that
+# change a user call invalidate_user(); other worker processes pick the
+# change up once their entry expires, so a disabled user is locked out
+# within this many seconds everywhere.
+USER_CACHE_TTL_SECONDS = 30
+
+# Download links (e.g. /export/zip) are opened by the browser itself so
+# the file streams to disk, which can't send an Authorization header;
+# they carry a short-lived token that is only good for downloads
+DOWNLOAD_TOKEN_EXPIRE_SECONDS = 60
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/login", auto_error=False)
+
+_user_cache: dict = {}
+_user_cache_lock = threading.Lock()
+
+
+def invalidate_user(user_id: int):
+    """Drop a cached user row — call after the change has committed."""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+
+def _load_user(user_id):
+    now = time.monotonic()
+    with _user_cache_lock:
+        hit = _user_cache.get(user_id)
+        if hit and hit[0] > now:
+            return hit[1]
+
+    with engine.begin() as conn:
+        user = conn.execute(
+            text("""
+                SELECT id, email, role, is_active
+                FROM users
+                WHERE id = :id
+            """),
+            {"id": user_id}
+        ).mappings().first()
+
+    user = dict(user) if user else None
+    with _user_cache_lock:
+        _user_cache[user_id] = (now + USER_CACHE_TTL_SECONDS, user)
+    return user
 
 def authenticate_user(email: str, password: str):
 
@@ -44,26 +90,31 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+def create_download_token(user: dict) -> str:
+    expire = datetime.utcnow() + timedelta(seconds=DOWNLOAD_TOKEN_EXPIRE_SECONDS)
+    return jwt.encode(
+        {"user_id": user["id"], "scope": "download", "exp": expire},
+        SECRET_KEY, algorithm=ALGORITHM
+    )
+
+
+def _user_from_token(token: str, scope: str = None) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("user_id")
-        role = payload.get("role")
     except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
 
-    with engine.begin() as conn:
-        user = conn.execute(
-            text("""
-                SELECT id, email, role, is_active
-                FROM users
-                WHERE id = :id
-            """),
-            {"id": user_id}
-        ).mappings().first()
+    if payload.get("scope") != scope:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token"
+        )
+
+    user = _load_user(user_id)
 
     if not user or not user["is_active"]:
         raise HTTPException(
@@ -71,4 +122,27 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
             detail="User inactive or not found"
         )
 
-    return user
+    return dict(user)
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)):
+    return _user_from_token(token)
+
+
+def get_download_user(
+    token: str | None = Query(None),
+    bearer: str | None = Depends(oauth2_scheme_optional)
+):
+    """
+    get_current_user for download endpoints: a bearer header, or a
+    ?token= from create_download_token.
+    """
+    if token:
+        return _user_from_token(token, scope="download")
+    if bearer:
+        return _user_from_token(bearer)
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
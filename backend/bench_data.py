@@ -0,0 +1,141 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+# Synthetic contact sheets for the benchmark scripts. Files look like real
+# uploads: Title Case headers, messy and compound phone cells, exact
+# duplicate rows, and accented names so latin1 files hit the CSV
+# encoding fallback.
+
+FIRST_NAMES = (
+    "Aarav", "Priya", "José", "Zoë", "Renée", "Jürgen", "Ñuño", "Amélie",
+    "Rahul", "Fatima", "Chloé", "Björn", "Ana", "Kiran", "Noël", "Meera",
+)
+LAST_NAMES = (
+    "Sharma", "García", "Müller", "Núñez", "Patel", "Lefèvre", "Khan",
+    "Øster", "Iyer", "Dubois", "Rossi", "Çelik", "Singh", "Brontë",
+)
+CITIES = (
+    "Mumbai", "Delhi", "São Paulo", "Zürich", "Kraków", "Montréal",
+    "Chennai", "Málaga", "Pune", "Reykjavík",
+)
+EMAIL_DOMAINS = ("example.com", "mail.test", "corp.example", "inbox.test")
+
+BASE_COLUMNS = ("Name", "Email", "Phone", "City")
+
+
+def identities(count: int, seed: int = 0, prefix: str = "") -> pd.DataFrame:
+    """
+    count distinct people (name, email, 10-digit phone). Emails carry
+    prefix and a running number so pools built with different prefixes
+    never collide.
+    """
+    rng = np.random.default_rng(seed)
+    first = rng.choice(FIRST_NAMES, count)
+    last = rng.choice(LAST_NAMES, count)
+    domain = rng.choice(EMAIL_DOMAINS, count)
+    lead = rng.integers(6, 10, count)
+    rest = rng.integers(0, 10**9, count)
+
+    return pd.DataFrame({
+        "name": [f"{f} {l}" for f, l in zip(first, last)],
+        "email": [
+            f"{prefix}{f.lower()}.{i}@{d}"
+            for i, (f, d) in enumerate(zip(first, domain))
+        ],
+        "phone": [f"{a}{b:09d}" for a, b in zip(lead, rest)],
+    })
+
+
+def _messy_phone(phone: str, style: int) -> str:
+    if style == 0:
+        return f"+91 {phone[:5]} {phone[5:]}"
+    if style == 1:
+        return f"({phone[:3]}) {phone[3:6]}-{phone[6:]}"
+    if style == 2:
+        return f"{phone[:5]}-{phone[5:]}"
+    if style == 3:
+        return f"0{phone}"
+    return f"  {phone}  "
+
+
+def _compound_phone(phone: str, other: str, style: int) -> str:
+    if style == 0:
+        # Two numbers in one cell, e.g. 9858543575/8568523147
+        return f"{phone}/{other}"
+    if style == 1:
+        return f"{phone}, {other}"
+    # Halves of a number, e.g. 98585/85685 — neither part is a valid phone
+    return f"{phone[:5]}/{phone[5:]}"
+
+
+def synthetic_frame(rows: int, cols: int = 6, dup_rate: float = 0.1,
+                    messy_rate: float = 0.3, compound_rate: float = 0.05,
+                    blank_rate: float = 0.02, seed: int = 0,
+                    pool: pd.DataFrame = None, overlap: float = 0.0,
+                    prefix: str = "") -> pd.DataFrame:
+    """
+    A sheet of `rows` rows and max(cols, 4) columns.
+
+    dup_rate       share of rows that exactly repeat an earlier row
+    messy_rate     share of phones written with spaces, dashes, +91, ...
+    compound_rate  share of phone cells holding two numbers or split halves
+    blank_rate     share of empty email / phone cells
+    pool/overlap   share of people drawn from a shared identities() pool,
+                   so several files have cross-file matches
+    """
+    rng = np.random.default_rng(seed)
+    distinct = max(rows - int(rows * dup_rate), 1)
+
+    shared = int(distinct * overlap) if pool is not None and len(pool) else 0
+    people = identities(distinct - shared, seed=seed + 1, prefix=prefix or f"s{seed}.")
+    if shared:
+        picks = rng.integers(0, len(pool), shared)
+        people = pd.concat(
+            [pool.iloc[picks].reset_index(drop=True), people], ignore_index=True
+        )
+
+    phones = people["phone"].tolist()
+    emails = people["email"].tolist()
+
+    roll = rng.random(distinct)
+    styles = rng.integers(0, 5, distinct)
+    others = rng.integers(0, distinct, distinct)
+    for i in range(distinct):
+        if roll[i] < compound_rate:
+            phones[i] = _compound_phone(phones[i], people["phone"].iat[others[i]], styles[i] % 3)
+        elif roll[i] < compound_rate + messy_rate:
+            phones[i] = _messy_phone(phones[i], styles[i])
+            if styles[i] == 0:
+                emails[i] = f" {emails[i].upper()} "
+
+    blank_phone = rng.random(distinct) < blank_rate
+    blank_email = rng.random(distinct) < blank_rate
+    data = {
+        "Name": people["name"],
+        "Email": pd.Series(emails).where(~blank_email, None),
+        "Phone": pd.Series(phones).where(~blank_phone, None),
+        "City": rng.choice(CITIES, distinct),
+    }
+    for n in range(len(BASE_COLUMNS) + 1, cols + 1):
+        data[f"Col {n}"] = [f"v{x}" for x in rng.integers(0, 10**6, distinct)]
+    df = pd.DataFrame(data)
+
+    if rows > distinct:
+        repeats = df.iloc[rng.integers(0, distinct, rows - distinct)]
+        df = pd.concat([df, repeats], ignore_index=True)
+        df = df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+    return df
+
+
+def to_bytes(df: pd.DataFrame, fmt: str = "csv", encoding: str = "utf-8") -> bytes:
+    """Serialize like a user's upload: csv in the given encoding, or xlsx."""
+    if fmt == "csv":
+        return df.to_csv(index=False).encode(encoding, errors="replace")
+    if fmt == "xlsx":
+        buf = io.BytesIO()
+        with pd.ExcelWriter(buf, engine="xlsxwriter") as writer:
+            df.to_excel(writer, index=False)
+        return buf.getvalue()
+    raise ValueError(f"Unsupported format: {fmt}")
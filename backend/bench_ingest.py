@@ -0,0 +1,203 @@
+"""
+Ingestion benchmark. Generates a synthetic file, runs it through
+_process_file_sync and _build_cache_for_upload against the configured
+database, and prints per-stage rows/sec and peak RSS as JSON.
+
+Run from backend/:
+
+    python bench_ingest.py --rows 100000 500000 --format csv --encoding latin1 \
+        --output bench-ingest.json
+    python bench_ingest.py --rows 100000 --compare bench-ingest.json
+
+The benchmark inserts a throwaway upload_log row per run (no owner, no
+category) and removes it and its rows afterwards unless --keep is given.
+"""
+import argparse
+import contextlib
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import text
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import bench_data
+import purge
+from db import engine
+from main import _process_file_sync, _build_cache_for_upload
+from profiling import StageTimer, current_rss
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def process_peak_rss_mb() -> float:
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    return round(peak / 1024, 1)
+
+
+def _create_upload(upload_id: int, filename: str):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO upload_log
+                (upload_id, filename, status, processing_status, header_status)
+            VALUES (:uid, :f, 'PROCESSING', 'processing', 'no_issue')
+        """), {"uid": upload_id, "f": filename})
+
+
+def _drop_upload(upload_id: int):
+    with engine.begin() as conn:
+        for table in purge.PURGE_TABLES + purge.PURGE_SIDE_TABLES:
+            conn.execute(
+                text(f"DELETE FROM {table} WHERE upload_id = :uid"), {"uid": upload_id}
+            )
+        conn.execute(
+            text("DELETE FROM upload_log WHERE upload_id = :uid"), {"uid": upload_id}
+        )
+
+
+def run_once(args, rows: int, seed: int) -> dict:
+    df = bench_data.synthetic_frame(
+        rows, cols=args.cols, dup_rate=args.dup_rate,
+        messy_rate=args.messy_rate, compound_rate=args.compound_rate,
+        seed=seed
+    )
+    contents = bench_data.to_bytes(df, args.format, args.encoding)
+    del df
+
+    upload_id = int(time.time() * 1_000_000)
+    filename = f"bench_{upload_id}.{args.format}"
+    _create_upload(upload_id, filename)
+
+    timer = StageTimer(sample_rss=True)
+    rss_before = current_rss()
+    try:
+        start = time.perf_counter()
+        total, duplicates = _process_file_sync(contents, filename, upload_id, timer)
+        if not args.skip_cache:
+            with timer.stage("cache", rows=total - duplicates):
+                _build_cache_for_upload(upload_id)
+        seconds = time.perf_counter() - start
+    finally:
+        if not args.keep:
+            _drop_upload(upload_id)
+
+    stages = timer.report()
+    peaks = [s["peak_rss_mb"] for s in stages.values() if s["peak_rss_mb"]]
+    return {
+        "rows": rows,
+        "seed": seed,
+        "file_bytes": len(contents),
+        "upload_id": upload_id if args.keep else None,
+        "total_records": total,
+        "duplicate_records": duplicates,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(total / seconds, 1) if seconds else None,
+        "rss_before_mb": round(rss_before / 1024 / 1024, 1),
+        "peak_rss_mb": max(peaks) if peaks else None,
+        "stages": stages,
+    }
+
+
+def compare(old: dict, new: dict):
+    """Print rows/sec per stage for runs of the same size in both reports."""
+    old_runs = {r["rows"]: r for r in old.get("runs", [])}
+    print(f"{'rows':>10} {'stage':<10} {'old r/s':>12} {'new r/s':>12} {'ratio':>7}"
+          f" {'old MB':>8} {'new MB':>8}", file=sys.stderr)
+    for run in new["runs"]:
+        before = old_runs.get(run["rows"])
+        if not before:
+            continue
+        for name in ["total"] + list(run["stages"]):
+            a = before if name == "total" else before["stages"].get(name)
+            b = run if name == "total" else run["stages"][name]
+            if not a:
+                continue
+            ratio = (
+                f"{b['rows_per_sec'] / a['rows_per_sec']:.2f}"
+                if a["rows_per_sec"] and b["rows_per_sec"] else "-"
+            )
+            print(f"{run['rows']:>10} {name:<10} {a['rows_per_sec'] or '-':>12}"
+                  f" {b['rows_per_sec'] or '-':>12} {ratio:>7}"
+                  f" {a['peak_rss_mb'] or '-':>8} {b['peak_rss_mb'] or '-':>8}",
+                  file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upload ingestion")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--cols", type=int, default=8)
+    parser.add_argument("--dup-rate", type=float, default=0.1)
+    parser.add_argument("--messy-rate", type=float, default=0.3)
+    parser.add_argument("--compound-rate", type=float, default=0.05)
+    parser.add_argument("--format", choices=("csv", "xlsx"), default="csv")
+    parser.add_argument("--encoding", choices=("utf-8", "latin1"), default="utf-8")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="runs per size (seed changes each run)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-cache", action="store_true",
+                        help="do not time the related-groups cache build")
+    parser.add_argument("--keep", action="store_true",
+                        help="leave the benchmark uploads in the database")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "ingest",
+        "commit": git_commit(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "params": {
+            "cols": args.cols, "dup_rate": args.dup_rate,
+            "messy_rate": args.messy_rate, "compound_rate": args.compound_rate,
+            "format": args.format, "encoding": args.encoding,
+            "cache": not args.skip_cache,
+        },
+        "runs": [],
+    }
+    for rows in args.rows:
+        for i in range(args.repeat):
+            # The pipeline prints [SYNC] lines; keep stdout for the report
+            with contextlib.redirect_stdout(sys.stderr):
+                run = run_once(args, rows, args.seed + i)
+            print(f"[BENCH] {rows:,} rows: {run['rows_per_sec']:,} rows/s, "
+                  f"peak {run['peak_rss_mb']} MB", file=sys.stderr)
+            report["runs"].append(run)
+    report["process_peak_rss_mb"] = process_peak_rss_mb()
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out)
+    else:
+        print(out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""
+Load test. Drives a running instance with scripted sessions of uploaders
+(login, several uploads at once, follow /upload-progress over SSE until
+they are ready) and browsers (login, /uploads, /preview paging,
+related-all browsing) and reports throughput, error rate, latency
+percentiles per operation and the server's DB pool wait and ingestion
+queue as JSON.
+
+Start the server first, then run from backend/ against the same database:
+
+    uvicorn main:app --port 8000
+    python bench_load.py --uploaders 4 --browsers 20 --duration 120 \
+        --output bench-load.json
+    python bench_load.py --uploaders 8 --browsers 40 --compare bench-load.json
+
+Sessions log in as throwaway users seeded in the database (browsers get
+--browse-uploads ready uploads each); everything is removed afterwards
+unless --keep is given. Pool and queue figures come from /metrics, which
+is per worker process: run the server with a single worker.
+"""
+import argparse
+import contextlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+import httpx
+
+import bench_data
+from bench_ingest import git_commit
+from bench_queries import create_owner, seed_uploads, unseed
+from profiling import percentile
+from progress import TERMINAL_STATUSES
+
+_SAMPLE_RE = re.compile(r"^([a-zA-Z_:][\w:]*)(\{[^}]*\})?\s+(\S+)$")
+
+
+class Recorder:
+    """Latency and outcome of every request, per operation."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, op: str, ms: float, ok: bool):
+        with self.lock:
+            self.samples.setdefault(op, []).append((ms, ok))
+
+    def call(self, op: str, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            res = fn(*args, **kwargs)
+        except httpx.HTTPError:
+            self.add(op, (time.perf_counter() - start) * 1000, False)
+            return None
+        self.add(op, (time.perf_counter() - start) * 1000, res.status_code < 400)
+        return res
+
+
+# ---------------- SERVER METRICS ----------------
+def scrape(client: httpx.Client) -> dict:
+    """/metrics as {name{labels}: value}."""
+    try:
+        body = client.get("/metrics").text
+    except httpx.HTTPError:
+        return {}
+    samples = {}
+    for line in body.splitlines():
+        m = _SAMPLE_RE.match(line)
+        if m:
+            samples[m.group(1) + (m.group(2) or "")] = float(m.group(3))
+    return samples
+
+
+def pool_wait(before: dict, after: dict) -> dict:
+    """Checkouts and wait during the run, from the pool histogram deltas."""
+    name = "datavault_db_pool_checkout_wait_seconds"
+    delta = lambda key: after.get(key, 0) - before.get(key, 0)
+    checkouts = delta(f"{name}_count")
+    if not checkouts:
+        return {"checkouts": 0, "mean_ms": None, "p95_ms_le": None, "p99_ms_le": None}
+
+    buckets = sorted(
+        (float(re.search(r'le="([^"]+)"', key).group(1)), delta(key))
+        for key in after if key.startswith(f"{name}_bucket")
+    )
+
+    def bound(pct):
+        # Upper bound of the first bucket holding pct% of the checkouts
+        for le, count in buckets:
+            if count >= checkouts * pct / 100:
+                return None if le == float("inf") else round(le * 1000, 1)
+        return None
+
+    return {
+        "checkouts": int(checkouts),
+        "mean_ms": round(delta(f"{name}_sum") / checkouts * 1000, 2),
+        "p95_ms_le": bound(95),
+        "p99_ms_le": bound(99),
+    }
+
+
+class ServerSampler:
+    """Polls /metrics once a second and keeps the highest pool/queue readings."""
+
+    GAUGES = {
+        "pool_checked_out": "datavault_db_pool_checked_out",
+        "ingest_queue_depth": "datavault_ingest_queue_depth",
+        "ingest_workers_busy": "datavault_ingest_workers_busy",
+    }
+
+    def __init__(self, client: httpx.Client):
+        self.client = client
+        self.peaks = {k: 0 for k in self.GAUGES}
+        self.workers = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(1.0):
+            samples = scrape(self.client)
+            self.workers = samples.get("datavault_ingest_workers", self.workers)
+            for key, metric in self.GAUGES.items():
+                self.peaks[key] = max(self.peaks[key], samples.get(metric, 0))
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        return {
+            "ingest_workers": self.workers,
+            **{f"max_{k}": int(v) for k, v in self.peaks.items()},
+        }
+
+
+# ---------------- SESSIONS ----------------
+def login(client: httpx.Client, rec: Recorder, ctx: dict) -> bool:
+    res = rec.call("login", client.post, "/login", data={
+        "username": f"bench.{ctx['stamp']}@bench.test",
+        "password": str(ctx["stamp"]),
+    })
+    if res is None or res.status_code != 200:
+        return False
+    client.headers["Authorization"] = f"Bearer {res.json()['access_token']}"
+    ctx["token"] = res.json()["access_token"]
+    return True
+
+
+def follow_progress(client: httpx.Client, ctx: dict, done: dict, stop: threading.Event):
+    """
+    Reads the user's SSE stream and stamps done[upload_id] when an upload
+    reaches a terminal status.
+    """
+    while not stop.is_set():
+        try:
+            with client.stream("GET", "/upload-progress",
+                               params={"token": ctx["token"]},
+                               timeout=httpx.Timeout(10.0, read=None)) as res:
+                for line in res.iter_lines():
+                    if stop.is_set():
+                        return
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    if event["status"] in TERMINAL_STATUSES:
+                        done.setdefault(
+                            event["upload_id"],
+                            (time.perf_counter(), event["status"])
+                        )
+        except Exception:
+            # Also raised when the uploader closes the client under us
+            if stop.is_set():
+                return
+            time.sleep(1)
+
+
+def uploader(base_url: str, ctx: dict, files: list, args, rec: Recorder,
+             deadline: float):
+    """
+    Rounds of args.files_per_round uploads posted back to back; each round
+    waits until the SSE stream reports all of them finished.
+    """
+    with httpx.Client(base_url=base_url, timeout=args.timeout) as client:
+        if not login(client, rec, ctx):
+            return
+        done = {}
+        stop = threading.Event()
+        sse = threading.Thread(
+            target=follow_progress, args=(client, ctx, done, stop), daemon=True
+        )
+        sse.start()
+
+        n = 0
+        while time.monotonic() < deadline:
+            posted = {}
+            for _ in range(args.files_per_round):
+                contents = random.choice(files)
+                n += 1
+                start = time.perf_counter()
+                res = rec.call(
+                    "upload", client.post, "/upload",
+                    params={"category_id": ctx["category_id"]},
+                    files={"file": (f"load_{ctx['stamp']}_{n}.csv", contents, "text/csv")},
+                )
+                if res is not None and res.status_code == 200 and res.json().get("success"):
+                    upload_id = res.json()["upload_id"]
+                    ctx["upload_ids"].append(upload_id)
+                    posted[upload_id] = start
+
+            # Keep waiting past the deadline so nothing is removed mid-ingest
+            wait_until = time.monotonic() + args.drain_timeout
+            while (any(uid not in done for uid in posted)
+                   and time.monotonic() < wait_until):
+                time.sleep(0.2)
+            for uid, start in posted.items():
+                finished, status = done.get(uid, (None, None))
+                if finished is None:
+                    rec.add("ingest", args.drain_timeout * 1000, False)
+                else:
+                    rec.add("ingest", (finished - start) * 1000, status == "done")
+        stop.set()
+
+
+def browser(base_url: str, ctx: dict, args, rec: Recorder, deadline: float):
+    """Lists uploads, pages through a preview, then the related-all views."""
+    with httpx.Client(base_url=base_url, timeout=args.timeout) as client:
+        if not login(client, rec, ctx):
+            return
+        while time.monotonic() < deadline:
+            rec.call("uploads", client.get, "/uploads")
+            upload_id = random.choice(ctx["upload_ids"] or [None])
+            for page in range(1, args.preview_pages + 1 if upload_id else 1):
+                rec.call("preview", client.get, "/preview",
+                         params={"upload_id": upload_id, "page": page})
+                time.sleep(random.uniform(0, args.think))
+            rec.call("related-all-stats", client.get, "/related-all-stats")
+            for page in range(1, args.related_pages + 1):
+                rec.call("related-grouped-all", client.get, "/related-grouped-all",
+                         params={"page": page})
+                time.sleep(random.uniform(0, args.think))
+            rec.call("related-by-file", client.get, "/related-by-file")
+            time.sleep(random.uniform(0, args.think))
+
+
+# ---------------- REPORT ----------------
+def summarize(rec: Recorder, seconds: float) -> dict:
+    ops = {}
+    total = errors = 0
+    for op, samples in sorted(rec.samples.items()):
+        latencies = [ms for ms, _ in samples]
+        failed = sum(1 for _, ok in samples if not ok)
+        ops[op] = {
+            "count": len(samples),
+            "errors": failed,
+            "per_sec": round(len(samples) / seconds, 2),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "max_ms": round(max(latencies), 1),
+        }
+        # "ingest" is time to ready, not a request of its own
+        if op != "ingest":
+            total += len(samples)
+            errors += failed
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else None,
+        "requests_per_sec": round(total / seconds, 2),
+        "operations": ops,
+    }
+
+
+def compare(old: dict, new: dict):
+    """Print throughput and p50/p95 per operation next to an earlier report."""
+    print(f"{'operation':<22} {'old rps':>9} {'new rps':>9} {'old p50':>9}"
+          f" {'new p50':>9} {'old p95':>9} {'new p95':>9}", file=sys.stderr)
+    for op, b in new["operations"].items():
+        a = old.get("operations", {}).get(op)
+        if not a:
+            continue
+        print(f"{op:<22} {a['per_sec']:>9} {b['per_sec']:>9} {a['p50_ms']:>9}"
+              f" {b['p50_ms']:>9} {a['p95_ms']:>9} {b['p95_ms']:>9}", file=sys.stderr)
+    print(f"{'error rate':<22} {old.get('error_rate')} -> {new['error_rate']}",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a running instance")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--uploaders", type=int, default=4)
+    parser.add_argument("--browsers", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=60,
+                        help="seconds to start new work for")
+    parser.add_argument("--upload-rows", type=int, nargs="+", default=[20_000, 200_000],
+                        help="row counts of the files uploaders pick from")
+    parser.add_argument("--files-per-round", type=int, default=3)
+    parser.add_argument("--browse-uploads", type=int, default=3,
+                        help="ready uploads seeded for each browser")
+    parser.add_argument("--browse-rows", type=int, default=20_000)
+    parser.add_argument("--preview-pages", type=int, default=5)
+    parser.add_argument("--related-pages", type=int, default=3)
+    parser.add_argument("--think", type=float, default=0.5,
+                        help="max random pause between browser requests")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--drain-timeout", type=float, default=600,
+                        help="max seconds to wait for uploads to finish")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true",
+                        help="leave the seeded users and uploads in the database")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    files = [
+        bench_data.to_bytes(bench_data.synthetic_frame(rows, seed=args.seed + i))
+        for i, rows in enumerate(args.upload_rows)
+    ]
+
+    up_ctx = [create_owner() for _ in range(args.uploaders)]
+    br_ctx = [create_owner() for _ in range(args.browsers)]
+    try:
+        print(f"[LOAD] Seeding {args.browsers} browsers x {args.browse_uploads} "
+              f"uploads...", file=sys.stderr)
+        with contextlib.redirect_stdout(sys.stderr):
+            for ctx in br_ctx:
+                seed_uploads(ctx, args.browse_uploads, args.browse_rows,
+                             overlap=0.3, dup_rate=0.1)
+
+        rec = Recorder()
+        with httpx.Client(base_url=args.base_url, timeout=args.timeout) as probe:
+            before = scrape(probe)
+            sampler = ServerSampler(probe)
+            sampler.start()
+
+            print(f"[LOAD] {args.uploaders} uploaders, {args.browsers} browsers "
+                  f"for {args.duration:.0f}s against {args.base_url}", file=sys.stderr)
+            started = time.perf_counter()
+            deadline = time.monotonic() + args.duration
+            threads = [
+                threading.Thread(target=uploader, args=(
+                    args.base_url, ctx, files, args, rec, deadline
+                )) for ctx in up_ctx
+            ] + [
+                threading.Thread(target=browser, args=(
+                    args.base_url, ctx, args, rec, deadline
+                )) for ctx in br_ctx
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            seconds = time.perf_counter() - started
+
+            server = sampler.stop()
+            server["db_pool_wait"] = pool_wait(before, scrape(probe))
+    finally:
+        if not args.keep:
+            for ctx in up_ctx + br_ctx:
+                unseed(ctx)
+
+    report = {
+        "benchmark": "load",
+        "commit": git_commit(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            k: getattr(args, k) for k in (
+                "uploaders", "browsers", "duration", "upload_rows",
+                "files_per_round", "browse_uploads", "browse_rows",
+                "preview_pages", "related_pages", "think",
+            )
+        },
+        "seconds": round(seconds, 1),
+        **summarize(rec, seconds),
+        "server": server,
+    }
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out)
+    else:
+        print(out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
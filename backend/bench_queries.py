@@ -0,0 +1,287 @@
+"""
+Query benchmark. Seeds a throwaway user with N uploads of M rows whose
+people partly overlap across files, then calls the related-duplicates,
+/search and /preview endpoints through FastAPI's TestClient and reports
+p50/p95 latency and SQL statements per request as JSON.
+
+Run from backend/ (needs httpx for the TestClient):
+
+    python bench_queries.py --scales 5x20000 20x50000 --overlap 0.3 \
+        --output bench-queries.json
+    python bench_queries.py --scales 5x20000 --compare bench-queries.json
+
+Each scale is seeded through the real ingestion path and removed again
+afterwards unless --keep is given.
+"""
+import argparse
+import contextlib
+import json
+import sys
+import time
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+import bench_data
+import category_groups
+import purge
+import querylog
+import stats
+from auth import create_access_token
+from bench_ingest import git_commit
+from db import engine
+from main import app, _process_file_sync, _build_cache_for_upload
+from profiling import percentile
+from security import hash_password
+
+
+def parse_scale(value: str) -> tuple:
+    try:
+        uploads, rows = value.lower().split("x")
+        return int(uploads), int(rows)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected UPLOADSxROWS, got {value!r}")
+
+
+# ---------------- SEED ----------------
+def create_owner() -> dict:
+    stamp = int(time.time() * 1_000_000)
+    with engine.begin() as conn:
+        user_id = conn.execute(text("""
+            INSERT INTO users (email, password_hash, role, is_active)
+            VALUES (:e, :p, 'user', TRUE)
+            RETURNING id
+        """), {"e": f"bench.{stamp}@bench.test", "p": hash_password(str(stamp))}).scalar()
+        category_id = conn.execute(text("""
+            INSERT INTO categories (name, created_by_user_id)
+            VALUES (:n, :uid)
+            RETURNING id
+        """), {"n": f"bench {stamp}", "uid": user_id}).scalar()
+        stats.users_changed(conn, total=1, active=1)
+    return {
+        "stamp": stamp, "user_id": user_id, "category_id": category_id,
+        "upload_ids": []
+    }
+
+
+def seed_uploads(ctx: dict, uploads: int, rows: int, overlap: float,
+                 dup_rate: float):
+    """Ingest `uploads` synthetic CSVs for ctx's user, all in one category."""
+    pool = bench_data.identities(rows, seed=ctx["stamp"] % 10_000, prefix="pool.")
+    for i in range(uploads):
+        upload_id = ctx["stamp"] + i + 1
+        filename = f"bench_{upload_id}.csv"
+        df = bench_data.synthetic_frame(
+            rows, dup_rate=dup_rate, seed=i, pool=pool, overlap=overlap,
+            prefix=f"u{i}."
+        )
+        contents = bench_data.to_bytes(df)
+        del df
+
+        with engine.begin() as conn:
+            before = conn.execute(text(f"""
+                INSERT INTO upload_log
+                    (upload_id, category_id, filename, status,
+                     processing_status, created_by_user_id, header_status)
+                VALUES (:uid, :cid, :f, 'PROCESSING', 'processing', :user_id, 'no_issue')
+                RETURNING {stats.UPLOAD_STATS_COLUMNS}
+            """), {"uid": upload_id, "cid": ctx["category_id"], "f": filename,
+                   "user_id": ctx["user_id"]}).fetchone()
+            stats.upload_added(conn, before._mapping)
+        ctx["upload_ids"].append(upload_id)
+
+        total, duplicates = _process_file_sync(contents, filename, upload_id)
+        with engine.begin() as conn:
+            after = conn.execute(text(f"""
+                UPDATE upload_log
+                SET total_records = :t, duplicate_records = :d,
+                    status = 'SUCCESS', processing_status = 'ready'
+                WHERE upload_id = :uid
+                RETURNING {stats.UPLOAD_STATS_COLUMNS}
+            """), {"t": total, "d": duplicates, "uid": upload_id}).fetchone()
+            stats.upload_changed(conn, before._mapping, after._mapping)
+        _build_cache_for_upload(upload_id)
+
+
+def unseed(ctx: dict):
+    """
+    Remove ctx's user and their uploads the way delete_user's delete_all
+    does, so the dashboard counters and upload_daily_rollup drop them too,
+    then purge the uploads right away instead of waiting for the purger.
+    """
+    user_id = ctx["user_id"]
+    with engine.begin() as conn:
+        # Also catches uploads whose response a load run never saw
+        upload_ids = sorted(set(ctx["upload_ids"]) | {
+            r.upload_id for r in conn.execute(
+                text("SELECT upload_id FROM upload_log WHERE created_by_user_id = :u"),
+                {"u": user_id}
+            ).fetchall()
+        })
+        purge.mark_deleting(conn, upload_ids, user_id)
+
+    with engine.connect() as conn:
+        for upload_id in upload_ids:
+            purge.purge_upload(conn, upload_id)
+
+    with engine.begin() as conn:
+        category_groups.forget_owner(conn, user_id)
+        conn.execute(
+            text("DELETE FROM categories WHERE created_by_user_id = :u"), {"u": user_id}
+        )
+        conn.execute(text("DELETE FROM users WHERE id = :u"), {"u": user_id})
+        stats.users_changed(conn, total=-1, active=-1)
+        stats.rollup_forget_user(conn, user_id)
+
+
+# ---------------- RUN ----------------
+def scenarios(ctx: dict, rows: int) -> list:
+    first = ctx["upload_ids"][0]
+    cat = ctx["category_id"]
+    deep_page = max(rows // 50 // 2, 1)
+    return [
+        ("related-grouped", "/related-grouped", {"upload_id": first}),
+        ("related-grouped:alpha", "/related-grouped",
+         {"upload_id": first, "sort": "alpha", "page": 5}),
+        ("related-grouped-all", "/related-grouped-all", {}),
+        ("related-grouped-all:category", "/related-grouped-all", {"category_id": cat}),
+        ("related-grouped-all:search", "/related-grouped-all",
+         {"category_id": cat, "search": "pool."}),
+        ("related-by-file", "/related-by-file", {}),
+        ("related-all-stats", "/related-all-stats", {}),
+        ("related-all-stats:category", "/related-all-stats", {"category_id": cat}),
+        ("search", "/search", {"upload_id": first, "query": "sharma"}),
+        ("preview", "/preview", {"upload_id": first}),
+        ("preview:sort", "/preview",
+         {"upload_id": first, "sort_column": "email", "sort_direction": "desc"}),
+        ("preview:sort-deep", "/preview",
+         {"upload_id": first, "sort_column": "phone", "page": deep_page}),
+    ]
+
+
+def measure(client, headers, path, params, iterations, warmup) -> dict:
+    for _ in range(warmup):
+        client.get(path, params=params, headers=headers)
+
+    latencies, queries, db_times, errors = [], [], [], 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        res = client.get(path, params=params, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        # Counted by querylog for this request alone (see main.instrument_request)
+        queries.append(int(res.headers["X-DB-Queries"]))
+        db_times.append(float(res.headers["X-DB-Time-Ms"]))
+        if res.status_code != 200:
+            errors += 1
+
+    return {
+        "path": path,
+        "params": params,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "max_ms": round(max(latencies), 2),
+        "queries": max(queries),
+        "db_p50_ms": round(percentile(db_times, 50), 2),
+        "errors": errors,
+    }
+
+
+def run_scale(args, uploads: int, rows: int) -> dict:
+    print(f"[BENCH] Seeding {uploads} uploads x {rows:,} rows...", file=sys.stderr)
+    ctx = create_owner()
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            seed_uploads(ctx, uploads, rows, args.overlap, args.dup_rate)
+
+        token = create_access_token({"user_id": ctx["user_id"], "role": "user"})
+        headers = {"Authorization": f"Bearer {token}"}
+        # Not used as a context manager, so startup background jobs stay off
+        client = TestClient(app)
+
+        results = {}
+        with contextlib.redirect_stdout(sys.stderr):
+            for name, path, params in scenarios(ctx, rows):
+                results[name] = measure(
+                    client, headers, path, params,
+                    args.iterations, args.warmup
+                )
+                print(f"[BENCH] {name}: p50 {results[name]['p50_ms']} ms, "
+                      f"p95 {results[name]['p95_ms']} ms, "
+                      f"{results[name]['queries']} queries", file=sys.stderr)
+    finally:
+        if not args.keep:
+            unseed(ctx)
+
+    return {
+        "uploads": uploads,
+        "rows_per_upload": rows,
+        "user_id": ctx["user_id"] if args.keep else None,
+        "endpoints": results,
+    }
+
+
+def compare(old: dict, new: dict):
+    """Print p50/p95 per endpoint for scales present in both reports."""
+    key = lambda r: (r["uploads"], r["rows_per_upload"])
+    old_runs = {key(r): r for r in old.get("runs", [])}
+    print(f"{'scale':>12} {'endpoint':<30} {'old p50':>9} {'new p50':>9}"
+          f" {'old p95':>9} {'new p95':>9} {'queries':>9}", file=sys.stderr)
+    for run in new["runs"]:
+        before = old_runs.get(key(run))
+        if not before:
+            continue
+        scale = f"{run['uploads']}x{run['rows_per_upload']}"
+        for name, b in run["endpoints"].items():
+            a = before["endpoints"].get(name)
+            if not a:
+                continue
+            print(f"{scale:>12} {name:<30} {a['p50_ms']:>9} {b['p50_ms']:>9}"
+                  f" {a['p95_ms']:>9} {b['p95_ms']:>9}"
+                  f" {str(a['queries']) + '>' + str(b['queries']):>9}",
+                  file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark duplicate/preview queries")
+    parser.add_argument("--scales", type=parse_scale, nargs="+",
+                        default=[(5, 20_000)], help="UPLOADSxROWS, e.g. 20x50000")
+    parser.add_argument("--overlap", type=float, default=0.3,
+                        help="share of each file's people found in other files")
+    parser.add_argument("--dup-rate", type=float, default=0.1)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--keep", action="store_true",
+                        help="leave the seeded user and uploads in the database")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    # Per-request statement counts and DB time come back as X-DB-* headers
+    querylog.QUERY_DEBUG_HEADERS = True
+
+    report = {
+        "benchmark": "queries",
+        "commit": git_commit(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            "overlap": args.overlap, "dup_rate": args.dup_rate,
+            "iterations": args.iterations, "warmup": args.warmup,
+        },
+        "runs": [run_scale(args, u, r) for u, r in args.scales],
+    }
+
+    out = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(out)
+    else:
+        print(out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+from sqlalchemy import text
+
+# Cross-file duplicate groups (groups seen in more than one upload) per
+# (owner, category), built from related_groups_cache. Write paths only mark
+# a pair dirty; the next category-scoped read rebuilds just that pair.
+
+
+def mark_dirty(conn, pairs):
+    """Flag (owner_id, category_id) pairs for a rebuild on next read."""
+    pairs = {(o, c) for o, c in pairs if o is not None and c is not None}
+    if not pairs:
+        return
+
+    owners, categories = zip(*sorted(pairs))
+    conn.execute(text("""
+        INSERT INTO category_group_state (owner_id, category_id, dirty)
+        SELECT p.owner_id, p.category_id, TRUE
+        FROM UNNEST(CAST(:owners AS INT[]), CAST(:cats AS INT[]))
+             AS p(owner_id, category_id)
+        ON CONFLICT (owner_id, category_id) DO UPDATE SET dirty = TRUE
+    """), {"owners": list(owners), "cats": list(categories)})
+
+
+def mark_uploads_dirty(conn, upload_ids):
+    """Flag the (owner, category) pairs the given uploads currently sit in."""
+    rows = conn.execute(text("""
+        SELECT DISTINCT created_by_user_id, category_id
+        FROM upload_log
+        WHERE upload_id = ANY(:ids)
+    """), {"ids": list(upload_ids)}).fetchall()
+    mark_dirty(conn, [(r.created_by_user_id, r.category_id) for r in rows])
+
+
+def forget_owner(conn, owner_id: int):
+    for table in ("category_group_summary", "category_group_state"):
+        conn.execute(
+            text(f"DELETE FROM {table} WHERE owner_id = :o"), {"o": owner_id}
+        )
+
+
+def _refresh(conn, owner_id: int, category_id: int):
+    params = {"o": owner_id, "c": category_id}
+    conn.execute(text("""
+        DELETE FROM category_group_summary
+        WHERE owner_id = :o AND category_id = :c
+    """), params)
+    conn.execute(text("""
+        INSERT INTO category_group_summary
+            (owner_id, category_id, match_type, group_key,
+             record_count, file_count, upload_ids)
+        SELECT :o, :c, rgc.match_type, rgc.group_key,
+               SUM(rgc.record_count),
+               COUNT(DISTINCT rgc.upload_id),
+               ARRAY_AGG(DISTINCT rgc.upload_id)
+        FROM related_groups_cache rgc
+        JOIN upload_log ul ON ul.upload_id = rgc.upload_id
+        WHERE ul.created_by_user_id = :o
+          AND ul.category_id = :c
+          AND ul.processing_status = 'ready'
+        GROUP BY rgc.match_type, rgc.group_key
+        HAVING COUNT(DISTINCT rgc.upload_id) > 1
+    """), params)
+    conn.execute(text("""
+        UPDATE category_group_state
+        SET dirty = FALSE, refreshed_at = NOW()
+        WHERE owner_id = :o AND category_id = :c
+    """), params)
+
+
+def ensure_fresh(conn, owner_id: int, category_id: int):
+    """
+    Rebuild the pair's summary if it is dirty or was never built. The state
+    row lock serializes concurrent readers; a write that marks the pair
+    dirty meanwhile waits for it and triggers another rebuild later.
+    """
+    params = {"o": owner_id, "c": category_id}
+    conn.execute(text("""
+        INSERT INTO category_group_state (owner_id, category_id, dirty)
+        VALUES (:o, :c, TRUE)
+        ON CONFLICT (owner_id, category_id) DO NOTHING
+    """), params)
+    dirty = conn.execute(text("""
+        SELECT dirty FROM category_group_state
+        WHERE owner_id = :o AND category_id = :c
+        FOR UPDATE
+    """), params).scalar()
+    if dirty:
+        _refresh(conn, owner_id, category_id)
+
+
+# ---------------- READS ----------------
+def read_page(conn, owner_id: int, category_id: int, match_type: str,
+              search_like, order_clause: str, offset: int, limit: int):
+    """
+    One page of /related-grouped-all rows for a single (owner, category),
+    shaped like the live query's rows, plus the total group count.
+    order_clause may sort by total_count and group_key.
+    """
+    params = {
+        "o": owner_id, "c": category_id, "match_type": match_type,
+        "search_like": search_like
+    }
+    where_sql = """
+        s.owner_id = :o AND s.category_id = :c
+        AND (:match_type = 'all' OR s.match_type = :match_type)
+        AND (:search_like IS NULL OR s.group_key ILIKE :search_like)
+    """
+
+    rows = conn.execute(text(f"""
+        SELECT
+            s.group_key,
+            s.match_type,
+            s.record_count AS total_count,
+            s.record_count,
+            s.file_count,
+            ARRAY(
+                SELECT DISTINCT ul.filename FROM upload_log ul
+                WHERE ul.upload_id = ANY(s.upload_ids)
+            ) AS filenames,
+            ARRAY(
+                SELECT DISTINCT usr.email
+                FROM upload_log ul
+                JOIN users usr ON usr.id = ul.created_by_user_id
+                WHERE ul.upload_id = ANY(s.upload_ids)
+            ) AS uploaders
+        FROM category_group_summary s
+        WHERE {where_sql}
+        {order_clause}
+        LIMIT :limit OFFSET :offset
+    """), {**params, "limit": limit, "offset": offset}).fetchall()
+
+    total = conn.execute(text(f"""
+        SELECT COUNT(*) FROM category_group_summary s WHERE {where_sql}
+    """), params).scalar() or 0
+
+    return rows, total
+
+
+def read_stats(conn, owner_id: int, category_id: int):
+    """/related-all-stats figures for a single (owner, category)."""
+    return conn.execute(text("""
+        SELECT
+            COUNT(*) FILTER (WHERE match_type = 'email')                 AS email_groups,
+            COALESCE(SUM(record_count) FILTER (WHERE match_type = 'email'), 0)  AS email_records,
+            COUNT(*) FILTER (WHERE match_type = 'phone')                 AS phone_groups,
+            COALESCE(SUM(record_count) FILTER (WHERE match_type = 'phone'), 0)  AS phone_records,
+            COUNT(*) FILTER (WHERE match_type = 'merged')                AS both_groups,
+            COALESCE(SUM(record_count) FILTER (WHERE match_type = 'merged'), 0) AS both_records,
+            (
+                SELECT COUNT(DISTINCT u)
+                FROM category_group_summary s2, UNNEST(s2.upload_ids) AS u
+                WHERE s2.owner_id = :o AND s2.category_id = :c
+            ) AS total_files
+        FROM category_group_summary
+        WHERE owner_id = :o AND category_id = :c
+    """), {"o": owner_id, "c": category_id}).fetchone()
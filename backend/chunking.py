@@ -0,0 +1,135 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+# CSV ingestion reads a small probe chunk, measures its in-memory size and
+# sizes the following chunks to CHUNK_TARGET_BYTES. Each chunk holds a
+# reservation on a process-wide budget while it is normalized, deduplicated
+# and copied, so concurrent uploads shrink their chunks (or wait) instead of
+# exceeding INGEST_MEMORY_BUDGET_BYTES together.
+
+# In-memory size of one chunk as read (DataFrame.memory_usage(deep=True))
+CHUNK_TARGET_BYTES = 256 * 1024 * 1024
+
+# Rows in the first chunk, whose footprint sizes the rest
+CHUNK_PROBE_ROWS = 10_000
+
+# Bounds on the chosen chunk size
+CHUNK_MIN_ROWS = 10_000
+CHUNK_MAX_ROWS = 1_000_000
+
+# Normalizing, hashing and the COPY buffer hold copies of the chunk; a
+# chunk reserves this multiple of its own size
+CHUNK_WORKING_FACTOR = 3
+
+# Shared by all ingestion jobs in this process (room for one full-size
+# chunk per ingest_queue.INGEST_WORKERS)
+INGEST_MEMORY_BUDGET_BYTES = 4 * CHUNK_TARGET_BYTES * CHUNK_WORKING_FACTOR
+
+
+class MemoryBudget:
+    """Byte reservations against a fixed total, shared across threads."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, want: int, minimum: int) -> int:
+        """
+        Reserve up to want bytes, but at least minimum; blocks until minimum
+        fits. A lone reservation always goes through, even above the total,
+        so one oversized file still makes progress.
+        Returns the bytes granted.
+        """
+        minimum = min(minimum, want)
+        started = time.perf_counter()
+        with self._cond:
+            while self.used and self.used + minimum > self.total:
+                self._cond.wait()
+            granted = max(min(want, self.total - self.used), minimum)
+            self.used += granted
+        metrics.INGEST_MEMORY_WAIT_SECONDS.observe(time.perf_counter() - started)
+        return granted
+
+    def release(self, nbytes: int):
+        if nbytes <= 0:
+            return
+        with self._cond:
+            self.used = max(self.used - nbytes, 0)
+            self._cond.notify_all()
+
+
+BUDGET = MemoryBudget(INGEST_MEMORY_BUDGET_BYTES)
+
+metrics.Gauge(
+    "datavault_ingest_memory_reserved_bytes",
+    "Bytes of the ingestion memory budget reserved by in-flight chunks",
+    callback=lambda: BUDGET.used
+)
+
+
+def frame_bytes(df) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def chunk_rows(row_bytes: float) -> int:
+    """Rows per chunk for a measured in-memory size per row."""
+    rows = int(CHUNK_TARGET_BYTES / max(row_bytes, 1))
+    return max(CHUNK_MIN_ROWS, min(rows, CHUNK_MAX_ROWS))
+
+
+@contextmanager
+def _untimed(name: str, rows: int = 0):
+    yield {"rows": rows}
+
+
+def adaptive_chunks(reader, label: str = "", budget: MemoryBudget = BUDGET,
+                    timer=None):
+    """
+    Yield chunks from a pandas TextFileReader, sized from the probe chunk's
+    footprint and the budget. A chunk's reservation is held until the next
+    one is requested or the generator is closed; wrap it in
+    contextlib.closing() so an error mid-file releases it.
+    With a profiling.StageTimer, reading is timed as "read" and waiting
+    for the budget as "memory_wait", so a wait does not show up as a slow
+    read.
+    """
+    stage = timer.stage if timer else _untimed
+    held = 0
+    try:
+        with stage("read") as read:
+            chunk = reader.get_chunk(CHUNK_PROBE_ROWS)
+            read["rows"] = len(chunk)
+        row_bytes = frame_bytes(chunk) / max(len(chunk), 1)
+        rows = chunk_rows(row_bytes)
+        per_row = row_bytes * CHUNK_WORKING_FACTOR
+        print(f"[CHUNK] {label}: {row_bytes:,.0f} bytes/row in memory, "
+              f"chunks of up to {rows:,} rows")
+
+        with stage("memory_wait"):
+            held = budget.acquire(int(len(chunk) * per_row), int(len(chunk) * per_row))
+        while True:
+            yield chunk
+
+            budget.release(held)
+            with stage("memory_wait"):
+                held = budget.acquire(int(rows * per_row), int(CHUNK_MIN_ROWS * per_row))
+            with stage("read") as read:
+                try:
+                    chunk = reader.get_chunk(max(int(held / per_row), 1))
+                except StopIteration:
+                    chunk = None
+                read["rows"] = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                return
+            # The last chunk is usually short; hand back what it doesn't need
+            used = int(len(chunk) * per_row)
+            budget.release(held - used)
+            held = used
+    except StopIteration:
+        return
+    finally:
+        budget.release(held)
@@ -0,0 +1,483 @@
+import csv
+import glob
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import xlsxwriter
+from sqlalchemy import text
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Rows pulled per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 5_000
+
+# Excel hard limit is 1,048,576 rows per sheet, one of which is the header
+XLSX_MAX_ROWS = 1_048_576
+XLSX_SHEET_NAME = "Cleaned Data"
+
+# Rows per Parquet row group / Arrow record batch
+ARROW_BATCH_SIZE = 100_000
+
+PARQUET_COMPRESSIONS = {"zstd", "snappy", "gzip", "lz4", "none"}
+ARROW_COMPRESSIONS = {"zstd", "lz4", "none"}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "excel": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+EXTENSIONS = {
+    "csv": ".csv",
+    "excel": ".xlsx",
+    "parquet": ".parquet",
+    "arrow": ".arrows",
+}
+
+# ── Artifact cache ──
+# Uploads are immutable once processing_status = 'ready', so a built
+# export can be served again until the upload is deleted.
+EXPORT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "datavault_exports")
+EXPORT_CACHE_MAX_BYTES = 10 * 1024 ** 3
+
+# Never evict an artifact used this recently — it may still be streaming
+EXPORT_CACHE_GRACE_SECONDS = 300
+
+# Formats built right after ingestion, e.g. ("csv",). Empty = on demand only.
+EXPORT_PREGENERATE_FORMATS: tuple = ()
+
+_artifact_locks: dict = {}
+_artifact_locks_guard = threading.Lock()
+
+
+class ArtifactInvalidated(Exception):
+    """The upload changed (e.g. was deleted) while its artifact was built."""
+
+
+def iter_upload_rows(conn, upload_id: int,
+                     batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[dict]:
+    """
+    Yield row_data dicts for one upload in id order without loading
+    the whole result set — uses a server-side (named) cursor.
+    """
+    result = conn.execution_options(
+        stream_results=True, max_row_buffer=batch_size
+    ).execute(
+        text("""
+            SELECT row_data
+            FROM cleaned_data
+            WHERE upload_id = :uid
+            ORDER BY id
+        """),
+        {"uid": upload_id}
+    )
+    for batch in result.partitions(batch_size):
+        for r in batch:
+            yield r.row_data
+
+
+def _header_key(name: str) -> str:
+    # Same renaming normalize_dataframe() applies before storage
+    return str(name).strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def export_columns(conn, upload_id: int) -> List[str]:
+    """
+    Column list for an export.
+
+    Membership comes from the stored rows (all rows of an upload share
+    one schema, so the first row is enough). Order comes from the upload's
+    header metadata, because JSONB does not preserve key order; columns
+    produced by normalization (email/phone/name) follow at the end.
+    """
+    meta = conn.execute(
+        text("SELECT final_headers FROM upload_log WHERE upload_id = :uid"),
+        {"uid": upload_id}
+    ).fetchone()
+
+    first = conn.execute(
+        text("""
+            SELECT row_data
+            FROM cleaned_data
+            WHERE upload_id = :uid
+            ORDER BY id
+            LIMIT 1
+        """),
+        {"uid": upload_id}
+    ).fetchone()
+
+    if not first:
+        return []
+
+    stored = list(first.row_data.keys())
+    headers = ((meta.final_headers if meta else None) or {}).get("columns") or []
+
+    columns = []
+    for h in headers:
+        for key in (str(h), _header_key(h)):
+            if key in first.row_data and key not in columns:
+                columns.append(key)
+                break
+
+    columns.extend(k for k in stored if k not in columns)
+    return columns
+
+
+def _sheet_name(index: int) -> str:
+    return XLSX_SHEET_NAME if index == 0 else f"{XLSX_SHEET_NAME} ({index + 1})"
+
+
+def write_xlsx(path: str, columns: List[str], rows: Iterable[dict]) -> int:
+    """
+    Stream rows into an .xlsx file using xlsxwriter constant_memory mode.
+    Each row is flushed to disk as soon as the next one starts, so memory
+    stays flat regardless of row count. Spills to a new sheet (with the
+    header repeated) whenever the 1,048,576-row sheet limit is reached.
+
+    Returns the number of data rows written.
+    """
+    workbook = xlsxwriter.Workbook(path, {
+        "constant_memory": True,
+        "tmpdir": tempfile.gettempdir(),
+        # Cell values are raw data — never reinterpret them
+        "strings_to_numbers": False,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+    })
+    header_fmt = workbook.add_format({"bold": True})
+    rows_per_sheet = XLSX_MAX_ROWS - 1
+
+    sheet_index = 0
+    sheet = None
+    sheet_row = rows_per_sheet
+    written = 0
+
+    try:
+        for row in rows:
+            if sheet_row >= rows_per_sheet:
+                sheet = workbook.add_worksheet(_sheet_name(sheet_index))
+                sheet.write_row(0, 0, columns, header_fmt)
+                sheet_index += 1
+                sheet_row = 0
+
+            sheet_row += 1
+            sheet.write_row(sheet_row, 0, [row.get(col) for col in columns])
+            written += 1
+
+        if sheet is None:
+            sheet = workbook.add_worksheet(_sheet_name(0))
+            sheet.write_row(0, 0, columns, header_fmt)
+    finally:
+        workbook.close()
+
+    return written
+
+
+def write_csv(path: str, columns: List[str], rows: Iterable[dict]) -> int:
+    """Write rows to a UTF-8 CSV file. Returns the number of rows written."""
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row.get(col) for col in columns])
+            written += 1
+    return written
+
+
+def _arrow_batches(columns: List[str], rows: Iterable[dict], schema):
+    """Group rows into Arrow record batches of ARROW_BATCH_SIZE rows."""
+    buffer = {col: [] for col in columns}
+    count = 0
+
+    for row in rows:
+        for col in columns:
+            v = row.get(col)
+            buffer[col].append(None if v is None else str(v))
+        count += 1
+
+        if count >= ARROW_BATCH_SIZE:
+            yield pa.RecordBatch.from_pydict(buffer, schema=schema), count
+            buffer = {col: [] for col in columns}
+            count = 0
+
+    if count:
+        yield pa.RecordBatch.from_pydict(buffer, schema=schema), count
+
+
+def _arrow_schema(columns: List[str]):
+    # Ingestion reads every cell as text, so the stored schema is all strings
+    return pa.schema([pa.field(col, pa.string()) for col in columns])
+
+
+def write_parquet(path: str, columns: List[str], rows: Iterable[dict],
+                  compression: str = "zstd") -> int:
+    """
+    Write rows to a Parquet file one row group per ARROW_BATCH_SIZE rows.
+    Returns the number of rows written.
+    """
+    schema = _arrow_schema(columns)
+    written = 0
+
+    with pq.ParquetWriter(
+        path, schema,
+        compression=None if compression == "none" else compression
+    ) as writer:
+        for batch, count in _arrow_batches(columns, rows, schema):
+            writer.write_batch(batch)
+            written += count
+
+    return written
+
+
+def write_arrow(path: str, columns: List[str], rows: Iterable[dict],
+                compression: str = "zstd") -> int:
+    """
+    Write rows as an Arrow IPC stream. Returns the number of rows written.
+    """
+    schema = _arrow_schema(columns)
+    options = pa.ipc.IpcWriteOptions(
+        compression=None if compression == "none" else compression
+    )
+    written = 0
+
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_stream(sink, schema, options=options) as writer:
+            for batch, count in _arrow_batches(columns, rows, schema):
+                writer.write_batch(batch)
+                written += count
+
+    return written
+
+
+WRITERS = {
+    "csv":     lambda path, cols, rows, compression: write_csv(path, cols, rows),
+    "excel":   lambda path, cols, rows, compression: write_xlsx(path, cols, rows),
+    "parquet": write_parquet,
+    "arrow":   write_arrow,
+}
+
+
+def new_export_path(upload_id: int, suffix: str) -> str:
+    fd, path = tempfile.mkstemp(prefix=f"datavault_export_{upload_id}_", suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def artifact_path(upload_id: int, format: str, compression: str) -> str:
+    return os.path.join(
+        EXPORT_CACHE_DIR,
+        f"{upload_id}_{format}_{compression}{EXTENSIONS[format]}"
+    )
+
+
+def artifact_etag(stat_result: os.stat_result) -> str:
+    # Rebuilt artifacts get a new mtime; cache hits only move atime
+    base = f"{stat_result.st_mtime_ns}-{stat_result.st_size}"
+    return f'"{hashlib.md5(base.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def get_artifact(upload_id: int, format: str,
+                 compression: str) -> Optional[Tuple[str, os.stat_result]]:
+    """Return (path, stat) of a cached artifact and mark it as recently used."""
+    path = artifact_path(upload_id, format, compression)
+    try:
+        st = os.stat(path)
+        # LRU bookkeeping lives in atime; mtime (and so the ETag) is kept
+        os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+    except FileNotFoundError:
+        return None
+    return path, st
+
+
+def _artifact_lock(path: str) -> threading.Lock:
+    with _artifact_locks_guard:
+        return _artifact_locks.setdefault(path, threading.Lock())
+
+
+def store_artifact(upload_id: int, format: str, compression: str,
+                   build: Callable[[str], int],
+                   still_valid: Optional[Callable[[], bool]] = None
+                   ) -> Tuple[str, os.stat_result]:
+    """
+    Build an artifact with build(path) unless another request already did,
+    publish it atomically into the cache, then evict down to the size limit.
+    still_valid() is asked after the build, before publishing; when it
+    says no (e.g. the upload was deleted meanwhile, possibly by another
+    process) the build is dropped and ArtifactInvalidated raised.
+    """
+    path = artifact_path(upload_id, format, compression)
+
+    with _artifact_lock(path):
+        cached = get_artifact(upload_id, format, compression)
+        if cached:
+            return cached
+
+        os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+        try:
+            build(partial)
+            if still_valid and not still_valid():
+                raise ArtifactInvalidated(upload_id)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+
+    evict_artifacts()
+    return path, os.stat(path)
+
+
+def evict_artifacts(max_bytes: int = EXPORT_CACHE_MAX_BYTES) -> int:
+    """Delete least recently used artifacts until the cache fits max_bytes."""
+    entries = []
+    for p in glob.glob(os.path.join(EXPORT_CACHE_DIR, "*")):
+        if p.endswith(".partial"):
+            continue
+        try:
+            entries.append((p, os.stat(p)))
+        except FileNotFoundError:
+            pass
+
+    total = sum(st.st_size for _, st in entries)
+    if total <= max_bytes:
+        return 0
+
+    cutoff = time.time() - EXPORT_CACHE_GRACE_SECONDS
+    removed = 0
+    for p, st in sorted(entries, key=lambda e: e[1].st_atime):
+        if total <= max_bytes:
+            break
+        if st.st_atime > cutoff:
+            continue
+        try:
+            os.remove(p)
+            total -= st.st_size
+            removed += 1
+        except FileNotFoundError:
+            pass
+
+    return removed
+
+
+def invalidate_artifacts(upload_ids: Iterable[int]) -> int:
+    """
+    Drop every cached artifact of the given uploads. Returns files removed.
+    Builds in flight in this process are waited for (they hold the
+    artifact's lock) and their result removed; their .partial files are
+    left to them.
+    """
+    removed = 0
+    for uid in upload_ids:
+        paths = set()
+        for p in glob.glob(os.path.join(EXPORT_CACHE_DIR, f"{uid}_*")):
+            # <artifact>.<pid>.<thread>.partial belongs to <artifact>
+            paths.add(p.rsplit(".", 3)[0] if p.endswith(".partial") else p)
+        for p in sorted(paths):
+            with _artifact_lock(p):
+                try:
+                    os.remove(p)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+    return removed
+
+
+class _ZipSink(io.RawIOBase):
+    """
+    Write-only, non-seekable target for ZipFile. zipfile falls back to
+    data descriptors for unseekable output, so entries can be emitted as
+    they are written and drained chunk by chunk.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def zip_entry_name(filename: str, upload_id: int, suffix: str = ".csv") -> str:
+    stem = os.path.splitext(os.path.basename(filename or ""))[0]
+    stem = re.sub(r"[^\w.\- ]+", "_", stem).strip() or "upload"
+    return f"{stem}_{upload_id}{suffix}"
+
+
+def _csv_chunks(columns: List[str], rows: Iterable[dict],
+                batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    count = 0
+
+    for row in rows:
+        writer.writerow([row.get(col) for col in columns])
+        count += 1
+        if count >= batch_size:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+            count = 0
+
+    yield buf.getvalue().encode("utf-8")
+
+
+def _file_chunks(path: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+def iter_csv_zip(engine, uploads: Iterable[Tuple[int, str]]) -> Iterator[bytes]:
+    """
+    Stream a ZIP archive with one CSV per (upload_id, filename).
+
+    Each CSV is produced batch by batch from a server-side cursor (or
+    copied from the cached CSV artifact when one exists) and compressed
+    on the fly, so memory use does not grow with file count or size.
+    """
+    sink = _ZipSink()
+
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for upload_id, filename in uploads:
+            arcname = zip_entry_name(filename, upload_id)
+            cached = get_artifact(upload_id, "csv", "none")
+
+            with zf.open(arcname, mode="w", force_zip64=True) as entry:
+                if cached:
+                    for chunk in _file_chunks(cached[0]):
+                        entry.write(chunk)
+                        yield sink.drain()
+                else:
+                    with engine.connect() as conn:
+                        columns = export_columns(conn, upload_id)
+                        for chunk in _csv_chunks(columns, iter_upload_rows(conn, upload_id)):
+                            entry.write(chunk)
+                            yield sink.drain()
+
+            yield sink.drain()
+
+    yield sink.drain()
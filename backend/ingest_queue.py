@@ -0,0 +1,272 @@
+import heapq
+import threading
+import time
+
+import metrics
+import profiling
+import progress
+
+# Uploads wait here for an ingestion worker. Instead of first come, first
+# served, the smallest file goes first (by file bytes, with linear aging
+# and a maximum wait so big files are not starved), each user runs at most USER_MAX_RUNNING jobs at
+# once, and FAST_LANE_WORKERS of the workers only take small files. Queued
+# uploads get their position and an ETA in their progress events.
+# The queue is per process: with uvicorn --workers N each has its own.
+
+# Forced to 1 while profiling.PROFILE_TRACEMALLOC is on, whose per-stage
+# peak would otherwise mix concurrent jobs
+INGEST_WORKERS = 1 if profiling.PROFILE_TRACEMALLOC else 4
+
+# Workers that only take files up to FAST_LANE_BYTES, so small uploads
+# never wait behind big ones
+FAST_LANE_WORKERS = 1
+FAST_LANE_BYTES = 16 * 1024 * 1024
+
+# Jobs one user can have running at once (across all workers)
+USER_MAX_RUNNING = 2
+
+# Every second a file waits it is ranked as if it were this much smaller,
+# so a big file eventually overtakes newly arriving small ones
+SJF_AGING_BYTES_PER_SEC = 1024 * 1024
+
+# A file that has waited this long goes ahead of everything not yet this
+# old, whatever its size
+SJF_MAX_WAIT_SECONDS = 30 * 60
+
+# Ingestion speed assumed for ETAs until jobs have finished; afterwards a
+# moving average of finished jobs is used
+ETA_DEFAULT_BYTES_PER_SEC = 2 * 1024 * 1024
+ETA_SMOOTHING = 0.3
+
+# Queued jobs are re-published when their position changes, and at least
+# this often so ETAs count down
+QUEUE_REFRESH_SECONDS = 15
+
+
+class _Job:
+    __slots__ = ("upload_id", "user_id", "file_bytes", "fn", "args",
+                 "queued_at", "started_at", "published")
+
+    def __init__(self, upload_id, user_id, file_bytes, fn, args):
+        self.upload_id = upload_id
+        self.user_id = user_id
+        self.file_bytes = file_bytes
+        self.fn = fn
+        self.args = args
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.published = None  # (position, eta) last sent to progress
+
+    def rank(self, now: float) -> float:
+        waited = now - self.queued_at
+        if waited >= SJF_MAX_WAIT_SECONDS:
+            return float("-inf")  # overdue jobs go first, oldest first
+        return self.file_bytes - waited * SJF_AGING_BYTES_PER_SEC
+
+
+def _fmt_eta(seconds: int) -> str:
+    if seconds < 60:
+        return "less than a minute"
+    if seconds < 3600:
+        return f"about {round(seconds / 60)} min"
+    return f"about {seconds / 3600:.1f} h"
+
+
+class IngestScheduler:
+    def __init__(self, workers: int = INGEST_WORKERS,
+                 fast_lane_workers: int = FAST_LANE_WORKERS):
+        self.workers = workers
+        self.fast_lane_workers = min(fast_lane_workers, workers - 1)
+        self.bytes_per_sec = ETA_DEFAULT_BYTES_PER_SEC
+        self._queued = []
+        self._running = {}
+        self._user_running = {}
+        self._cond = threading.Condition()
+        self._changed = threading.Event()
+        self._started = False
+
+    # ---------------- SUBMIT ----------------
+    def submit(self, upload_id: int, user_id: int, file_bytes: int, fn, *args):
+        """Queue fn(*args) for upload_id; returns without waiting."""
+        self.start()
+        with self._cond:
+            self._queued.append(_Job(upload_id, user_id, file_bytes, fn, args))
+            self._cond.notify_all()
+        self._changed.set()
+
+    def cancel(self, upload_ids) -> list:
+        """
+        Drop queued jobs for upload_ids (e.g. deleted uploads) and return
+        the ids dropped. Running jobs are left alone; jobs queued in another
+        process are not seen here.
+        """
+        ids = set(upload_ids)
+        with self._cond:
+            dropped = [j for j in self._queued if j.upload_id in ids]
+            for job in dropped:
+                self._queued.remove(job)
+        if dropped:
+            self._changed.set()
+        return [j.upload_id for j in dropped]
+
+    # ---------------- DISPATCH ----------------
+    def _ordered(self, now: float) -> list:
+        return sorted(self._queued, key=lambda j: (j.rank(now), j.queued_at))
+
+    def _pick(self, fast_lane: bool):
+        for job in self._ordered(time.monotonic()):
+            if fast_lane and job.file_bytes > FAST_LANE_BYTES:
+                continue
+            if self._user_running.get(job.user_id, 0) >= USER_MAX_RUNNING:
+                continue
+            return job
+        return None
+
+    def _claim(self, fast_lane: bool):
+        """Move the next job this worker may run to running (caller holds _cond)."""
+        job = self._pick(fast_lane)
+        if job is None:
+            return None
+        self._queued.remove(job)
+        job.started_at = time.monotonic()
+        self._running[job.upload_id] = job
+        self._user_running[job.user_id] = self._user_running.get(job.user_id, 0) + 1
+        return job
+
+    def _worker(self, fast_lane: bool):
+        while True:
+            with self._cond:
+                job = self._claim(fast_lane)
+                while job is None:
+                    self._cond.wait()
+                    job = self._claim(fast_lane)
+            self._changed.set()
+
+            try:
+                job.fn(*job.args)
+            except Exception as e:
+                print(f"[QUEUE] Job for upload {job.upload_id} failed: {e}")
+            finally:
+                self._finish(job)
+
+    def _finish(self, job: _Job):
+        seconds = time.monotonic() - job.started_at
+        with self._cond:
+            self._running.pop(job.upload_id, None)
+            self._user_running[job.user_id] -= 1
+            if not self._user_running[job.user_id]:
+                del self._user_running[job.user_id]
+            if job.file_bytes and seconds > 1:
+                rate = job.file_bytes / seconds
+                self.bytes_per_sec += ETA_SMOOTHING * (rate - self.bytes_per_sec)
+            self._cond.notify_all()
+        self._changed.set()
+
+    # ---------------- POSITIONS / ETA ----------------
+    def _estimates(self) -> list:
+        """
+        (job, position, eta_seconds) for queued jobs in dispatch order. The
+        ETA replays the queue onto the workers as they free up (ignoring
+        per-user caps and the fast lane), so it is a rough guide.
+        """
+        now = time.monotonic()
+        with self._cond:
+            ordered = self._ordered(now)
+            running = list(self._running.values())
+            rate = self.bytes_per_sec
+
+        free_at = [
+            max(j.file_bytes / rate - (now - j.started_at), 0) for j in running
+        ]
+        free_at += [0.0] * (self.workers - len(free_at))
+        heapq.heapify(free_at)
+
+        out = []
+        for position, job in enumerate(ordered, 1):
+            start = heapq.heappop(free_at)
+            done = start + job.file_bytes / rate
+            heapq.heappush(free_at, done)
+            out.append((job, position, int(done)))
+        return out
+
+    def _publish_positions(self, force: bool):
+        for job, position, eta in self._estimates():
+            with self._cond:
+                if job.started_at is not None:
+                    continue  # picked up since; its own progress takes over
+                if not force and job.published and job.published[0] == position:
+                    continue
+                job.published = (position, eta)
+            # A job starting right now may still beat this publish;
+            # progress.publish never lets "queued" replace a later status
+            progress.publish(
+                job.upload_id, 0, "queued",
+                f"Queued: #{position} in line, done in {_fmt_eta(eta)}",
+                user_id=job.user_id, queue_position=position, eta_seconds=eta
+            )
+
+    def _notify_loop(self):
+        last_refresh = time.monotonic()
+        while True:
+            changed = self._changed.wait(QUEUE_REFRESH_SECONDS)
+            self._changed.clear()
+            force = time.monotonic() - last_refresh >= QUEUE_REFRESH_SECONDS
+            if force:
+                last_refresh = time.monotonic()
+            if changed or force:
+                try:
+                    self._publish_positions(force)
+                except Exception as e:
+                    print(f"[QUEUE] Could not publish queue positions: {e}")
+
+    # ---------------- STATE ----------------
+    def state(self) -> dict:
+        estimates = {j.upload_id: (p, eta) for j, p, eta in self._estimates()}
+        now = time.monotonic()
+        with self._cond:
+            queued = self._ordered(now)
+            running = list(self._running.values())
+        return {
+            "workers": self.workers,
+            "fast_lane_workers": self.fast_lane_workers,
+            "fast_lane_bytes": FAST_LANE_BYTES,
+            "user_max_running": USER_MAX_RUNNING,
+            "bytes_per_sec": round(self.bytes_per_sec),
+            "running": [
+                {"upload_id": j.upload_id, "user_id": j.user_id,
+                 "file_bytes": j.file_bytes,
+                 "running_seconds": round(now - j.started_at, 1)}
+                for j in running
+            ],
+            "queued": [
+                {"upload_id": j.upload_id, "user_id": j.user_id,
+                 "file_bytes": j.file_bytes,
+                 "waiting_seconds": round(now - j.queued_at, 1),
+                 "position": estimates.get(j.upload_id, (None, None))[0],
+                 "eta_seconds": estimates.get(j.upload_id, (None, None))[1]}
+                for j in queued
+            ],
+        }
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+        for i in range(self.workers):
+            threading.Thread(
+                target=self._worker, args=(i < self.fast_lane_workers,),
+                name=f"ingest-worker-{i}", daemon=True
+            ).start()
+        threading.Thread(
+            target=self._notify_loop, name="ingest-queue-notify", daemon=True
+        ).start()
+
+
+SCHEDULER = IngestScheduler()
+
+metrics.INGEST_WORKERS.set(SCHEDULER.workers)
+
+
+def start_scheduler():
+    SCHEDULER.start()
@@ -1,6 +1,6 @@
 from fastapi import (
     FastAPI, UploadFile, File, Query,
-    HTTPException, Depends
+    HTTPException, Depends, Request, Response
 )
 from header import (
     detect_header_case,
@@ -16,37 +16,96 @@ from typing import Dict, Optional, List
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.background import BackgroundTask
 from sqlalchemy import text, asc, desc, func
-from datetime import date
+from datetime import date, datetime, timedelta
 import pandas as pd
-import io, json, os, time
+import io, csv, json, os, time
 from users import router as users_router
 from db import engine, copy_cleaned_data
+from export import (
+    export_columns, iter_upload_rows, new_export_path,
+    get_artifact, store_artifact, artifact_etag, invalidate_artifacts, iter_csv_zip,
+    ArtifactInvalidated,
+    PARQUET_COMPRESSIONS, ARROW_COMPRESSIONS, EXPORT_PREGENERATE_FORMATS,
+    WRITERS as EXPORT_WRITERS, MEDIA_TYPES as EXPORT_MEDIA_TYPES,
+    EXTENSIONS as EXPORT_EXTENSIONS, EXPORT_BATCH_SIZE, pa as export_pa
+)
 from logger import log_to_csv
-from auth import authenticate_user, create_access_token, get_current_user
+import stats
+import progress
+import purge
+import category_groups
+import chunking
+import ingest_queue
+import metrics
+import profiling
+import querylog
+from profiling import StageTimer
+from auth import (
+    authenticate_user, create_access_token, create_download_token,
+    get_current_user, get_download_user, invalidate_user
+)
 from permissions import can_delete_upload, can_access_upload, admin_only
 from security import hash_password
 from reportlab.lib.pagesizes import A4
 from fastapi.responses import StreamingResponse
 from reportlab.pdfgen import canvas
 from collections import defaultdict
+from contextlib import closing
 import asyncio
 import hashlib
 import python_calamine
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
 import asyncio
 import multiprocessing
-from auth import SECRET_KEY, ALGORITHM
+from auth import SECRET_KEY, ALGORITHM, DOWNLOAD_TOKEN_EXPIRE_SECONDS
 import jwt as pyjwt
 import time as _t
 import shutil
 
 multiprocessing.freeze_support()
-executor = ThreadPoolExecutor(max_workers=4)
 
-# In-memory progress store: upload_id -> progress dict
-upload_progress_store: dict = {}
+metrics.Gauge(
+    "datavault_db_pool_checked_out",
+    "Database connections currently checked out of the pool",
+    callback=lambda: engine.pool.checkedout()
+)
+
+# Bump when _build_cache_for_upload changes what it writes; the rebuild job
+# then only redoes uploads built with an older version
+#   2: also writes upload_dup_summary
+#   3: upload_dup_summary skips 'nan' emails
+GROUPS_CACHE_VERSION = 3
+
+# Rebuild jobs use their own pool so they never hold up ingestion
+CACHE_REBUILD_WORKERS = 4
+cache_rebuild_executor = ThreadPoolExecutor(
+    max_workers=CACHE_REBUILD_WORKERS, thread_name_prefix="cache-rebuild"
+)
+
+# A running rebuild job that has not reported progress for this long is
+# treated as dead (e.g. its process restarted)
+CACHE_REBUILD_STALE_MINUTES = 10
+
+# Uploads read endpoints found without a duplicate summary and handed to
+# cache_rebuild_executor, so each is backfilled once (per process)
+_cache_backfill_pending = set()
+_cache_backfill_lock = threading.Lock()
+
+# An open progress stream re-reads upload_progress this often in case a
+# notification was missed, and gives up after this long without any event
+PROGRESS_KEEPALIVE_SECONDS = 15
+PROGRESS_STREAM_IDLE_SECONDS = 300
+
+# upload_log state right after /upload inserts the row
+_PROCESSING_UPLOAD = {
+    "processing_status": "processing", "status": "PROCESSING",
+    "total_records": 0, "duplicate_records": 0
+}
 
 class HeaderResolutionRequest(BaseModel):
     user_mapping: Dict[int, str] = {}
@@ -55,6 +114,9 @@ class HeaderResolutionRequest(BaseModel):
 class BulkDeleteRequest(BaseModel):
     upload_ids: List[int]
 
+class UploadStatusRequest(BaseModel):
+    upload_ids: List[int]
+
 class MoveUploadRequest(BaseModel):
     category_id: int
 
@@ -77,6 +139,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    queries, token = querylog.begin_request(
+        request.url.path, request.method, request.scope, dict(request.query_params)
+    )
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if querylog.QUERY_DEBUG_HEADERS:
+            response.headers.update(queries.headers())
+        return response
+    finally:
+        # Label by route template, not raw path, to keep the series bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        querylog.end_request(token, queries, request.method, route)
+        metrics.HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method, route=route, status=status
+        )
+        metrics.HTTP_REQUEST_QUERIES.observe(queries.count, route=route)
+
+@app.on_event("startup")
+def start_background_jobs():
+    stats.start_stats_job()
+    progress.start_listener()
+    purge.start_purger()
+    querylog.start_explainer()
+    ingest_queue.start_scheduler()
+
 def detect_relation_fields(conn, upload_id: int):
     stats = conn.execute(
         text("""
@@ -124,7 +217,11 @@ def clean_nan(row):
 def assert_upload_access(conn, upload_id: int, user: dict):
     """Centralized ownership check for any upload_id access."""
     owner = conn.execute(
-        text("SELECT created_by_user_id FROM upload_log WHERE upload_id = :uid"),
+        text("""
+            SELECT created_by_user_id FROM upload_log
+            WHERE upload_id = :uid
+              AND processing_status IS DISTINCT FROM 'deleting'
+        """),
         {"uid": upload_id}
     ).scalar()
 
@@ -264,6 +361,7 @@ def list_categories(
                            c.created_by_user_id
                     FROM categories c
                     LEFT JOIN upload_log u ON u.category_id = c.id
+                     AND u.processing_status IS DISTINCT FROM 'deleting'
                     WHERE c.created_by_user_id = :uid
                     GROUP BY c.id
                     ORDER BY c.name
@@ -274,6 +372,7 @@ def list_categories(
                            c.created_by_user_id
                     FROM categories c
                     LEFT JOIN upload_log u ON u.category_id = c.id
+                     AND u.processing_status IS DISTINCT FROM 'deleting'
                     GROUP BY c.id
                     ORDER BY c.name
                 """)).fetchall()
@@ -283,6 +382,7 @@ def list_categories(
                        c.created_by_user_id
                 FROM categories c
                 LEFT JOIN upload_log u ON u.category_id = c.id
+                 AND u.processing_status IS DISTINCT FROM 'deleting'
                 WHERE c.created_by_user_id = :uid
                 GROUP BY c.id
                 ORDER BY c.name
@@ -293,6 +393,65 @@ def list_categories(
         for r in rows
     ]
 
+@app.get("/upload-progress")
+async def user_progress_stream(token: str = Query(...)):
+    """
+    One SSE stream for all of the caller's in-flight uploads. Every event
+    carries its upload_id; the stream stays open until the client leaves.
+    """
+    try:
+        payload = pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("user_id")
+        if not user_id or payload.get("scope"):
+            raise ValueError("Not an access token")
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    key = progress.user_key(user_id)
+
+    async def event_stream():
+        queue = progress.subscribe(key)
+        sent = {}
+
+        def fresh(event):
+            # Skip events the client already has (snapshot re-reads)
+            state = (event["status"], event["percent"], event["message"])
+            if sent.get(event["upload_id"]) == state:
+                return False
+            sent[event["upload_id"]] = state
+            return True
+
+        try:
+            events = await run_in_threadpool(progress.user_snapshot, user_id)
+            while True:
+                for event in events:
+                    if fresh(event):
+                        yield f"data: {json.dumps(event)}\n\n"
+                    if event["status"] in progress.TERMINAL_STATUSES:
+                        sent.pop(event["upload_id"], None)
+
+                try:
+                    events = [await asyncio.wait_for(
+                        queue.get(), PROGRESS_KEEPALIVE_SECONDS
+                    )]
+                    while not queue.empty():
+                        events.append(queue.get_nowait())
+                except asyncio.TimeoutError:
+                    events = await run_in_threadpool(progress.user_snapshot, user_id)
+                    yield ": keepalive\n\n"
+        finally:
+            progress.unsubscribe(key, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Connection": "keep-alive"
+        }
+    )
+
 @app.get("/upload-progress/{upload_id}")
 async def upload_progress_stream(
     upload_id: int,
@@ -302,26 +461,48 @@ async def upload_progress_stream(
     try:
         payload = pyjwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("user_id")
-        if not user_id:
-            raise ValueError("No user_id")
+        if not user_id or payload.get("scope"):
+            raise ValueError("Not an access token")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    is_admin = payload.get("role") == "admin"
+
+    def visible(event):
+        return (
+            is_admin or event.get("user_id") is None
+            or event["user_id"] == user_id
+        )
+
     async def event_stream():
-        timeout = 0
-        while timeout < 300:
-            progress = upload_progress_store.get(upload_id)
-
-            if progress:
-                yield f"data: {json.dumps(progress)}\n\n"
-                if progress.get("status") in ("done", "error"):
-                    upload_progress_store.pop(upload_id, None)
-                    break
-            else:
+        # Subscribe before reading the snapshot so nothing published in
+        # between is lost; events are pushed by the progress listener.
+        queue = progress.subscribe(upload_id)
+        try:
+            event = await run_in_threadpool(progress.snapshot, upload_id)
+            if event is None or not visible(event):
                 yield f"data: {json.dumps({'percent': 0, 'status': 'waiting', 'message': 'Waiting...'})}\n\n"
-
-            await asyncio.sleep(0.5)
-            timeout += 0.5
+                event = None
+
+            idle = 0
+            while idle < PROGRESS_STREAM_IDLE_SECONDS:
+                if event is not None and visible(event):
+                    yield f"data: {json.dumps(event)}\n\n"
+                    if event["status"] in progress.TERMINAL_STATUSES:
+                        break
+                    idle = 0
+
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), PROGRESS_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    idle += PROGRESS_KEEPALIVE_SECONDS
+                    event = await run_in_threadpool(progress.snapshot, upload_id)
+                    if event is None:
+                        yield ": keepalive\n\n"
+        finally:
+            progress.unsubscribe(upload_id, queue)
 
     return StreamingResponse(
         event_stream(),
@@ -333,84 +514,97 @@ async def upload_progress_stream(
         }
     )
 
-def _process_file_sync(contents: bytes, name: str, upload_id: int) -> tuple:
+def _process_file_sync(contents: bytes, name: str, upload_id: int,
+                       timer: StageTimer = None) -> tuple:
+    """
+    Read, normalize, deduplicate and COPY one file into cleaned_data.
+    Each step is timed under its INGEST_STAGES name on timer (a fresh
+    StageTimer if none is given), which lets the benchmark harness
+    drive the exact same code path.
+    """
     import time
     start_total = time.time()
+    timer = timer or StageTimer()
 
     total_records = 0
     duplicate_records = 0
     seen_hashes = set()
 
     def update(pct, msg):
-        upload_progress_store[upload_id] = {
-            "percent": pct, "status": "processing", "message": msg
-        }
+        progress.publish(upload_id, pct, "processing", msg)
 
     if name.endswith(".xlsx") or name.endswith(".xls"):
-        t1 = time.time()
         update(20, "Reading Excel file...")
-        try:
-            df = pd.read_excel(io.BytesIO(contents), engine="calamine", dtype=str)
-        except Exception:
-            df = pd.read_excel(io.BytesIO(contents), dtype=str)
-        print(f"[SYNC] Read Excel: {time.time() - t1:.2f}s")
+        with timer.stage("read") as stage:
+            try:
+                df = pd.read_excel(io.BytesIO(contents), engine="calamine", dtype=str)
+            except Exception:
+                df = pd.read_excel(io.BytesIO(contents), dtype=str)
+            stage["rows"] = len(df)
 
         total_records = len(df)
         
-        t2 = time.time()
         update(50, f"Normalizing {total_records:,} rows...")
-        df = normalize_dataframe(df)
-        print(f"[SYNC] Normalize: {time.time() - t2:.2f}s")
+        with timer.stage("normalize", rows=total_records):
+            df = normalize_dataframe(df)
 
-        t3 = time.time()
         update(68, "Deduplicating...")
-        df["__hash"] = pd.util.hash_pandas_object(df, index=False).astype(str)
-        df = df.drop_duplicates(subset="__hash")
-        duplicate_records = total_records - len(df)
-        df = df.drop(columns=["__hash"])
-        print(f"[SYNC] Deduplicate: {time.time() - t3:.2f}s")
+        with timer.stage("dedup", rows=total_records):
+            df["__hash"] = pd.util.hash_pandas_object(df, index=False).astype(str)
+            df = df.drop_duplicates(subset="__hash")
+            duplicate_records = total_records - len(df)
+            df = df.drop(columns=["__hash"])
 
-        t4 = time.time()
         update(82, "Saving to database...")
-        copy_cleaned_data(engine, upload_id, df)
-        print(f"[SYNC] Save to DB: {time.time() - t4:.2f}s")
+        purge.check_not_deleted(upload_id)
+        with timer.stage("copy", rows=len(df)):
+            copy_cleaned_data(engine, upload_id, df)
 
     elif name.endswith(".csv"):
         estimated_total = max(contents.count(b'\n') - 1, 1)
         update(20, "Processing rows...")
 
         def csv_reader():
+            # Chunk sizes are chosen by chunking.adaptive_chunks
             try:
                 return pd.read_csv(
-                    io.BytesIO(contents), chunksize=500_000,
+                    io.BytesIO(contents), chunksize=chunking.CHUNK_PROBE_ROWS,
                     encoding="utf-8", low_memory=False, dtype=str
                 )
             except UnicodeDecodeError:
                 return pd.read_csv(
-                    io.BytesIO(contents), chunksize=500_000,
+                    io.BytesIO(contents), chunksize=chunking.CHUNK_PROBE_ROWS,
                     encoding="latin1", low_memory=False, dtype=str
                 )
 
         rows_done = 0
-        for chunk in csv_reader():
-            total_records += len(chunk)
-            chunk = normalize_dataframe(chunk)
-            chunk["__hash"] = pd.util.hash_pandas_object(
-                chunk, index=False
-            ).astype(str)
-            new_mask = ~chunk["__hash"].isin(seen_hashes)
-            chunk = chunk[new_mask]
-            seen_hashes.update(chunk["__hash"].tolist())
-            chunk = chunk.drop(columns=["__hash"])
-            copy_cleaned_data(engine, upload_id, chunk)
-
-            rows_done += len(chunk)
-            pct = int(20 + (rows_done / estimated_total) * 68)
-            update(min(pct, 88),
-                   f"Processed {rows_done:,} / {estimated_total:,} rows...")
+        with closing(chunking.adaptive_chunks(
+            csv_reader(), f"Upload {upload_id}", timer=timer
+        )) as chunks:
+            for chunk in chunks:
+                total_records += len(chunk)
+                with timer.stage("normalize", rows=len(chunk)):
+                    chunk = normalize_dataframe(chunk)
+                with timer.stage("dedup", rows=len(chunk)):
+                    chunk["__hash"] = pd.util.hash_pandas_object(
+                        chunk, index=False
+                    ).astype(str)
+                    new_mask = ~chunk["__hash"].isin(seen_hashes)
+                    chunk = chunk[new_mask]
+                    seen_hashes.update(chunk["__hash"].tolist())
+                    chunk = chunk.drop(columns=["__hash"])
+                purge.check_not_deleted(upload_id)
+                with timer.stage("copy", rows=len(chunk)):
+                    copy_cleaned_data(engine, upload_id, chunk)
+
+                rows_done += len(chunk)
+                pct = int(20 + (rows_done / estimated_total) * 68)
+                update(min(pct, 88),
+                       f"Processed {rows_done:,} / {estimated_total:,} rows...")
 
         duplicate_records = total_records - len(seen_hashes)
 
+    print(f"[SYNC] {timer.summary()}")
     print(f"[SYNC] TOTAL _process_file_sync: {time.time() - start_total:.2f}s")
     return total_records, duplicate_records
 
@@ -436,6 +630,7 @@ async def upload_file(
             text("""
                 SELECT 1 FROM upload_log
                 WHERE filename = :fname AND created_by_user_id = :uid
+                  AND processing_status IS DISTINCT FROM 'deleting'
                 LIMIT 1
             """),
             {"fname": original_filename, "uid": user["id"]}
@@ -503,9 +698,7 @@ async def upload_file(
         }
 
     # ── Save raw file to disk for background processing ──
-    queue_dir = os.path.join(tempfile.gettempdir(), "datavault_queue")
-    os.makedirs(queue_dir, exist_ok=True)
-    queued_file_path = os.path.join(queue_dir, f"{upload_id}.data")
+    queued_file_path = _queued_file_path(upload_id)
     with open(queued_file_path, 'wb') as f:
         f.write(contents)
 
@@ -513,8 +706,8 @@ async def upload_file(
 
     # ── Insert upload_log immediately with processing_status = 'processing' ──
     with engine.connect() as conn:
-        conn.execute(
-            text("""
+        inserted = conn.execute(
+            text(f"""
                 INSERT INTO upload_log
                 (upload_id, category_id, filename,
                  total_records, duplicate_records,
@@ -524,6 +717,7 @@ async def upload_file(
                 VALUES
                 (:uid, :cid, :f, 0, 0, 0, 'PROCESSING', :user_id,
                  'no_issue', :orig, :final, 'original', 'processing')
+                RETURNING {stats.UPLOAD_STATS_COLUMNS}
             """),
             {
                 "uid": upload_id, "cid": category_id,
@@ -532,13 +726,17 @@ async def upload_file(
                 "orig": json.dumps(original_headers),
                 "final": json.dumps(final_headers)
             }
-        )
+        ).fetchone()
+        stats.upload_added(conn, inserted._mapping)
         conn.commit()
 
-    # ── Fire background task — does NOT block response ──
-    loop = asyncio.get_event_loop()
-    loop.run_in_executor(
-        executor,
+    progress.publish(upload_id, 0, "queued", "Queued for processing...",
+                     user_id=user["id"])
+
+    # ── Queue background task — does NOT block response ──
+    metrics.INGEST_QUEUED.inc()
+    ingest_queue.SCHEDULER.submit(
+        upload_id, user["id"], len(contents),
         _process_file_background,
         upload_id, queued_file_path, original_filename
     )
@@ -551,12 +749,59 @@ async def upload_file(
         "message": "File queued for processing"
     }
 
+def _build_dup_summary(conn, upload_id: int):
+    """
+    Stores per-match-type group counts for one upload in upload_dup_summary
+    (one row each for email, phone and merged). Uses the same normalization
+    as /related-grouped, so the summary matches what that view lists.
+    """
+    conn.execute(
+        text("DELETE FROM upload_dup_summary WHERE upload_id = :uid"),
+        {"uid": upload_id}
+    )
+    conn.execute(text("""
+        INSERT INTO upload_dup_summary (upload_id, match_type, groups, records)
+        WITH
+        normalized AS (
+            SELECT
+                NULLIF(LOWER(TRIM(row_data->>'email')), 'nan') AS email,
+                REGEXP_REPLACE(COALESCE(row_data->>'phone', ''), '[^0-9]', '', 'g') AS phone
+            FROM cleaned_data
+            WHERE upload_id = :uid
+        ),
+        dup_groups AS (
+            SELECT 'email' AS match_type, COUNT(*) AS record_count
+            FROM normalized
+            WHERE email != ''
+            GROUP BY email HAVING COUNT(*) > 1
+            UNION ALL
+            SELECT 'phone', COUNT(*)
+            FROM normalized
+            WHERE phone != ''
+            GROUP BY phone HAVING COUNT(*) > 1
+            UNION ALL
+            SELECT 'merged', COUNT(*)
+            FROM normalized
+            WHERE email != '' AND phone != ''
+            GROUP BY email, phone HAVING COUNT(*) > 1
+        )
+        SELECT :uid, m.match_type,
+               COUNT(g.record_count), COALESCE(SUM(g.record_count), 0)
+        FROM (VALUES ('email'), ('phone'), ('merged')) AS m(match_type)
+        LEFT JOIN dup_groups g ON g.match_type = m.match_type
+        GROUP BY m.match_type
+    """), {"uid": upload_id})
+
 def _build_cache_for_upload(upload_id: int):
     """
-    Computes duplicate groups for one upload and stores in related_groups_cache.
-    Takes ~1-3s per file. Called at end of _process_file_background().
+    Computes duplicate groups for one upload and stores in related_groups_cache,
+    plus its upload_dup_summary rows, and flags its category's cross-file
+    summary for a rebuild. Takes ~1-3s per file. Called at end of
+    _process_file_background() and resolve_headers().
     """
     with engine.connect() as conn:
+        _build_dup_summary(conn, upload_id)
+
         conn.execute(
             text("DELETE FROM related_groups_cache WHERE upload_id = :uid"),
             {"uid": upload_id}
@@ -632,68 +877,294 @@ def _build_cache_for_upload(upload_id: int):
             HAVING COUNT(*) >= 1
         """), {"uid": upload_id})
 
+        conn.execute(text("""
+            INSERT INTO related_groups_cache_state (upload_id, version, built_at)
+            VALUES (:uid, :v, NOW())
+            ON CONFLICT (upload_id) DO UPDATE
+            SET version = EXCLUDED.version, built_at = EXCLUDED.built_at
+        """), {"uid": upload_id, "v": GROUPS_CACHE_VERSION})
+
+        category_groups.mark_uploads_dirty(conn, [upload_id])
+
         conn.commit()
     print(f"[CACHE] Built groups cache for upload_id={upload_id}")
 
+def _run_cache_rebuild(job_id: int, upload_ids: list):
+    """Rebuilds the given uploads across cache_rebuild_executor, recording progress."""
+    def record(outcome: str):
+        column = "rebuilt" if outcome == "rebuilt" else "failed"
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                UPDATE cache_rebuild_jobs
+                SET {column} = {column} + 1, updated_at = NOW()
+                WHERE id = :id
+            """), {"id": job_id})
+
+    futures = {
+        cache_rebuild_executor.submit(_build_cache_for_upload, uid): uid
+        for uid in upload_ids
+    }
+    for future in as_completed(futures):
+        try:
+            future.result()
+            record("rebuilt")
+        except Exception as e:
+            print(f"[CACHE] Failed for {futures[future]}: {e}")
+            record("failed")
+
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE cache_rebuild_jobs
+            SET status = 'finished', finished_at = NOW(), updated_at = NOW()
+            WHERE id = :id
+        """), {"id": job_id})
+    print(f"[CACHE] Rebuild job {job_id} finished ({len(upload_ids)} uploads)")
+
+def _backfill_cache(upload_id: int):
+    try:
+        purge.check_not_deleted(upload_id)
+        _build_cache_for_upload(upload_id)
+        purge.sweep_after_job(upload_id)
+    except purge.UploadDeleted:
+        pass
+    except Exception as e:
+        print(f"[CACHE] Backfill failed for upload_id={upload_id}: {e}")
+    finally:
+        with _cache_backfill_lock:
+            _cache_backfill_pending.discard(upload_id)
+
+def _queue_cache_backfill(upload_ids: list):
+    """
+    Rebuild, in the background, the groups cache of uploads ingested
+    before upload_dup_summary existed (cache version < 2). Read endpoints
+    call this and report those uploads as pending instead of building
+    their summary inline.
+    """
+    with _cache_backfill_lock:
+        queued = [u for u in upload_ids if u not in _cache_backfill_pending]
+        _cache_backfill_pending.update(queued)
+    for upload_id in queued:
+        cache_rebuild_executor.submit(_backfill_cache, upload_id)
+    if queued:
+        print(f"[CACHE] Queued backfill for {len(queued)} upload(s) without a duplicate summary")
+
+def _cache_job_dict(row) -> dict:
+    return {
+        "job_id": row.id,
+        "status": row.status,
+        "force": row.force,
+        "total": row.total,
+        "rebuilt": row.rebuilt,
+        "failed": row.failed,
+        "percent": (
+            int((row.rebuilt + row.failed) * 100 / row.total) if row.total else 100
+        ),
+        "started_at": str(row.started_at),
+        "finished_at": str(row.finished_at) if row.finished_at else None
+    }
+
 @app.get("/admin/rebuild-phone-cache")
-def rebuild_phone_cache(current_user: dict = Depends(get_current_user)):
+def rebuild_phone_cache(
+    force: bool = Query(False),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Starts a background rebuild of related_groups_cache and returns at once.
+    Only uploads with no cache, or one built by an older
+    GROUPS_CACHE_VERSION, are rebuilt unless force=true.
+    Poll /admin/rebuild-phone-cache/status for progress.
+    """
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin only")
-    
+
     with engine.begin() as conn:
-        ids = conn.execute(text(
-            "SELECT DISTINCT upload_id FROM upload_log WHERE processing_status = 'ready'"
-        )).fetchall()
+        # One job at a time across all processes
+        conn.execute(text("LOCK TABLE cache_rebuild_jobs IN EXCLUSIVE MODE"))
+        running = conn.execute(text("""
+            SELECT * FROM cache_rebuild_jobs
+            WHERE status = 'running'
+              AND updated_at > NOW() - INTERVAL '1 minute' * :stale
+            ORDER BY id DESC
+            LIMIT 1
+        """), {"stale": CACHE_REBUILD_STALE_MINUTES}).fetchone()
+        if running:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Cache rebuild job {running.id} is already running"
+            )
+
+        ids = [r.upload_id for r in conn.execute(text("""
+            SELECT ul.upload_id
+            FROM upload_log ul
+            LEFT JOIN related_groups_cache_state s ON s.upload_id = ul.upload_id
+            WHERE ul.processing_status = 'ready'
+              AND (:force OR s.version IS NULL OR s.version < :v)
+            ORDER BY ul.upload_id
+        """), {"force": force, "v": GROUPS_CACHE_VERSION}).fetchall()]
+
+        job = conn.execute(text("""
+            INSERT INTO cache_rebuild_jobs (requested_by, force, total, status)
+            VALUES (:uid, :force, :total, :status)
+            RETURNING *
+        """), {
+            "uid": current_user["id"], "force": force, "total": len(ids),
+            "status": "running" if ids else "finished"
+        }).fetchone()
+
+    if ids:
+        threading.Thread(
+            target=_run_cache_rebuild, args=(job.id, ids),
+            name=f"cache-rebuild-{job.id}", daemon=True
+        ).start()
+
+    return {"success": True, **_cache_job_dict(job)}
+
+@app.get("/admin/rebuild-phone-cache/status")
+def rebuild_phone_cache_status(
+    job_id: int | None = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Progress of one rebuild job (latest if job_id is omitted)."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    with engine.begin() as conn:
+        if job_id:
+            job = conn.execute(
+                text("SELECT * FROM cache_rebuild_jobs WHERE id = :id"),
+                {"id": job_id}
+            ).fetchone()
+        else:
+            job = conn.execute(
+                text("SELECT * FROM cache_rebuild_jobs ORDER BY id DESC LIMIT 1")
+            ).fetchone()
+
+        stale = conn.execute(
+            text("SELECT COUNT(*) FROM upload_log ul "
+                 "LEFT JOIN related_groups_cache_state s ON s.upload_id = ul.upload_id "
+                 "WHERE ul.processing_status = 'ready' "
+                 "AND (s.version IS NULL OR s.version < :v)"),
+            {"v": GROUPS_CACHE_VERSION}
+        ).scalar()
+
+    if not job:
+        if job_id:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return {"job": None, "stale_uploads": stale}
+
+    return {"job": _cache_job_dict(job), "stale_uploads": stale}
+
+def _finish_ready_upload(upload_id: int, original_filename: str,
+                         timer: StageTimer, file_bytes: int, total_records: int,
+                         duplicate_records: int, seconds: float):
+    """
+    Follow-up work for an upload whose 'ready' row is already committed.
+    Each step is best-effort: a failure is logged and never turns the
+    upload into a failed one (a missing groups cache is redone by the
+    cache rebuild job).
+    """
+    name = original_filename.lower()
+    try:
+        log_to_csv(original_filename, total_records, duplicate_records, 0, "SUCCESS")
+    except Exception as e:
+        print(f"[LOG] Could not log upload {upload_id}: {e}")
+    try:
+        purge.check_not_deleted(upload_id)
+        with timer.stage("cache", rows=total_records - duplicate_records):
+            _build_cache_for_upload(upload_id)
+    except purge.UploadDeleted:
+        return
+    except Exception as e:
+        print(f"[CACHE] Groups cache build failed for upload {upload_id}: {e}")
 
-    rebuilt = 0
-    failed = 0
-    for row in ids:
+    progress.publish(upload_id, 100, "done", f"{total_records:,} records ready")
+    metrics.observe_ingest(timer, os.path.splitext(name)[1].lstrip("."), total_records)
+    metrics.UPLOADS_PROCESSED.inc(outcome="ready")
+    profiling.save_profile(upload_id, timer, file_bytes, total_records, seconds, "ready")
+    _pregenerate_exports(upload_id)
+
+def _queued_file_path(upload_id: int) -> str:
+    queue_dir = os.path.join(tempfile.gettempdir(), "datavault_queue")
+    os.makedirs(queue_dir, exist_ok=True)
+    return os.path.join(queue_dir, f"{upload_id}.data")
+
+
+def _cancel_queued_ingest(upload_ids):
+    """
+    Drop deleted uploads still waiting for an ingest worker in this process.
+    A job already running, or queued in another process, stops at its next
+    purge.check_not_deleted.
+    """
+    for upload_id in ingest_queue.SCHEDULER.cancel(upload_ids):
+        metrics.INGEST_QUEUED.dec()
         try:
-            _build_cache_for_upload(row.upload_id)
-            rebuilt += 1
-        except Exception as e:
-            print(f"Failed for {row.upload_id}: {e}")
-            failed += 1
+            os.remove(_queued_file_path(upload_id))
+        except OSError:
+            pass
+        print(f"[QUEUE] Cancelled queued job for deleted upload {upload_id}")
 
-    return {"success": True, "rebuilt": rebuilt, "failed": failed}
 
 def _process_file_background(upload_id: int, queued_file_path: str,
                               original_filename: str):
     """
-    Runs in thread pool after upload returns.
+    Runs on an ingest_queue worker after upload returns.
     Reads queued file, processes it, updates upload_log when done.
     """
+    metrics.INGEST_QUEUED.dec()
+    metrics.INGEST_BUSY.inc()
+    timer = StageTimer(
+        sample_rss=profiling.PROFILE_SAMPLE_RSS,
+        trace_memory=profiling.PROFILE_TRACEMALLOC
+    )
+    started = time.perf_counter()
+    file_bytes = None
+    total_records = 0
     try:
+        purge.check_not_deleted(upload_id)
         with open(queued_file_path, 'rb') as f:
             contents = f.read()
+        file_bytes = len(contents)
 
         name = original_filename.lower()
 
         total_records, duplicate_records = _process_file_sync(
-            contents, name, upload_id
+            contents, name, upload_id, timer
         )
 
         # ── Update upload_log with final counts and mark ready ──
         with engine.connect() as conn:
-            conn.execute(
-                text("""
+            updated = conn.execute(
+                text(f"""
                     UPDATE upload_log
                     SET total_records = :t,
                         duplicate_records = :d,
                         status = 'SUCCESS',
                         processing_status = 'ready'
                     WHERE upload_id = :uid
+                      AND processing_status IS DISTINCT FROM 'deleting'
+                    RETURNING {stats.UPLOAD_STATS_COLUMNS}
                 """),
                 {
                     "t": total_records,
                     "d": duplicate_records,
                     "uid": upload_id
                 }
+            ).fetchone()
+            if not updated:
+                raise purge.UploadDeleted(upload_id)
+            stats.upload_changed(
+                conn, {**updated._mapping, **_PROCESSING_UPLOAD}, updated._mapping
             )
             conn.commit()
 
-        log_to_csv(original_filename, total_records, duplicate_records, 0, "SUCCESS")
-        _build_cache_for_upload(upload_id)
+        _finish_ready_upload(
+            upload_id, original_filename, timer, file_bytes,
+            total_records, duplicate_records, time.perf_counter() - started
+        )
+
+    except purge.UploadDeleted:
+        print(f"[QUEUE] Upload {upload_id} was deleted while processing; stopped")
+        metrics.UPLOADS_PROCESSED.inc(outcome="deleted")
 
     except Exception as e:
         import traceback
@@ -702,25 +1173,51 @@ def _process_file_background(upload_id: int, queued_file_path: str,
         # Mark as failed so frontend can show error state
         try:
             with engine.connect() as conn:
-                conn.execute(
-                    text("""
+                updated = conn.execute(
+                    text(f"""
                         UPDATE upload_log
                         SET status = 'FAILED',
                             processing_status = 'failed'
                         WHERE upload_id = :uid
+                          AND processing_status = 'processing'
+                        RETURNING {stats.UPLOAD_STATS_COLUMNS}
                     """),
                     {"uid": upload_id}
-                )
+                ).fetchone()
+                if updated:
+                    stats.upload_changed(
+                        conn, {**updated._mapping, **_PROCESSING_UPLOAD}, updated._mapping
+                    )
                 conn.commit()
         except Exception:
             pass
 
+        progress.publish(upload_id, 0, "error", f"Processing failed: {e}")
+        metrics.UPLOADS_PROCESSED.inc(outcome="failed")
+        profiling.save_profile(
+            upload_id, timer, file_bytes, total_records,
+            time.perf_counter() - started, "failed"
+        )
+
     finally:
+        metrics.INGEST_BUSY.dec()
         # Always clean up the queued file
         try:
             os.remove(queued_file_path)
         except Exception:
             pass
+        try:
+            purge.sweep_after_job(upload_id)
+        except Exception as e:
+            print(f"[PURGE] Could not check upload {upload_id} after its job: {e}")
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus scrape endpoint (this worker process's figures)."""
+    return Response(
+        content=metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 @app.get("/upload/{upload_id}/headers")
 def get_upload_headers(
@@ -749,7 +1246,7 @@ def get_upload_headers(
     }
 
 @app.post("/upload/{upload_id}/resolve-headers")
-async def resolve_headers(
+def resolve_headers(
     upload_id: int,
     request: HeaderResolutionRequest,
     user: dict = Depends(get_current_user)
@@ -821,46 +1318,55 @@ async def resolve_headers(
     total_records = 0
     duplicate_records = 0
     seen_hashes = set()
-
-    with engine.connect() as conn:
-        conn.execute(text("DROP INDEX IF EXISTS idx_cleaned_data_upload_id"))
-        conn.commit()
+    timer = StageTimer(
+        sample_rss=profiling.PROFILE_SAMPLE_RSS,
+        trace_memory=profiling.PROFILE_TRACEMALLOC
+    )
+    started = time.perf_counter()
 
     if name.endswith(".csv"):
         try:
             reader = pd.read_csv(
                 io.BytesIO(contents), 
-                chunksize=100_000, 
+                chunksize=chunking.CHUNK_PROBE_ROWS, 
                 encoding="utf-8",
                 header=header_param
             )
         except UnicodeDecodeError:
             reader = pd.read_csv(
                 io.BytesIO(contents), 
-                chunksize=100_000, 
+                chunksize=chunking.CHUNK_PROBE_ROWS, 
                 encoding="latin1",
                 header=header_param
             )
         
-        for chunk in reader:
-            chunk.columns = final_column_names
-            total_records += len(chunk)
-            
-            if ingestion_mode == 'normalized':
-                chunk = normalize_dataframe(chunk)
-            
-            chunk = chunk.drop_duplicates()
-            chunk["__hash"] = pd.util.hash_pandas_object(chunk, index=False).astype(str)
-            chunk = chunk[~chunk["__hash"].isin(seen_hashes)]
-            seen_hashes.update(chunk["__hash"])
-            chunk = chunk.drop(columns=["__hash"])
-            copy_cleaned_data(engine, upload_id, chunk)
+        with closing(chunking.adaptive_chunks(
+            reader, f"Upload {upload_id}", timer=timer
+        )) as chunks:
+            for chunk in chunks:
+                chunk.columns = final_column_names
+                total_records += len(chunk)
+                
+                if ingestion_mode == 'normalized':
+                    with timer.stage("normalize", rows=len(chunk)):
+                        chunk = normalize_dataframe(chunk)
+                
+                with timer.stage("dedup", rows=len(chunk)):
+                    chunk = chunk.drop_duplicates()
+                    chunk["__hash"] = pd.util.hash_pandas_object(chunk, index=False).astype(str)
+                    chunk = chunk[~chunk["__hash"].isin(seen_hashes)]
+                    seen_hashes.update(chunk["__hash"])
+                    chunk = chunk.drop(columns=["__hash"])
+                with timer.stage("copy", rows=len(chunk)):
+                    copy_cleaned_data(engine, upload_id, chunk)
 
         duplicate_records = total_records - len(seen_hashes)
     
     else:
         if name.endswith(".xls") or name.endswith(".xlsx"):
-            df = pd.read_excel(io.BytesIO(contents), header=header_param)
+            with timer.stage("read") as stage:
+                df = pd.read_excel(io.BytesIO(contents), header=header_param)
+                stage["rows"] = len(df)
         else:
             raise HTTPException(status_code=400, detail="Unsupported file")
         
@@ -868,22 +1374,21 @@ async def resolve_headers(
         total_records = len(df)
         
         if ingestion_mode == 'normalized':
-            df = normalize_dataframe(df)
+            with timer.stage("normalize", rows=total_records):
+                df = normalize_dataframe(df)
         
-        df = df.drop_duplicates()
-        df["__hash"] = df.astype(str).agg("|".join, axis=1)
-        df = df.drop_duplicates(subset="__hash")
-        duplicate_records = total_records - len(df)
-        df = df.drop(columns=["__hash"])
-        copy_cleaned_data(engine, upload_id, df)
+        with timer.stage("dedup", rows=total_records):
+            df = df.drop_duplicates()
+            df["__hash"] = df.astype(str).agg("|".join, axis=1)
+            df = df.drop_duplicates(subset="__hash")
+            duplicate_records = total_records - len(df)
+            df = df.drop(columns=["__hash"])
+        with timer.stage("copy", rows=len(df)):
+            copy_cleaned_data(engine, upload_id, df)
 
     with engine.connect() as conn:
-        conn.execute(text("CREATE INDEX idx_cleaned_data_upload_id ON cleaned_data(upload_id)"))
-        conn.commit()
-
-    with engine.connect() as conn:
-        conn.execute(
-            text("""
+        inserted = conn.execute(
+            text(f"""
                 INSERT INTO upload_log
                 (upload_id, category_id, filename,
                  total_records, duplicate_records,
@@ -893,6 +1398,7 @@ async def resolve_headers(
                 VALUES
                 (:uid, :cid, :f, :t, :d, 0, 'SUCCESS', :user_id,
                  'resolved', :orig, :final, :res_type, :first_data)
+                RETURNING {stats.UPLOAD_STATS_COLUMNS}
             """),
             {
                 "uid": upload_id,
@@ -906,9 +1412,18 @@ async def resolve_headers(
                 "res_type": resolution_type,
                 "first_data": first_row_is_data
             }
-        )
+        ).fetchone()
+        stats.upload_added(conn, inserted._mapping)
         conn.commit()
 
+    with timer.stage("cache", rows=total_records - duplicate_records):
+        _build_cache_for_upload(upload_id)
+    metrics.observe_ingest(timer, os.path.splitext(name)[1].lstrip("."), total_records)
+    profiling.save_profile(
+        upload_id, timer, len(contents), total_records,
+        time.perf_counter() - started, "ready"
+    )
+
     try:
         os.remove(temp_file_path)
         os.remove(temp_meta_path)
@@ -939,8 +1454,15 @@ def list_uploads(
     date_to: date | None = None,
     current_user: dict = Depends(get_current_user),
     created_by_user_id: int | None = None,
+    limit: int | None = Query(None, ge=1, le=500),
+    cursor: str | None = None,
 ):
-    where = []
+    """
+    Uploads newest first. With limit, returns one keyset page:
+    {"uploads": [...], "next_cursor": ...}; pass next_cursor back as
+    cursor for the following page. Without limit, returns the full list.
+    """
+    where = ["u.processing_status IS DISTINCT FROM 'deleting'"]
     params = {}
 
     if current_user["role"] != "admin":
@@ -975,15 +1497,31 @@ def list_uploads(
         where.append("u.duplicate_records <= :dmax")
         params["dmax"] = dup_max
 
+    # Plain ranges on uploaded_at so idx_upload_log_uploaded_at applies
     if date_from:
-        where.append("u.uploaded_at::date >= :df")
+        where.append("u.uploaded_at >= :df")
         params["df"] = date_from
 
     if date_to:
-        where.append("u.uploaded_at::date <= :dt")
-        params["dt"] = date_to
+        where.append("u.uploaded_at < :dt")
+        params["dt"] = date_to + timedelta(days=1)
+
+    if cursor:
+        try:
+            cursor_at, cursor_id = cursor.rsplit("|", 1)
+            params["c_at"] = datetime.fromisoformat(cursor_at)
+            params["c_id"] = int(cursor_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        where.append("(u.uploaded_at, u.upload_id) < (:c_at, :c_id)")
+
+    where_sql = "WHERE " + " AND ".join(where)
 
-    where_sql = "WHERE " + " AND ".join(where) if where else ""
+    limit_sql = ""
+    if limit:
+        # One extra row tells us whether another page exists
+        limit_sql = "LIMIT :lim"
+        params["lim"] = limit + 1
 
     with engine.begin() as conn:
         rows = conn.execute(
@@ -1001,12 +1539,18 @@ def list_uploads(
                 JOIN categories c ON c.id = u.category_id
                 JOIN users usr ON usr.id = u.created_by_user_id
                 {where_sql}
-                ORDER BY u.uploaded_at DESC
+                ORDER BY u.uploaded_at DESC, u.upload_id DESC
+                {limit_sql}
             """),
             params
         ).fetchall()
 
-    return [
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1].uploaded_at.isoformat()}|{rows[-1].upload_id}"
+
+    uploads = [
             {
                 "upload_id": r.upload_id,
                 "filename": r.filename,
@@ -1024,6 +1568,10 @@ def list_uploads(
             for r in rows
         ]
 
+    if limit:
+        return {"uploads": uploads, "next_cursor": next_cursor}
+    return uploads
+
 @app.get("/upload/{upload_id}/status")
 def get_upload_status(
     upload_id: int,
@@ -1052,6 +1600,40 @@ def get_upload_status(
         "status": result.status
     }
 
+@app.post("/uploads/status")
+def get_upload_statuses(
+    request: UploadStatusRequest,
+    user: dict = Depends(get_current_user)
+):
+    """Batched /upload/{upload_id}/status — one query for many uploads."""
+    if not request.upload_ids:
+        return []
+
+    sql = """
+        SELECT upload_id, processing_status, total_records,
+               duplicate_records, status
+        FROM upload_log
+        WHERE upload_id = ANY(:ids)
+    """
+    params = {"ids": request.upload_ids}
+    if user["role"] != "admin":
+        sql += " AND created_by_user_id = :uid"
+        params["uid"] = user["id"]
+
+    with engine.begin() as conn:
+        rows = conn.execute(text(sql), params).fetchall()
+
+    return [
+        {
+            "upload_id": r.upload_id,
+            "processing_status": r.processing_status,
+            "total_records": r.total_records,
+            "duplicate_records": r.duplicate_records,
+            "status": r.status
+        }
+        for r in rows
+    ]
+
 @app.post("/admin/cleanup-temp-uploads")
 def cleanup_abandoned_uploads(user: dict = Depends(admin_only)):
     import glob
@@ -1136,76 +1718,15 @@ def preview_data(
         "total_records": total
     }
 
-@app.get("/admin/dashboard-stats")
-def dashboard_stats(
-    days: int = Query(30),
-    current_user: dict = Depends(get_current_user)
-):
-    if current_user["role"] != "admin":
-        raise HTTPException(status_code=403, detail="Admin only")
-
+def _dashboard_derived(days: int) -> dict:
+    """Dashboard sections that need aggregation — served through stats.cached()."""
     with engine.begin() as conn:
 
-        # ── USERS ──────────────────────────────────────────────────────────
-        user_stats = conn.execute(text("""
-            SELECT
-                COUNT(*)                                    AS total,
-                COUNT(*) FILTER (WHERE is_active = true)   AS active,
-                COUNT(*) FILTER (WHERE is_active = false)  AS disabled
-            FROM users
-        """)).fetchone()
-
-        # ── FILES ──────────────────────────────────────────────────────────
-        file_stats = conn.execute(text("""
-            SELECT
-                COUNT(*)                                                        AS total,
-                COALESCE(SUM(total_records), 0)                                 AS total_records,
-                COALESCE(AVG(total_records), 0)                                 AS avg_per_file,
-                COUNT(*) FILTER (WHERE processing_status = 'processing')        AS processing,
-                COUNT(*) FILTER (WHERE processing_status = 'failed'
-                                    OR status = 'FAILED')                       AS failed
-            FROM upload_log
-        """)).fetchone()
-
-        # ── STORAGE HEALTH — orphaned rows ─────────────────────────────────
-        orphan_count = conn.execute(text("""
-            SELECT COUNT(*)
-            FROM cleaned_data cd
-            LEFT JOIN upload_log ul ON ul.upload_id = cd.upload_id
-            WHERE ul.upload_id IS NULL
-        """)).scalar()
-
-        # ── ACTIVITY OVER TIME ─────────────────────────────────────────────
-        activity = conn.execute(text("""
-            SELECT
-                uploaded_at::date                   AS date,
-                COUNT(*)                            AS files,
-                COALESCE(SUM(total_records), 0)     AS records
-            FROM upload_log
-            WHERE uploaded_at >= NOW() - INTERVAL '1 day' * :days
-            GROUP BY uploaded_at::date
-            ORDER BY uploaded_at::date
-        """), {"days": days}).fetchall()
-
-        # ── USER BREAKDOWN ─────────────────────────────────────────────────
-        user_breakdown = conn.execute(text("""
-            SELECT
-                u.email,
-                COUNT(ul.upload_id)                                 AS files,
-                COALESCE(SUM(ul.total_records), 0)                  AS records,
-                COALESCE(SUM(ul.duplicate_records), 0)              AS duplicates,
-                CASE
-                    WHEN SUM(ul.total_records) > 0
-                    THEN (SUM(ul.duplicate_records)::float
-                          / SUM(ul.total_records) * 100)
-                    ELSE 0
-                END                                                 AS avg_dup_rate
-            FROM users u
-            LEFT JOIN upload_log ul ON ul.created_by_user_id = u.id
-            WHERE u.role != 'admin'
-            GROUP BY u.id, u.email
-            ORDER BY files DESC
-        """)).fetchall()
+        # ── ACTIVITY OVER TIME / USER BREAKDOWN ────────────────────────────
+        # Both read upload_daily_rollup (one row per day and user), which the
+        # ingestion and delete paths keep current.
+        activity = stats.activity_series(conn, days)
+        user_breakdown = stats.user_breakdown(conn)
 
         # ── FILE TYPES ─────────────────────────────────────────────────────
         file_types = conn.execute(text("""
@@ -1213,6 +1734,7 @@ def dashboard_stats(
                 LOWER(SUBSTRING(filename FROM '\.([^.]+)$')) AS ext,
                 COUNT(*)                                      AS count
             FROM upload_log
+            WHERE processing_status IS DISTINCT FROM 'deleting'
             GROUP BY ext
             ORDER BY count DESC
         """)).fetchall()
@@ -1223,6 +1745,7 @@ def dashboard_stats(
                 COALESCE(processing_status, 'ready') AS status,
                 COUNT(*)                              AS count
             FROM upload_log
+            WHERE processing_status IS DISTINCT FROM 'deleting'
             GROUP BY processing_status
             ORDER BY count DESC
         """)).fetchall()
@@ -1242,38 +1765,22 @@ def dashboard_stats(
             FROM upload_log ul
             JOIN users u      ON u.id  = ul.created_by_user_id
             JOIN categories c ON c.id  = ul.category_id
+            WHERE ul.processing_status IS DISTINCT FROM 'deleting'
             ORDER BY ul.uploaded_at DESC
             LIMIT 10
         """)).fetchall()
 
     return {
-        "users": {
-            "total":    user_stats.total,
-            "active":   user_stats.active,
-            "disabled": user_stats.disabled,
-            "breakdown": [
-                {
-                    "email":        r.email,
-                    "files":        r.files,
-                    "records":      r.records,
-                    "duplicates":   r.duplicates,
-                    "avg_dup_rate": round(float(r.avg_dup_rate), 2)
-                }
-                for r in user_breakdown
-            ]
-        },
-        "files": {
-            "total":      file_stats.total,
-            "processing": file_stats.processing,
-            "failed":     file_stats.failed
-        },
-        "records": {
-            "total":        file_stats.total_records,
-            "avg_per_file": float(file_stats.avg_per_file)
-        },
-        "health": {
-            "orphaned_rows": orphan_count
-        },
+        "breakdown": [
+            {
+                "email":        r.email,
+                "files":        r.files,
+                "records":      r.records,
+                "duplicates":   r.duplicates,
+                "avg_dup_rate": round(float(r.avg_dup_rate), 2)
+            }
+            for r in user_breakdown
+        ],
         "activity": [
             {
                 "date":    str(r.date),
@@ -1305,6 +1812,108 @@ def dashboard_stats(
         ]
     }
 
+@app.get("/admin/dashboard-stats")
+def dashboard_stats(
+    days: int = Query(30),
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    # Headline numbers come from dashboard_counters, which the write paths
+    # keep current; orphaned_rows is refreshed by the background stats job.
+    with engine.begin() as conn:
+        counters = stats.read_counters(conn)
+
+    derived = stats.cached(("dashboard", days), lambda: _dashboard_derived(days))
+
+    files_total = counters["files_total"]
+
+    return {
+        "users": {
+            "total":    counters["users_total"],
+            "active":   counters["users_active"],
+            "disabled": counters["users_total"] - counters["users_active"],
+            "breakdown": derived["breakdown"]
+        },
+        "files": {
+            "total":      files_total,
+            "processing": counters["files_processing"],
+            "failed":     counters["files_failed"]
+        },
+        "records": {
+            "total":        counters["records_total"],
+            "avg_per_file": counters["records_total"] / files_total if files_total else 0.0
+        },
+        "health": {
+            "orphaned_rows": counters["orphaned_rows"],
+            "checked_at":    counters["orphans_checked_at"]
+        },
+        "activity":          derived["activity"],
+        "file_types":        derived["file_types"],
+        "processing_status": derived["processing_status"],
+        "recent_activity":   derived["recent_activity"]
+    }
+
+@app.get("/admin/ingest-profiles")
+def ingest_profiles(
+    order: str = Query("slowest", pattern="^(slowest|slowest_rate|memory|python_memory|recent)$"),
+    outcome: str | None = Query(None, pattern="^(ready|failed)$"),
+    limit: int = Query(20, ge=1, le=200),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Per-upload ingestion profiles (stage timings, rows/sec, peak RSS,
+    chunk count), plus the median rows/sec per stage to compare against.
+    """
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    with engine.begin() as conn:
+        return {
+            "profiles": profiling.read_profiles(conn, order, limit, outcome),
+            "baseline": profiling.stage_baseline(conn)
+        }
+
+@app.get("/admin/ingest-queue")
+def ingest_queue_state(current_user: dict = Depends(get_current_user)):
+    """Running and queued uploads of this worker process, in dispatch order."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    return ingest_queue.SCHEDULER.state()
+
+@app.get("/admin/slow-queries")
+def slow_queries(
+    route: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    """Captured EXPLAIN (ANALYZE, BUFFERS) samples, newest first (querylog.py)."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    with engine.begin() as conn:
+        return {
+            "capture_enabled": querylog.EXPLAIN_CAPTURE,
+            "threshold_ms": querylog.EXPLAIN_THRESHOLD_MS,
+            "explains": querylog.read_explains(conn, route, limit)
+        }
+
+@app.get("/admin/slow-queries/{explain_id}")
+def slow_query_detail(
+    explain_id: int,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    with engine.begin() as conn:
+        explain = querylog.read_explain(conn, explain_id)
+    if not explain:
+        raise HTTPException(status_code=404, detail="Not found")
+    return explain
+
 @app.get("/search")
 def search_data(
     upload_id: int,
@@ -1454,6 +2063,8 @@ def reset_user_password(
     if res.rowcount == 0:
         raise HTTPException(status_code=404, detail="User not found")
 
+    invalidate_user(user_id)
+
     return {"success": True}
 
 @app.delete("/admin/users/{user_id}")
@@ -1467,7 +2078,7 @@ def delete_user(
 
     with engine.begin() as conn:
         target = conn.execute(
-            text("SELECT id, email FROM users WHERE id = :uid"),
+            text("SELECT id, email, is_active FROM users WHERE id = :uid"),
             {"uid": user_id}
         ).fetchone()
 
@@ -1480,20 +2091,25 @@ def delete_user(
                 detail="Cannot delete your own account"
             )
 
+        deleted_upload_ids = []
+
         if policy == "delete_all":
+            deleted_upload_ids = [
+                r.upload_id for r in conn.execute(
+                    text("SELECT upload_id FROM upload_log WHERE created_by_user_id = :uid"),
+                    {"uid": user_id}
+                ).fetchall()
+            ]
+            purge.mark_deleting(conn, deleted_upload_ids, current_user["id"])
+
+            # The purger removes the rows later; detach them now so the
+            # user and their categories can go in this transaction
             conn.execute(text("""
-                DELETE FROM cleaned_data
-                WHERE upload_id IN (
-                    SELECT upload_id FROM upload_log
-                    WHERE created_by_user_id = :uid
-                )
+                UPDATE upload_log
+                SET created_by_user_id = NULL, category_id = NULL
+                WHERE created_by_user_id = :uid
             """), {"uid": user_id})
 
-            conn.execute(
-                text("DELETE FROM upload_log WHERE created_by_user_id = :uid"),
-                {"uid": user_id}
-            )
-
             conn.execute(
                 text("DELETE FROM categories WHERE created_by_user_id = :uid"),
                 {"uid": user_id}
@@ -1502,11 +2118,15 @@ def delete_user(
         elif policy == "transfer":
             admin_id = current_user["id"]
 
-            conn.execute(text("""
+            moved_categories = conn.execute(text("""
                 UPDATE upload_log
                 SET created_by_user_id = :admin_id
                 WHERE created_by_user_id = :uid
-            """), {"admin_id": admin_id, "uid": user_id})
+                RETURNING category_id
+            """), {"admin_id": admin_id, "uid": user_id}).fetchall()
+            category_groups.mark_dirty(
+                conn, [(admin_id, r.category_id) for r in moved_categories]
+            )
 
             conn.execute(text("""
                 UPDATE categories
@@ -1514,10 +2134,21 @@ def delete_user(
                 WHERE created_by_user_id = :uid
             """), {"admin_id": admin_id, "uid": user_id})
 
+            stats.rollup_transfer(conn, user_id, admin_id)
+
+        category_groups.forget_owner(conn, user_id)
         conn.execute(
             text("DELETE FROM users WHERE id = :uid"),
             {"uid": user_id}
         )
+        stats.users_changed(conn, total=-1, active=-1 if target.is_active else 0)
+        stats.rollup_forget_user(conn, user_id)
+
+    if deleted_upload_ids:
+        purge.wake()
+        _cancel_queued_ingest(deleted_upload_ids)
+    invalidate_user(user_id)
+    invalidate_artifacts(deleted_upload_ids)
 
     return {"success": True, "policy": policy}
 
@@ -1552,66 +2183,227 @@ def admin_users_with_stats(current_user: dict = Depends(get_current_user)):
     ]
 
 # ---------------- EXPORT ----------------
+def _write_upload_export(upload_id: int, format: str, compression: str,
+                         path: str) -> int:
+    """
+    Streams rows from a server-side cursor straight into a file on disk
+    (CSV, constant_memory xlsx, Parquet row groups or Arrow IPC batches).
+    """
+    with engine.connect() as conn:
+        columns = export_columns(conn, upload_id)
+        if not columns:
+            raise HTTPException(status_code=404, detail="No data found")
+        written = EXPORT_WRITERS[format](
+            path, columns, iter_upload_rows(conn, upload_id), compression
+        )
+
+    print(f"[EXPORT] upload_id={upload_id} {format} rows={written:,}")
+    return written
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (t.strip().removeprefix("W/") for t in if_none_match.split(","))
+
 @app.get("/export")
 def export_data(
+    request: Request,
     upload_id: int,
-    format: str = Query("csv", regex="^(csv|excel)$"),
+    format: str = Query("csv", regex="^(csv|excel|parquet|arrow)$"),
+    compression: str = Query("zstd", regex="^(zstd|snappy|gzip|lz4|none)$"),
     user: dict = Depends(get_current_user)
 ):
+    if format in ("parquet", "arrow"):
+        if export_pa is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Parquet/Arrow export requires pyarrow on the server"
+            )
+        allowed = PARQUET_COMPRESSIONS if format == "parquet" else ARROW_COMPRESSIONS
+        if compression not in allowed:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported {format} compression: {compression}"
+            )
+    else:
+        compression = "none"
+
+    with engine.begin() as conn:
+        assert_upload_access(conn, upload_id, user)
+        processing_status = conn.execute(
+            text("SELECT processing_status FROM upload_log WHERE upload_id = :uid"),
+            {"uid": upload_id}
+        ).scalar()
+
+    filename = f"cleaned_{upload_id}{EXPORT_EXTENSIONS[format]}"
+    media_type = EXPORT_MEDIA_TYPES[format]
+
+    # Data can still change while processing — build a one-off file
+    if processing_status != "ready":
+        path = new_export_path(upload_id, EXPORT_EXTENSIONS[format])
+        try:
+            _write_upload_export(upload_id, format, compression, path)
+        except BaseException:
+            os.remove(path)
+            raise
+        return FileResponse(
+            path, media_type=media_type, filename=filename,
+            background=BackgroundTask(os.remove, path)
+        )
+
+    cached = get_artifact(upload_id, format, compression)
+    if cached is None:
+        try:
+            cached = store_artifact(
+                upload_id, format, compression,
+                lambda p: _write_upload_export(upload_id, format, compression, p),
+                still_valid=lambda: _upload_is_ready(upload_id)
+            )
+        except ArtifactInvalidated:
+            raise HTTPException(status_code=404, detail="Upload not found")
+    path, st = cached
+
+    etag = artifact_etag(st)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    # FileResponse answers Range / If-Range requests itself
+    return FileResponse(
+        path, media_type=media_type, filename=filename,
+        headers=cache_headers, stat_result=st
+    )
+
+@app.post("/export/download-token")
+def export_download_token(user: dict = Depends(get_current_user)):
+    """
+    Short-lived token for a download link (?token=...), so the browser can
+    fetch a large export itself and stream it to disk.
+    """
+    return {
+        "token": create_download_token(user),
+        "expires_in": DOWNLOAD_TOKEN_EXPIRE_SECONDS
+    }
+
+@app.get("/export/zip")
+def export_zip(
+    category_id: int | None = None,
+    upload_ids: List[int] = Query(None),
+    user: dict = Depends(get_download_user)
+):
+    """
+    Stream every ready upload of a category (or an explicit list of
+    upload ids) as one ZIP archive with a CSV per upload. Accepts a
+    bearer header or a ?token= from /export/download-token.
+    """
+    if not category_id and not upload_ids:
+        raise HTTPException(status_code=400, detail="Provide category_id or upload_ids")
+
+    if upload_ids and len(upload_ids) > 1000:
+        raise HTTPException(status_code=400, detail="Cannot export more than 1000 files at once")
+
     with engine.begin() as conn:
-        assert_upload_access(conn, upload_id, user)
-        rows = conn.execute(
-            text("""
-                SELECT row_data
-                FROM cleaned_data
-                WHERE upload_id = :uid
-                ORDER BY id
-            """),
-            {"uid": upload_id}
-        ).fetchall()
+        if category_id:
+            owner = conn.execute(
+                text("SELECT created_by_user_id FROM categories WHERE id = :cid"),
+                {"cid": category_id}
+            ).scalar()
 
-    if not rows:
-        raise HTTPException(status_code=404, detail="No data found")
+            if owner is None:
+                raise HTTPException(status_code=404, detail="Category not found")
+
+            if not can_access_upload(user, owner):
+                raise HTTPException(status_code=403, detail="Not authorized")
+
+            rows = conn.execute(
+                text("""
+                    SELECT upload_id, filename
+                    FROM upload_log
+                    WHERE category_id = :cid
+                      AND processing_status = 'ready'
+                    ORDER BY uploaded_at, upload_id
+                """),
+                {"cid": category_id}
+            ).fetchall()
+            archive_name = f"category_{category_id}.zip"
+        else:
+            rows = conn.execute(
+                text("""
+                    SELECT upload_id, filename, created_by_user_id,
+                           processing_status
+                    FROM upload_log
+                    WHERE upload_id = ANY(:ids)
+                      AND processing_status IS DISTINCT FROM 'deleting'
+                    ORDER BY uploaded_at, upload_id
+                """),
+                {"ids": list(upload_ids)}
+            ).fetchall()
 
-    df = pd.DataFrame([r.row_data for r in rows])
+            found = {r.upload_id for r in rows}
+            missing = [uid for uid in upload_ids if uid not in found]
+            if missing:
+                raise HTTPException(status_code=404, detail=f"Upload {missing[0]} not found")
 
-    if format == "csv":
-        stream = io.StringIO()
-        df.to_csv(stream, index=False)
-        stream.seek(0)
+            for r in rows:
+                if not can_access_upload(user, r.created_by_user_id):
+                    raise HTTPException(
+                        status_code=403,
+                        detail=f"Not authorized to export upload {r.upload_id}"
+                    )
 
-        return StreamingResponse(
-            stream,
-            media_type="text/csv",
-            headers={
-                "Content-Disposition":
-                f"attachment; filename=cleaned_{upload_id}.csv"
-            }
-        )
+            rows = [r for r in rows if r.processing_status == "ready"]
+            archive_name = "uploads.zip"
+
+    if not rows:
+        raise HTTPException(status_code=404, detail="No ready uploads to export")
 
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Cleaned Data")
-    output.seek(0)
+    uploads = [(r.upload_id, r.filename) for r in rows]
 
     return StreamingResponse(
-        output,
-        media_type=(
-            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        ),
+        iter_csv_zip(engine, uploads),
+        media_type="application/zip",
         headers={
-            "Content-Disposition":
-            f"attachment; filename=cleaned_{upload_id}.xlsx"
+            "Content-Disposition": f"attachment; filename={archive_name}"
         }
     )
 
+def _upload_is_ready(upload_id: int) -> bool:
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT processing_status FROM upload_log WHERE upload_id = :uid"),
+            {"uid": upload_id}
+        ).scalar() == "ready"
+
+def _pregenerate_exports(upload_id: int):
+    for fmt in EXPORT_PREGENERATE_FORMATS:
+        compression = "zstd" if fmt in ("parquet", "arrow") else "none"
+        try:
+            store_artifact(
+                upload_id, fmt, compression,
+                lambda p: _write_upload_export(upload_id, fmt, compression, p),
+                still_valid=lambda: _upload_is_ready(upload_id)
+            )
+        except Exception as e:
+            print(f"[EXPORT] Pre-generation of {fmt} failed for {upload_id}: {e}")
+
 # ---------------- DELETE ----------------
 @app.delete("/upload/{upload_id}")
 def delete_upload(upload_id: int, user: dict = Depends(get_current_user)):
+    """
+    Hides the upload at once; the background purger removes its rows in
+    batches (progress at GET /uploads/deleting).
+    """
     with engine.begin() as conn:
         # Ownership check
         owner = conn.execute(
-            text("SELECT created_by_user_id FROM upload_log WHERE upload_id = :uid"),
+            text("""
+                SELECT created_by_user_id FROM upload_log
+                WHERE upload_id = :uid
+                  AND processing_status IS DISTINCT FROM 'deleting'
+            """),
             {"uid": upload_id}
         ).scalar()
 
@@ -1621,14 +2413,11 @@ def delete_upload(upload_id: int, user: dict = Depends(get_current_user)):
         if not can_delete_upload(user, owner):
             raise HTTPException(status_code=403, detail="Not authorized")
 
-        conn.execute(
-            text("DELETE FROM cleaned_data WHERE upload_id = :uid"),
-            {"uid": upload_id}
-        )
-        conn.execute(
-            text("DELETE FROM upload_log WHERE upload_id = :uid"),
-            {"uid": upload_id}
-        )
+        purge.mark_deleting(conn, [upload_id], user["id"])
+
+    purge.wake()
+    _cancel_queued_ingest([upload_id])
+    invalidate_artifacts([upload_id])
 
     return {"success": True}
 
@@ -1640,8 +2429,9 @@ def bulk_delete_uploads(
 ):
     """
     Delete multiple uploads in one request.
-    Each upload_id is validated for ownership before any deletion occurs.
-    Either ALL succeed or NONE are deleted (full transaction).
+    Each upload_id is validated for ownership before any is marked.
+    Either ALL are queued for deletion or NONE are (full transaction);
+    the background purger then removes their rows in batches.
     """
     if not request.upload_ids:
         raise HTTPException(status_code=400, detail="No upload IDs provided")
@@ -1653,7 +2443,11 @@ def bulk_delete_uploads(
         # Validate ownership of every ID before touching anything
         for uid in request.upload_ids:
             owner = conn.execute(
-                text("SELECT created_by_user_id FROM upload_log WHERE upload_id = :uid"),
+                text("""
+                    SELECT created_by_user_id FROM upload_log
+                    WHERE upload_id = :uid
+                      AND processing_status IS DISTINCT FROM 'deleting'
+                """),
                 {"uid": uid}
             ).scalar()
 
@@ -1669,21 +2463,24 @@ def bulk_delete_uploads(
                     detail=f"Not authorized to delete upload {uid}"
                 )
 
-        # All checks passed — delete everything in one transaction
-        conn.execute(
-            text("DELETE FROM cleaned_data WHERE upload_id = ANY(:ids)"),
-            {"ids": request.upload_ids}
-        )
-        conn.execute(
-            text("DELETE FROM upload_log WHERE upload_id = ANY(:ids)"),
-            {"ids": request.upload_ids}
-        )
+        # All checks passed — hide and queue everything in one transaction
+        purge.mark_deleting(conn, request.upload_ids, user["id"])
+
+    purge.wake()
+    _cancel_queued_ingest(request.upload_ids)
+    invalidate_artifacts(request.upload_ids)
 
     return {
         "success": True,
         "deleted_count": len(request.upload_ids)
     }
 
+@app.get("/uploads/deleting")
+def deleting_uploads(user: dict = Depends(get_current_user)):
+    """Deletions still being purged, with rows removed so far."""
+    with engine.begin() as conn:
+        return purge.purge_status(conn, user)
+
 # ---------------- MOVE UPLOAD ----------------
 @app.patch("/upload/{upload_id}/move")
 def move_upload(
@@ -1739,6 +2536,10 @@ def move_upload(
             text("UPDATE upload_log SET category_id = :cid WHERE upload_id = :uid"),
             {"cid": request.category_id, "uid": upload_id}
         )
+        category_groups.mark_dirty(conn, [
+            (upload_owner_id, upload_row.category_id),
+            (upload_owner_id, request.category_id)
+        ])
 
     return {"success": True, "upload_id": upload_id, "new_category_id": request.category_id}
 
@@ -1880,6 +2681,9 @@ def toggle_user_status(
             text("UPDATE users SET is_active = :status WHERE id = :uid"),
             {"status": new_status, "uid": user_id}
         )
+        stats.users_changed(conn, active=1 if new_status else -1)
+
+    invalidate_user(user_id)
 
     return {
         "success": True,
@@ -1915,6 +2719,7 @@ def create_user(
                     "role": role
                 }
             )
+            stats.users_changed(conn, total=1, active=1)
         except:
             raise HTTPException(
                 status_code=400,
@@ -2071,6 +2876,7 @@ def cleanup_orphaned_rows(current_user: dict = Depends(get_current_user)):
                 SELECT upload_id FROM upload_log
             )
         """))
+        stats.set_counter(conn, "orphaned_rows", 0)
     return {
         "success": True,
         "deleted_rows": result.rowcount
@@ -2281,68 +3087,34 @@ def related_grouped_stats(
 ):
     with engine.begin() as conn:
         assert_upload_access(conn, upload_id, user)
-        stats = conn.execute(
-            text("""
-                WITH 
-                normalized AS (
-                    SELECT 
-                        id,
-                        LOWER(TRIM(row_data->>'email')) AS email,
-                        REGEXP_REPLACE(COALESCE(row_data->>'phone', ''), '[^0-9]', '', 'g') AS phone
-                    FROM cleaned_data
+
+        summary = {
+            r.match_type: r for r in conn.execute(
+                text("""
+                    SELECT match_type, groups, records
+                    FROM upload_dup_summary
                     WHERE upload_id = :uid
-                ),
-                
-                email_groups AS (
-                    SELECT 
-                        email,
-                        COUNT(*) AS record_count
-                    FROM normalized
-                    WHERE email IS NOT NULL AND email != ''
-                    GROUP BY email
-                    HAVING COUNT(*) > 1
-                ),
-                
-                phone_groups AS (
-                    SELECT 
-                        phone,
-                        COUNT(*) AS record_count
-                    FROM normalized
-                    WHERE phone IS NOT NULL AND phone != ''
-                    GROUP BY phone
-                    HAVING COUNT(*) > 1
-                ),
-                
-                merged_groups AS (
-                    SELECT 
-                        email,
-                        phone,
-                        COUNT(*) AS record_count
-                    FROM normalized
-                    WHERE email IS NOT NULL AND email != ''
-                      AND phone IS NOT NULL AND phone != ''
-                    GROUP BY email, phone
-                    HAVING COUNT(*) > 1
-                )
-                
-                SELECT 
-                    (SELECT COUNT(*) FROM email_groups) AS email_groups,
-                    (SELECT COALESCE(SUM(record_count), 0) FROM email_groups) AS email_records,
-                    (SELECT COUNT(*) FROM phone_groups) AS phone_groups,
-                    (SELECT COALESCE(SUM(record_count), 0) FROM phone_groups) AS phone_records,
-                    (SELECT COUNT(*) FROM merged_groups) AS both_groups,
-                    (SELECT COALESCE(SUM(record_count), 0) FROM merged_groups) AS both_records;
-            """),
-            {"uid": upload_id}
-        ).fetchone()
-    
+                """),
+                {"uid": upload_id}
+            ).fetchall()
+        }
+
+    if not summary:
+        # Uploads ingested before upload_dup_summary existed
+        _queue_cache_backfill([upload_id])
+
+    def pick(match_type, field):
+        row = summary.get(match_type)
+        return getattr(row, field) if row else 0
+
     return {
-        "email_groups": stats.email_groups,
-        "email_records": stats.email_records,
-        "phone_groups": stats.phone_groups,
-        "phone_records": stats.phone_records,
-        "both_groups": stats.both_groups,
-        "both_records": stats.both_records
+        "email_groups": pick("email", "groups"),
+        "email_records": pick("email", "records"),
+        "phone_groups": pick("phone", "groups"),
+        "phone_records": pick("phone", "records"),
+        "both_groups": pick("merged", "groups"),
+        "both_records": pick("merged", "records"),
+        "summary_status": "ready" if summary else "pending"
     }
 
 @app.get("/related-grouped-all")
@@ -2365,81 +3137,77 @@ def related_grouped_all(
         order_clause = "ORDER BY group_key ASC"
 
     offset = (page - 1) * page_size
-    upload_filters = ["ul.processing_status = 'ready'"]
-    filter_params: dict = {}
-
-    if user["role"] != "admin":
-        upload_filters.append("ul.created_by_user_id = :owner_id")
-        filter_params["owner_id"] = user["id"]
-    elif user_id:
-        upload_filters.append("ul.created_by_user_id = :filter_uid")
-        filter_params["filter_uid"] = user_id
-
-    if upload_id:
-        upload_filters.append("ul.upload_id = :up_id")
-        filter_params["up_id"] = upload_id
-
-    if category_id:
-        upload_filters.append("ul.category_id = :cat_id")
-        filter_params["cat_id"] = category_id
+    upload_filter_sql, filter_params = _related_upload_filters(
+        user, upload_id, user_id, category_id
+    )
 
     # ── ALWAYS set these — never inside an if block ──
     search_like = f"%{search}%" if search else None
 
-    upload_filter_sql = " AND ".join(upload_filters)
+    scope = _category_summary_scope(user, upload_id, user_id, category_id)
+    if scope:
+        with engine.begin() as conn:
+            category_groups.ensure_fresh(conn, *scope)
 
     with engine.connect() as conn:
-        rows = conn.execute(text(f"""
-            WITH visible AS (
-                SELECT ul.upload_id, ul.filename, c.name AS category_name,
-                       usr.email AS uploader_email
-                FROM upload_log ul
-                JOIN categories c   ON c.id  = ul.category_id
-                JOIN users      usr ON usr.id = ul.created_by_user_id
-                WHERE {upload_filter_sql}
-            ),
-            grouped AS (
-                SELECT
-                    rgc.group_key,
-                    rgc.match_type,
-                    SUM(rgc.record_count)                AS total_count,
-                    COUNT(DISTINCT rgc.upload_id)        AS file_count,
-                    ARRAY_AGG(DISTINCT v.filename)       AS filenames,
-                    ARRAY_AGG(DISTINCT v.uploader_email) AS uploaders
-                FROM related_groups_cache rgc
-                JOIN visible v ON v.upload_id = rgc.upload_id
-                WHERE (:match_type = 'all' OR rgc.match_type = :match_type)
-                  AND (:search_like IS NULL OR rgc.group_key ILIKE :search_like)
-                GROUP BY rgc.group_key, rgc.match_type
-                HAVING COUNT(DISTINCT rgc.upload_id) > 1
-            ),
-            ranked AS (
-                SELECT *, ROW_NUMBER() OVER ({order_clause}) AS rn
-                FROM grouped
-            )
-            SELECT group_key, match_type, total_count AS record_count,
-                   file_count, filenames, uploaders
-            FROM ranked
-            WHERE rn BETWEEN :offset + 1 AND :offset + :limit
-            {order_clause}
-        """), {**filter_params, "match_type": match_type, "search_like": search_like,
-               "offset": offset, "limit": page_size}).fetchall()
-
-        total = conn.execute(text(f"""
-            WITH visible AS (
-                SELECT ul.upload_id FROM upload_log ul WHERE {upload_filter_sql}
+        if scope:
+            # Single-category view — read the precomputed cross-file groups
+            rows, total = category_groups.read_page(
+                conn, *scope, match_type, search_like, order_clause,
+                offset, page_size
             )
-            SELECT COUNT(*)
-            FROM (
-                SELECT rgc.group_key, rgc.match_type
-                FROM related_groups_cache rgc
-                JOIN visible v ON v.upload_id = rgc.upload_id
-                WHERE (:match_type = 'all' OR rgc.match_type = :match_type)
-                  AND (:search_like IS NULL OR rgc.group_key ILIKE :search_like)
-                GROUP BY rgc.group_key, rgc.match_type
-                HAVING COUNT(DISTINCT rgc.upload_id) > 1
-            ) x
-        """), {**filter_params, "match_type": match_type, "search_like": search_like}).scalar() or 0
+        else:
+            rows = conn.execute(text(f"""
+                WITH visible AS (
+                    SELECT ul.upload_id, ul.filename, c.name AS category_name,
+                           usr.email AS uploader_email
+                    FROM upload_log ul
+                    JOIN categories c   ON c.id  = ul.category_id
+                    JOIN users      usr ON usr.id = ul.created_by_user_id
+                    WHERE {upload_filter_sql}
+                ),
+                grouped AS (
+                    SELECT
+                        rgc.group_key,
+                        rgc.match_type,
+                        SUM(rgc.record_count)                AS total_count,
+                        COUNT(DISTINCT rgc.upload_id)        AS file_count,
+                        ARRAY_AGG(DISTINCT v.filename)       AS filenames,
+                        ARRAY_AGG(DISTINCT v.uploader_email) AS uploaders
+                    FROM related_groups_cache rgc
+                    JOIN visible v ON v.upload_id = rgc.upload_id
+                    WHERE (:match_type = 'all' OR rgc.match_type = :match_type)
+                      AND (:search_like IS NULL OR rgc.group_key ILIKE :search_like)
+                    GROUP BY rgc.group_key, rgc.match_type
+                    HAVING COUNT(DISTINCT rgc.upload_id) > 1
+                ),
+                ranked AS (
+                    SELECT *, ROW_NUMBER() OVER ({order_clause}) AS rn
+                    FROM grouped
+                )
+                SELECT group_key, match_type, total_count AS record_count,
+                       file_count, filenames, uploaders
+                FROM ranked
+                WHERE rn BETWEEN :offset + 1 AND :offset + :limit
+                {order_clause}
+            """), {**filter_params, "match_type": match_type, "search_like": search_like,
+                   "offset": offset, "limit": page_size}).fetchall()
+
+            total = conn.execute(text(f"""
+                WITH visible AS (
+                    SELECT ul.upload_id FROM upload_log ul WHERE {upload_filter_sql}
+                )
+                SELECT COUNT(*)
+                FROM (
+                    SELECT rgc.group_key, rgc.match_type
+                    FROM related_groups_cache rgc
+                    JOIN visible v ON v.upload_id = rgc.upload_id
+                    WHERE (:match_type = 'all' OR rgc.match_type = :match_type)
+                      AND (:search_like IS NULL OR rgc.group_key ILIKE :search_like)
+                    GROUP BY rgc.group_key, rgc.match_type
+                    HAVING COUNT(DISTINCT rgc.upload_id) > 1
+                ) x
+            """), {**filter_params, "match_type": match_type, "search_like": search_like}).scalar() or 0
 
         visible_ids = [
             r.upload_id for r in conn.execute(
@@ -2518,15 +3286,9 @@ def related_grouped_all(
     return {"total_groups": total, "page": page, "page_size": page_size, "groups": groups}
 
 
-# ── UPDATED /related-all-stats — add category_id param ─────────────
-
-@app.get("/related-all-stats")
-def related_all_stats(
-    upload_id: int | None = None,
-    user_id: int | None = None,
-    category_id: int | None = None,
-    user: dict = Depends(get_current_user)
-):
+def _related_upload_filters(user: dict, upload_id: int | None,
+                            user_id: int | None, category_id: int | None):
+    """Visibility filters shared by the cross-file (related-*) views."""
     upload_filters = ["ul.processing_status = 'ready'"]
     filter_params: dict = {}
 
@@ -2545,36 +3307,221 @@ def related_all_stats(
         upload_filters.append("ul.category_id = :cat_id")
         filter_params["cat_id"] = category_id
 
-    upload_filter_sql = " AND ".join(upload_filters)
+    return " AND ".join(upload_filters), filter_params
+
+def _category_summary_scope(user: dict, upload_id: int | None,
+                            user_id: int | None, category_id: int | None):
+    """
+    (owner_id, category_id) when a cross-file view covers exactly one
+    owner's category, so it can read category_group_summary; else None.
+    """
+    if not category_id or upload_id:
+        return None
+    if user["role"] != "admin":
+        return user["id"], category_id
+    if user_id:
+        return user_id, category_id
+    return None
+
+def _group_label(match_type: str, group_key: str) -> str:
+    if match_type == "email":
+        return f"📧 {group_key}"
+    if match_type == "phone":
+        return f"📱 {group_key}"
+    parts = group_key.split("__", 1)
+    return f"📧 {parts[0]} | 📱 {parts[1]}" if len(parts) == 2 else group_key
+
+@app.get("/related-grouped-all/export")
+def export_related_grouped_all(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    match_type: str = Query("all", pattern="^(all|email|phone|merged)$"),
+    upload_id: int | None = None,
+    user_id: int | None = None,
+    category_id: int | None = None,
+    search: str | None = None,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Stream every visible cross-file group with all of its member rows.
+
+    One set-based query joins the qualifying groups from
+    related_groups_cache back to cleaned_data (one equi-join per match
+    type) and is read through a server-side cursor, instead of issuing a
+    records query per group.
+    """
+    upload_filter_sql, filter_params = _related_upload_filters(
+        user, upload_id, user_id, category_id
+    )
+    search_like = f"%{search}%" if search else None
 
     with engine.begin() as conn:
-        s = conn.execute(text(f"""
-            WITH visible AS (
-                SELECT ul.upload_id FROM upload_log ul WHERE {upload_filter_sql}
-            ),
-            cross_file AS (
-                SELECT rgc.group_key, rgc.match_type,
-                       rgc.record_count, rgc.upload_id
-                FROM related_groups_cache rgc
-                JOIN visible v ON v.upload_id = rgc.upload_id
-                WHERE (rgc.group_key, rgc.match_type) IN (
-                    SELECT rgc2.group_key, rgc2.match_type
-                    FROM related_groups_cache rgc2
-                    JOIN visible v2 ON v2.upload_id = rgc2.upload_id
-                    GROUP BY rgc2.group_key, rgc2.match_type
-                    HAVING COUNT(DISTINCT rgc2.upload_id) > 1
+        columns = []
+        if format == "csv":
+            # Union of the data columns of every visible upload, in first-seen order
+            keys = conn.execute(text(f"""
+                SELECT k.key
+                FROM upload_log ul
+                CROSS JOIN LATERAL (
+                    SELECT row_data FROM cleaned_data cd
+                    WHERE cd.upload_id = ul.upload_id
+                    LIMIT 1
+                ) r
+                CROSS JOIN LATERAL jsonb_object_keys(r.row_data)
+                    WITH ORDINALITY AS k(key, ord)
+                WHERE {upload_filter_sql}
+                ORDER BY ul.upload_id, k.ord
+            """), filter_params).fetchall()
+
+            for r in keys:
+                if r.key not in columns and not r.key.startswith(("original_", "raw_")):
+                    columns.append(r.key)
+
+    query = text(f"""
+        WITH visible AS (
+            SELECT ul.upload_id, ul.filename, c.name AS category_name
+            FROM upload_log ul
+            JOIN categories c ON c.id = ul.category_id
+            WHERE {upload_filter_sql}
+        ),
+        cross_groups AS (
+            SELECT rgc.group_key, rgc.match_type
+            FROM related_groups_cache rgc
+            JOIN visible v ON v.upload_id = rgc.upload_id
+            WHERE (:match_type = 'all' OR rgc.match_type = :match_type)
+              AND (:search_like IS NULL OR rgc.group_key ILIKE :search_like)
+            GROUP BY rgc.group_key, rgc.match_type
+            HAVING COUNT(DISTINCT rgc.upload_id) > 1
+        ),
+        members AS (
+            SELECT cd.id, cd.upload_id, cd.row_data,
+                   v.filename, v.category_name,
+                   NULLIF(LOWER(TRIM(cd.row_data->>'email')),'nan') AS email_key,
+                   NULLIF(REGEXP_REPLACE(COALESCE(cd.row_data->>'phone',''),'[^0-9]','','g'),'') AS phone_key
+            FROM cleaned_data cd
+            JOIN visible v ON v.upload_id = cd.upload_id
+        )
+        SELECT * FROM (
+            SELECT g.match_type, g.group_key, m.id, m.upload_id,
+                   m.filename, m.category_name, m.row_data
+            FROM cross_groups g
+            JOIN members m ON m.email_key = g.group_key
+            WHERE g.match_type = 'email'
+            UNION ALL
+            SELECT g.match_type, g.group_key, m.id, m.upload_id,
+                   m.filename, m.category_name, m.row_data
+            FROM cross_groups g
+            JOIN members m ON m.phone_key = g.group_key
+            WHERE g.match_type = 'phone'
+            UNION ALL
+            SELECT g.match_type, g.group_key, m.id, m.upload_id,
+                   m.filename, m.category_name, m.row_data
+            FROM cross_groups g
+            JOIN members m ON m.email_key || '__' || m.phone_key = g.group_key
+            WHERE g.match_type = 'merged'
+        ) x
+        ORDER BY match_type, group_key, upload_id, id
+    """)
+    params = {**filter_params, "match_type": match_type, "search_like": search_like}
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if format == "csv":
+            writer.writerow(["Match Type", "Match Key", "Source File", "Category", *columns])
+
+        with engine.connect() as conn:
+            result = conn.execution_options(
+                stream_results=True, max_row_buffer=EXPORT_BATCH_SIZE
+            ).execute(query, params)
+
+            for batch in result.partitions(EXPORT_BATCH_SIZE):
+                for r in batch:
+                    label = _group_label(r.match_type, r.group_key)
+                    if format == "csv":
+                        writer.writerow([
+                            r.match_type.upper(), label, r.filename, r.category_name or "",
+                            *[
+                                "" if r.row_data.get(c) in (None, "nan") else r.row_data.get(c)
+                                for c in columns
+                            ]
+                        ])
+                    else:
+                        buf.write(json.dumps({
+                            "match_type": r.match_type,
+                            "group_key":  r.group_key,
+                            "match_key":  label,
+                            "upload_id":  r.upload_id,
+                            "filename":   r.filename,
+                            "category":   r.category_name,
+                            "id":         r.id,
+                            "data":       r.row_data
+                        }, ensure_ascii=False, default=str))
+                        buf.write("\n")
+
+                yield buf.getvalue().encode("utf-8")
+                buf.seek(0)
+                buf.truncate()
+
+        yield buf.getvalue().encode("utf-8")
+
+    ext = "csv" if format == "csv" else "ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={
+            "Content-Disposition":
+            f"attachment; filename=related-records-{date.today().isoformat()}.{ext}"
+        }
+    )
+
+
+# ── UPDATED /related-all-stats — add category_id param ─────────────
+
+@app.get("/related-all-stats")
+def related_all_stats(
+    upload_id: int | None = None,
+    user_id: int | None = None,
+    category_id: int | None = None,
+    user: dict = Depends(get_current_user)
+):
+    upload_filter_sql, filter_params = _related_upload_filters(
+        user, upload_id, user_id, category_id
+    )
+
+    scope = _category_summary_scope(user, upload_id, user_id, category_id)
+
+    with engine.begin() as conn:
+        if scope:
+            category_groups.ensure_fresh(conn, *scope)
+            s = category_groups.read_stats(conn, *scope)
+        else:
+            s = conn.execute(text(f"""
+                WITH visible AS (
+                    SELECT ul.upload_id FROM upload_log ul WHERE {upload_filter_sql}
+                ),
+                cross_file AS (
+                    SELECT rgc.group_key, rgc.match_type,
+                           rgc.record_count, rgc.upload_id
+                    FROM related_groups_cache rgc
+                    JOIN visible v ON v.upload_id = rgc.upload_id
+                    WHERE (rgc.group_key, rgc.match_type) IN (
+                        SELECT rgc2.group_key, rgc2.match_type
+                        FROM related_groups_cache rgc2
+                        JOIN visible v2 ON v2.upload_id = rgc2.upload_id
+                        GROUP BY rgc2.group_key, rgc2.match_type
+                        HAVING COUNT(DISTINCT rgc2.upload_id) > 1
+                    )
                 )
-            )
-            SELECT
-                COUNT(DISTINCT CASE WHEN match_type='email'  THEN group_key END) AS email_groups,
-                COALESCE(SUM(CASE WHEN match_type='email'  THEN record_count END), 0) AS email_records,
-                COUNT(DISTINCT CASE WHEN match_type='phone'  THEN group_key END) AS phone_groups,
-                COALESCE(SUM(CASE WHEN match_type='phone'  THEN record_count END), 0) AS phone_records,
-                COUNT(DISTINCT CASE WHEN match_type='merged' THEN group_key END) AS both_groups,
-                COALESCE(SUM(CASE WHEN match_type='merged' THEN record_count END), 0) AS both_records,
-                COUNT(DISTINCT upload_id) AS total_files
-            FROM cross_file
-        """), filter_params).fetchone()
+                SELECT
+                    COUNT(DISTINCT CASE WHEN match_type='email'  THEN group_key END) AS email_groups,
+                    COALESCE(SUM(CASE WHEN match_type='email'  THEN record_count END), 0) AS email_records,
+                    COUNT(DISTINCT CASE WHEN match_type='phone'  THEN group_key END) AS phone_groups,
+                    COALESCE(SUM(CASE WHEN match_type='phone'  THEN record_count END), 0) AS phone_records,
+                    COUNT(DISTINCT CASE WHEN match_type='merged' THEN group_key END) AS both_groups,
+                    COALESCE(SUM(CASE WHEN match_type='merged' THEN record_count END), 0) AS both_records,
+                    COUNT(DISTINCT upload_id) AS total_files
+                FROM cross_file
+            """), filter_params).fetchone()
 
     return {
         "email_groups":  s.email_groups,
@@ -2601,25 +3548,9 @@ def related_group_records(
     category_id: int | None = None,
     user: dict = Depends(get_current_user)
 ):
-    upload_filters = ["ul.processing_status = 'ready'"]
-    filter_params: dict = {}
-
-    if user["role"] != "admin":
-        upload_filters.append("ul.created_by_user_id = :owner_id")
-        filter_params["owner_id"] = user["id"]
-    elif user_id:
-        upload_filters.append("ul.created_by_user_id = :filter_uid")
-        filter_params["filter_uid"] = user_id
-
-    if upload_id:
-        upload_filters.append("ul.upload_id = :up_id")
-        filter_params["up_id"] = upload_id
-
-    if category_id:
-        upload_filters.append("ul.category_id = :cat_id")
-        filter_params["cat_id"] = category_id
-
-    upload_filter_sql = " AND ".join(upload_filters)
+    upload_filter_sql, filter_params = _related_upload_filters(
+        user, upload_id, user_id, category_id
+    )
     offset = (page - 1) * page_size
 
     if match_type == "email":
@@ -2699,21 +3630,9 @@ def related_by_file(
     user: dict = Depends(get_current_user)
 ):
     """Per-file duplicate summary view."""
-    upload_filters = ["ul.processing_status = 'ready'"]
-    filter_params: dict = {}
-
-    if user["role"] != "admin":
-        upload_filters.append("ul.created_by_user_id = :owner_id")
-        filter_params["owner_id"] = user["id"]
-    elif user_id:
-        upload_filters.append("ul.created_by_user_id = :filter_uid")
-        filter_params["filter_uid"] = user_id
-
-    if upload_id:
-        upload_filters.append("ul.upload_id = :up_id")
-        filter_params["up_id"] = upload_id
-
-    upload_filter_sql = " AND ".join(upload_filters)
+    upload_filter_sql, filter_params = _related_upload_filters(
+        user, upload_id, user_id, None
+    )
 
     if sort == "size-desc":
         order_sql = "ORDER BY total_dup_records DESC, filename ASC"
@@ -2725,6 +3644,19 @@ def related_by_file(
     offset = (page - 1) * page_size
 
     with engine.begin() as conn:
+        # Uploads ingested before upload_dup_summary existed
+        # Uploads ingested before upload_dup_summary existed are left out
+        # until the background backfill has summarised them
+        missing = [r.upload_id for r in conn.execute(text(f"""
+            SELECT ul.upload_id
+            FROM upload_log ul
+            WHERE {upload_filter_sql}
+              AND NOT EXISTS (
+                  SELECT 1 FROM upload_dup_summary s
+                  WHERE s.upload_id = ul.upload_id
+              )
+        """), filter_params).fetchall()]
+
         rows = conn.execute(text(f"""
             WITH
             visible_uploads AS (
@@ -2735,63 +3667,19 @@ def related_by_file(
                 JOIN users      usr ON usr.id = ul.created_by_user_id
                 WHERE {upload_filter_sql}
             ),
-            normalized AS (
-                SELECT
-                    cd.upload_id,
-                    vu.filename, vu.category_name, vu.uploader_email, vu.total_records,
-                    NULLIF(LOWER(TRIM(cd.row_data->>'email')),'nan') AS email,
-                    NULLIF(REGEXP_REPLACE(COALESCE(cd.row_data->>'phone',''),'[^0-9]','','g'),'') AS phone
-                FROM cleaned_data cd
-                JOIN visible_uploads vu ON vu.upload_id = cd.upload_id
-            ),
-            email_dups AS (
-                SELECT upload_id,
-                       SUM(cnt - 1) AS dup_records,
-                       COUNT(*)     AS grp_count
-                FROM (
-                    SELECT upload_id, email, COUNT(*) AS cnt
-                    FROM normalized
-                    WHERE email IS NOT NULL AND email != ''
-                      AND :match_type IN ('all','email')
-                    GROUP BY upload_id, email HAVING COUNT(*) > 1
-                ) x GROUP BY upload_id
-            ),
-            phone_dups AS (
-                SELECT upload_id,
-                       SUM(cnt - 1) AS dup_records,
-                       COUNT(*)     AS grp_count
-                FROM (
-                    SELECT upload_id, phone, COUNT(*) AS cnt
-                    FROM normalized
-                    WHERE phone IS NOT NULL AND phone != ''
-                      AND :match_type IN ('all','phone')
-                    GROUP BY upload_id, phone HAVING COUNT(*) > 1
-                ) x GROUP BY upload_id
-            ),
-            merged_dups AS (
-                SELECT upload_id,
-                       SUM(cnt - 1) AS dup_records,
-                       COUNT(*)     AS grp_count
-                FROM (
-                    SELECT upload_id, email, phone, COUNT(*) AS cnt
-                    FROM normalized
-                    WHERE email IS NOT NULL AND email != ''
-                      AND phone IS NOT NULL AND phone != ''
-                      AND :match_type IN ('all','merged')
-                    GROUP BY upload_id, email, phone HAVING COUNT(*) > 1
-                ) x GROUP BY upload_id
-            ),
+            -- A group of n records holds n - 1 duplicates
             file_stats AS (
                 SELECT
-                    n.upload_id, n.filename, n.category_name, n.uploader_email,
-                    n.total_records,
-                    COALESCE(ed.dup_records,0)+COALESCE(pd.dup_records,0)+COALESCE(md.dup_records,0) AS total_dup_records,
-                    COALESCE(ed.grp_count,0)+COALESCE(pd.grp_count,0)+COALESCE(md.grp_count,0)      AS total_groups
-                FROM (SELECT DISTINCT upload_id,filename,category_name,uploader_email,total_records FROM normalized) n
-                LEFT JOIN email_dups  ed ON ed.upload_id = n.upload_id
-                LEFT JOIN phone_dups  pd ON pd.upload_id = n.upload_id
-                LEFT JOIN merged_dups md ON md.upload_id = n.upload_id
-                WHERE COALESCE(ed.dup_records,0)+COALESCE(pd.dup_records,0)+COALESCE(md.dup_records,0) > 0
+                    vu.upload_id, vu.filename, vu.category_name, vu.uploader_email,
+                    vu.total_records,
+                    SUM(s.records - s.groups) AS total_dup_records,
+                    SUM(s.groups)             AS total_groups
+                FROM visible_uploads vu
+                JOIN upload_dup_summary s ON s.upload_id = vu.upload_id
+                WHERE :match_type = 'all' OR s.match_type = :match_type
+                GROUP BY vu.upload_id, vu.filename, vu.category_name,
+                         vu.uploader_email, vu.total_records
+                HAVING SUM(s.records - s.groups) > 0
             )
             SELECT *, COUNT(*) OVER() AS grand_total
             FROM file_stats
@@ -2801,11 +3689,14 @@ def related_by_file(
                "limit": page_size, "offset": offset}).fetchall()
 
     total = rows[0].grand_total if rows else 0
+    if missing:
+        _queue_cache_backfill(missing)
 
     return {
         "total_files": int(total),
         "page": page,
         "page_size": page_size,
+        "pending_files": len(missing),
         "files": [
             {
                 "upload_id":     r.upload_id,
@@ -2887,7 +3778,7 @@ def get_my_profile(current_user: dict = Depends(get_current_user)):
                     COALESCE(SUM(total_records), 0) AS total_records
                 FROM upload_log
                 WHERE created_by_user_id = :uid
-                  AND processing_status != 'processing'
+                  AND processing_status NOT IN ('processing', 'deleting')
             """),
             {"uid": current_user["id"]}
         ).fetchone()
@@ -2924,6 +3815,8 @@ def change_my_password(
             {"pw": hashed, "uid": current_user["id"]}
         )
 
+    invalidate_user(current_user["id"])
+
     return {"success": True}
 
 if __name__ == "__main__":
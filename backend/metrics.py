@@ -0,0 +1,212 @@
+import threading
+
+# Minimal Prometheus metrics, rendered by GET /metrics in the text
+# exposition format. Values are per process: with uvicorn --workers N,
+# scrape each worker or expect figures from whichever one answers.
+
+# Seconds; fine at the bottom for route latency, wide at the top for
+# multi-minute ingestion stages
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600
+)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _label_key(labelnames, labels: dict) -> tuple:
+    return tuple(str(labels.get(n, "")) for n in labelnames)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labelnames, key, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(labelnames, key)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def _items(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        # An unlabelled counter/gauge reads 0 before its first update
+        return items or ([] if self.labelnames else [((), 0)])
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        return self._header() + [
+            f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}"
+            for k, v in self._items()
+        ]
+
+
+class Gauge(_Metric):
+    """A gauge set directly, or read from a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        super().__init__(name, help_text, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> list:
+        items = [((), self.callback())] if self.callback else self._items()
+        return self._header() + [
+            f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}"
+            for k, v in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        lines = self._header()
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{_fmt_value(float(bound))}"'
+                lines.append(
+                    f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {count}"
+                )
+            labels = _fmt_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+def render() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            print(f"[METRICS] Could not render {metric.name}: {e}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------- APPLICATION METRICS ----------------
+INGEST_STAGE_SECONDS = Histogram(
+    "datavault_ingest_stage_seconds",
+    "Time one upload spent in each ingestion stage",
+    ("stage",)
+)
+ROWS_INGESTED = Counter(
+    "datavault_rows_ingested_total",
+    "Rows read from uploaded files",
+    ("format",)
+)
+UPLOADS_PROCESSED = Counter(
+    "datavault_uploads_processed_total",
+    "Uploads that finished background processing",
+    ("outcome",)
+)
+INGEST_QUEUED = Gauge(
+    "datavault_ingest_queue_depth",
+    "Uploads waiting for an ingestion worker"
+)
+INGEST_BUSY = Gauge(
+    "datavault_ingest_workers_busy",
+    "Ingestion workers currently processing an upload"
+)
+INGEST_WORKERS = Gauge(
+    "datavault_ingest_workers",
+    "Size of the ingestion worker pool"
+)
+INGEST_MEMORY_WAIT_SECONDS = Histogram(
+    "datavault_ingest_memory_wait_seconds",
+    "Time a CSV chunk waited for room in the ingestion memory budget",
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "datavault_db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30)
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "datavault_http_request_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+
+HTTP_REQUEST_QUERIES = Histogram(
+    "datavault_http_request_queries",
+    "SQL statements run per HTTP request",
+    ("route",),
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 1000)
+)
+QUERY_BUDGET_EXCEEDED = Counter(
+    "datavault_query_budget_exceeded_total",
+    "Requests that ran more SQL statements than their route's budget",
+    ("route",)
+)
+SLOW_QUERIES = Counter(
+    "datavault_slow_queries_total",
+    "SQL statements slower than querylog.SLOW_QUERY_MS"
+)
+
+
+def observe_ingest(timer, fmt: str, rows: int):
+    """Record one finished upload's StageTimer and row count."""
+    for stage, s in timer.stages.items():
+        INGEST_STAGE_SECONDS.observe(s["seconds"], stage=stage)
+    ROWS_INGESTED.inc(rows, format=fmt)
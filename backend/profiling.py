@@ -0,0 +1,363 @@
+import json
+import math
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from db import engine
+
+# Stage names in the order an upload goes through them
+INGEST_STAGES = ("read", "normalize", "dedup", "copy", "cache")
+
+# Poll RSS on a side thread during every stage pass to catch its true
+# peak. Off by default: a thread per pass (once per CSV chunk) is too much
+# for production, so stages record the RSS at their end instead. RSS is
+# process-wide, so with several uploads running at once each sees the
+# shared figure.
+PROFILE_SAMPLE_RSS = False
+
+# Sort orders for /admin/ingest-profiles
+PROFILE_ORDERS = {
+    "slowest": "p.total_seconds DESC NULLS LAST",
+    "slowest_rate": "p.rows_per_sec ASC NULLS LAST",
+    "memory": "p.peak_rss_mb DESC NULLS LAST",
+    "python_memory": "p.py_peak_mb DESC NULLS LAST",
+    "recent": "p.created_at DESC",
+}
+
+# How often the RSS sampler looks at the process while a stage runs
+RSS_SAMPLE_SECONDS = 0.01
+
+# Opt-in: trace Python allocations with tracemalloc during each stage and
+# record its high-water mark and top allocation sites. Slows ingestion
+# noticeably. Single-worker only: the traced peak is process-wide and each
+# stage resets it, so while this is on ingest_queue runs one job at a time
+# (uploads resolving their headers still run alongside it).
+PROFILE_TRACEMALLOC = False
+TRACEMALLOC_FRAMES = 25
+TRACEMALLOC_TOP_SITES = 5
+# While tracing, snapshot allocations when traced memory grows this much
+# past the last snapshot (but at most once per interval), so the kept
+# snapshot is close to the stage's peak
+TRACEMALLOC_SNAPSHOT_GROWTH = 1.2
+TRACEMALLOC_SNAPSHOT_SECONDS = 1.0
+
+# Allocation sites are attributed to the innermost frame in this directory
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (0 where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+_IGNORED_ALLOCATORS = {tracemalloc.__file__, "<frozen importlib._bootstrap>"}
+
+
+def _site_label(frame) -> str:
+    path = frame.filename
+    if path.startswith(_BACKEND_DIR):
+        path = os.path.relpath(path, _BACKEND_DIR)
+    else:
+        # Keep the package-relative tail, e.g. pandas/core/frame.py
+        parts = path.replace("\\", "/").split("/")
+        if "site-packages" in parts:
+            parts = parts[parts.index("site-packages") + 1:]
+        path = "/".join(parts[-3:])
+    return f"{path}:{frame.lineno}"
+
+
+def top_allocation_sites(snapshot, limit: int = TRACEMALLOC_TOP_SITES) -> list:
+    """
+    Largest live allocations in snapshot, grouped by the innermost frame in
+    our own code plus the frame that actually allocated (often in pandas).
+    """
+    # Grouping first and skipping tracemalloc's own blocks afterwards is far
+    # cheaper than Snapshot.filter_traces on a large snapshot
+    sites = {}
+    for stat in snapshot.statistics("traceback"):
+        frames = stat.traceback  # oldest first
+        if frames[-1].filename in _IGNORED_ALLOCATORS:
+            continue
+        ours = next(
+            (f for f in reversed(frames) if f.filename.startswith(_BACKEND_DIR)),
+            None
+        )
+        key = (
+            _site_label(ours) if ours else None,
+            _site_label(frames[-1])
+        )
+        size, count = sites.get(key, (0, 0))
+        sites[key] = (size + stat.size, count + stat.count)
+
+    top = sorted(sites.items(), key=lambda kv: kv[1][0], reverse=True)[:limit]
+    return [
+        {
+            "site": caller or allocator,
+            "allocated_in": allocator,
+            "size_mb": round(size / 1024 / 1024, 1),
+            "blocks": count,
+        }
+        for (caller, allocator), (size, count) in top
+    ]
+
+
+class _StageSampler:
+    """
+    Polls current_rss() on a side thread and keeps the highest reading.
+    With trace=True it also follows tracemalloc and keeps a snapshot
+    taken near the traced peak.
+    """
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace
+        self.peak = current_rss()
+        self.snapshot = None
+        self._snapshot_size = 0
+        self._snapshot_at = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stage-sampler", daemon=True
+        )
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, current_rss())
+            if self.trace:
+                self._maybe_snapshot()
+
+    def _maybe_snapshot(self):
+        traced = tracemalloc.get_traced_memory()[0]
+        now = time.monotonic()
+        if (traced > self._snapshot_size * TRACEMALLOC_SNAPSHOT_GROWTH
+                and now - self._snapshot_at >= TRACEMALLOC_SNAPSHOT_SECONDS):
+            self.snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = traced
+            self._snapshot_at = now
+
+    def start(self):
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            tracemalloc.reset_peak()
+            self._snapshot_size = tracemalloc.get_traced_memory()[0]
+        self._thread.start()
+
+    def stop(self) -> int:
+        self._stop.set()
+        self._thread.join()
+        return max(self.peak, current_rss())
+
+
+class StageTimer:
+    """
+    Accumulates wall time and rows per named stage. A stage entered several
+    times (once per CSV chunk) adds up. Each stage records the highest RSS
+    seen at the end of a pass; with sample_rss=True the peak seen while it
+    ran (a sampler thread per stage pass); with trace_memory=True also the
+    tracemalloc high-water mark and the top allocation sites of its
+    largest pass.
+    """
+
+    def __init__(self, sample_rss: bool = False, trace_memory: bool = False):
+        self.sample_rss = sample_rss or trace_memory
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0):
+        """
+        Time one pass of a stage. Yields a dict whose "rows" the caller
+        may set once the row count is known (e.g. after a read).
+        """
+        entry = self.stages.setdefault(
+            name, {"seconds": 0.0, "rows": 0, "calls": 0, "peak_rss": 0,
+                   "py_peak": 0, "top_sites": None}
+        )
+        call = {"rows": rows}
+        sampler = _StageSampler(self.trace_memory) if self.sample_rss else None
+        if sampler:
+            sampler.start()
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            entry["seconds"] += time.perf_counter() - start
+            entry["rows"] += call["rows"]
+            entry["calls"] += 1
+            entry["peak_rss"] = max(
+                entry["peak_rss"], sampler.stop() if sampler else current_rss()
+            )
+            if self.trace_memory:
+                self._record_trace(entry, sampler)
+
+    def _record_trace(self, entry: dict, sampler: _StageSampler):
+        py_peak = tracemalloc.get_traced_memory()[1]
+        if py_peak <= entry["py_peak"]:
+            return
+        entry["py_peak"] = py_peak
+        snapshot = sampler.snapshot or tracemalloc.take_snapshot()
+        entry["top_sites"] = top_allocation_sites(snapshot)
+
+    def report(self) -> dict:
+        """Per-stage figures, known stages first, ready for JSON."""
+        names = [s for s in INGEST_STAGES if s in self.stages]
+        names += [s for s in self.stages if s not in INGEST_STAGES]
+
+        out = {}
+        for name in names:
+            s = self.stages[name]
+            out[name] = {
+                "seconds": round(s["seconds"], 4),
+                "rows": s["rows"],
+                "calls": s["calls"],
+                "rows_per_sec": (
+                    round(s["rows"] / s["seconds"], 1)
+                    if s["seconds"] and s["rows"] else None
+                ),
+                "peak_rss_mb": (
+                    round(s["peak_rss"] / 1024 / 1024, 1) if s["peak_rss"] else None
+                ),
+            }
+            if s["py_peak"]:
+                out[name]["py_peak_mb"] = round(s["py_peak"] / 1024 / 1024, 1)
+                out[name]["top_allocations"] = s["top_sites"]
+        return out
+
+    def memory_peak(self):
+        """(stage, py_peak_bytes, top sites) of the stage with the highest
+        traced peak, or None when tracing was off."""
+        traced = [(n, s) for n, s in self.stages.items() if s["py_peak"]]
+        if not traced:
+            return None
+        name, s = max(traced, key=lambda kv: kv[1]["py_peak"])
+        return name, s["py_peak"], s["top_sites"]
+
+    def memory_summary(self) -> str:
+        peak = self.memory_peak()
+        if not peak:
+            return "tracemalloc off"
+        name, py_peak, sites = peak
+        top = "; ".join(
+            f"{t['site']} {t['size_mb']} MB"
+            + (f" (in {t['allocated_in']})" if t["allocated_in"] != t["site"] else "")
+            for t in sites or []
+        )
+        return f"peak {py_peak / 1024 / 1024:.1f} MB in {name}: {top}"
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{name} {s['seconds']:.2f}s" for name, s in self.report().items()
+        )
+
+
+def percentile(values, pct: float):
+    """Nearest-rank percentile of values (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+# ---------------- PROFILE TABLE ----------------
+def save_profile(upload_id: int, timer: StageTimer, file_bytes: int,
+                 total_records: int, seconds: float, outcome: str):
+    """
+    Upsert one upload's row in upload_ingest_profile. Best-effort, like
+    progress: a failure is logged and never fails the upload.
+    """
+    stages = timer.report()
+    peaks = [s["peak_rss_mb"] for s in stages.values() if s["peak_rss_mb"]]
+    py_peak = timer.memory_peak()
+    if py_peak:
+        print(f"[MEMORY] Upload {upload_id} ({outcome}): {timer.memory_summary()}")
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO upload_ingest_profile
+                    (upload_id, outcome, file_bytes, total_records, chunks,
+                     total_seconds, rows_per_sec, peak_rss_mb, py_peak_mb,
+                     stages, created_at)
+                VALUES
+                    (:uid, :outcome, :bytes, :rows, :chunks,
+                     :seconds, :rate, :peak, :py_peak, CAST(:stages AS JSONB), NOW())
+                ON CONFLICT (upload_id) DO UPDATE
+                SET outcome       = EXCLUDED.outcome,
+                    file_bytes    = EXCLUDED.file_bytes,
+                    total_records = EXCLUDED.total_records,
+                    chunks        = EXCLUDED.chunks,
+                    total_seconds = EXCLUDED.total_seconds,
+                    rows_per_sec  = EXCLUDED.rows_per_sec,
+                    peak_rss_mb   = EXCLUDED.peak_rss_mb,
+                    py_peak_mb    = EXCLUDED.py_peak_mb,
+                    stages        = EXCLUDED.stages,
+                    created_at    = EXCLUDED.created_at
+            """), {
+                "uid": upload_id,
+                "outcome": outcome,
+                "bytes": file_bytes,
+                "rows": total_records,
+                "chunks": timer.stages.get("copy", {}).get("calls", 0),
+                "seconds": round(seconds, 3),
+                "rate": round(total_records / seconds, 1) if seconds else None,
+                "peak": max(peaks) if peaks else None,
+                "py_peak": round(py_peak[1] / 1024 / 1024, 1) if py_peak else None,
+                "stages": json.dumps(stages),
+            })
+    except Exception as e:
+        print(f"[PROFILE] Could not save ingest profile for {upload_id}: {e}")
+
+
+def read_profiles(conn, order: str, limit: int, outcome: str = None) -> list:
+    rows = conn.execute(text(f"""
+        SELECT p.upload_id, ul.filename, usr.email AS uploaded_by,
+               p.outcome, p.file_bytes, p.total_records, p.chunks,
+               p.total_seconds, p.rows_per_sec, p.peak_rss_mb, p.py_peak_mb,
+               p.stages,
+               p.created_at
+        FROM upload_ingest_profile p
+        JOIN upload_log ul ON ul.upload_id = p.upload_id
+        LEFT JOIN users usr ON usr.id = ul.created_by_user_id
+        WHERE ul.processing_status IS DISTINCT FROM 'deleting'
+          AND (CAST(:outcome AS TEXT) IS NULL OR p.outcome = :outcome)
+        ORDER BY {PROFILE_ORDERS[order]}, p.upload_id DESC
+        LIMIT :limit
+    """), {"outcome": outcome, "limit": limit}).mappings().all()
+
+    return [
+        {**dict(r), "created_at": str(r["created_at"])}
+        for r in rows
+    ]
+
+
+def stage_baseline(conn, sample: int = 200) -> dict:
+    """Median rows/sec per stage over the latest successful uploads."""
+    rows = conn.execute(text("""
+        SELECT s.key AS stage,
+               PERCENTILE_CONT(0.5) WITHIN GROUP (
+                   ORDER BY (s.value->>'rows_per_sec')::float
+               ) AS median_rows_per_sec
+        FROM (
+            SELECT stages FROM upload_ingest_profile
+            WHERE outcome = 'ready'
+            ORDER BY created_at DESC
+            LIMIT :n
+        ) p, JSONB_EACH(p.stages) AS s
+        WHERE s.value->>'rows_per_sec' IS NOT NULL
+        GROUP BY s.key
+    """), {"n": sample}).fetchall()
+    return {r.stage: round(r.median_rows_per_sec, 1) for r in rows}
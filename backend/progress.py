@@ -0,0 +1,201 @@
+import asyncio
+import json
+import select
+import threading
+import time
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import text
+
+from db import engine, DATABASE_URL
+
+# Upload progress is written to the upload_progress table and announced on
+# this NOTIFY channel, so an SSE request can be served by any worker process
+# no matter which one is running the job.
+PROGRESS_CHANNEL = "upload_progress"
+
+# Fields of a progress event (and of the NOTIFY payload)
+_EVENT_COLUMNS = "upload_id, user_id, percent, status, message, queue_position, eta_seconds"
+
+# Events that end a progress stream
+TERMINAL_STATUSES = ("done", "error")
+
+# Finished rows are kept this long so late subscribers still see the outcome
+PROGRESS_RETENTION_SECONDS = 60 * 60
+
+# How long the listener waits in select() before re-checking its connection,
+# and how long it backs off after losing it
+LISTEN_POLL_SECONDS = 5
+LISTEN_RETRY_SECONDS = 2
+
+_subscribers: dict = {}
+_subscribers_lock = threading.Lock()
+_listener_started = False
+
+
+# ---------------- PUBLISH ----------------
+def publish(upload_id: int, percent: int, status: str, message: str,
+            user_id: int = None, queue_position: int = None,
+            eta_seconds: int = None):
+    """
+    Upsert the upload's progress row and NOTIFY in one statement. The
+    notification is delivered when the transaction commits. Progress is
+    best-effort: a failure here is logged and never fails the job.
+    queue_position / eta_seconds are set while the upload waits in
+    ingest_queue and cleared by any later event. A "queued" event never
+    overwrites a later status (a late queue-position refresh after the job
+    has started is dropped).
+    """
+    try:
+        _publish(upload_id, percent, status, message, user_id,
+                 queue_position, eta_seconds)
+    except Exception as e:
+        print(f"[PROGRESS] Could not publish progress for {upload_id}: {e}")
+
+
+def _publish(upload_id, percent, status, message, user_id, queue_position,
+             eta_seconds):
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            WITH p AS (
+                INSERT INTO upload_progress
+                    (upload_id, user_id, percent, status, message,
+                     queue_position, eta_seconds, updated_at)
+                VALUES (:uid, :user_id, :pct, :status, :msg, :pos, :eta, NOW())
+                ON CONFLICT (upload_id) DO UPDATE
+                SET user_id        = COALESCE(EXCLUDED.user_id, upload_progress.user_id),
+                    percent        = EXCLUDED.percent,
+                    status         = EXCLUDED.status,
+                    message        = EXCLUDED.message,
+                    queue_position = EXCLUDED.queue_position,
+                    eta_seconds    = EXCLUDED.eta_seconds,
+                    updated_at     = EXCLUDED.updated_at
+                WHERE EXCLUDED.status <> 'queued'
+                   OR upload_progress.status = 'queued'
+                RETURNING {_EVENT_COLUMNS}
+            )
+            SELECT pg_notify(:channel, row_to_json(p)::text) FROM p
+        """), {
+            "uid": upload_id, "user_id": user_id, "pct": int(percent),
+            "status": status, "msg": message, "pos": queue_position,
+            "eta": eta_seconds, "channel": PROGRESS_CHANNEL
+        })
+
+        if status in TERMINAL_STATUSES:
+            conn.execute(text("""
+                DELETE FROM upload_progress
+                WHERE status IN ('done', 'error')
+                  AND updated_at < NOW() - INTERVAL '1 second' * :keep
+            """), {"keep": PROGRESS_RETENTION_SECONDS})
+
+
+def snapshot(upload_id: int):
+    """Latest progress for one upload, or None if nothing was published yet."""
+    with engine.begin() as conn:
+        row = conn.execute(text(f"""
+            SELECT {_EVENT_COLUMNS}
+            FROM upload_progress
+            WHERE upload_id = :uid
+        """), {"uid": upload_id}).mappings().first()
+
+    return dict(row) if row else None
+
+
+def user_snapshot(user_id: int) -> list:
+    """Latest progress for every upload of user_id that is still in flight."""
+    with engine.begin() as conn:
+        rows = conn.execute(text(f"""
+            SELECT {_EVENT_COLUMNS}
+            FROM upload_progress
+            WHERE user_id = :uid
+              AND status NOT IN ('done', 'error')
+            ORDER BY upload_id
+        """), {"uid": user_id}).mappings().all()
+
+    return [dict(r) for r in rows]
+
+
+# ---------------- SUBSCRIBE ----------------
+# Subscribers are keyed by upload id, or by user_key(user_id) for a stream
+# that follows all of one user's uploads.
+def user_key(user_id: int) -> tuple:
+    return ("user", user_id)
+
+
+def subscribe(key) -> asyncio.Queue:
+    """
+    Register the running event loop for events under key.
+    Always pair with unsubscribe() in a finally block.
+    """
+    queue = asyncio.Queue()
+    entry = (asyncio.get_running_loop(), queue)
+    with _subscribers_lock:
+        _subscribers.setdefault(key, set()).add(entry)
+    return queue
+
+
+def unsubscribe(key, queue: asyncio.Queue):
+    with _subscribers_lock:
+        entries = _subscribers.get(key, set())
+        entries.difference_update({e for e in entries if e[1] is queue})
+        if not entries:
+            _subscribers.pop(key, None)
+
+
+def _dispatch(event: dict):
+    with _subscribers_lock:
+        entries = list(_subscribers.get(event["upload_id"], ()))
+        if event.get("user_id") is not None:
+            entries += _subscribers.get(user_key(event["user_id"]), ())
+
+    for loop, queue in entries:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+        except RuntimeError:
+            # Loop already closed — the stream is gone
+            pass
+
+
+# ---------------- LISTENER ----------------
+def _listen_loop():
+    """
+    One LISTEN connection per process fans notifications out to the local
+    SSE subscribers. It lives outside the SQLAlchemy pool so it never holds
+    a pooled connection.
+    """
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {PROGRESS_CHANNEL}")
+
+            while True:
+                if select.select([conn], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    note = conn.notifies.pop(0)
+                    try:
+                        _dispatch(json.loads(note.payload))
+                    except Exception as e:
+                        print(f"[PROGRESS] Bad notification {note.payload!r}: {e}")
+        except Exception as e:
+            print(f"[PROGRESS] Listener lost connection: {e}")
+            time.sleep(LISTEN_RETRY_SECONDS)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def start_listener():
+    global _listener_started
+    if _listener_started:
+        return
+    _listener_started = True
+    threading.Thread(target=_listen_loop, name="progress-listener", daemon=True).start()
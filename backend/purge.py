@@ -0,0 +1,275 @@
+import threading
+
+from sqlalchemy import text
+
+from db import engine
+import stats
+import category_groups
+
+# Rows removed per statement (and per commit) while purging an upload
+PURGE_BATCH_ROWS = 20_000
+
+# The purger wakes up on wake() or after this long, whichever comes first
+PURGE_IDLE_SECONDS = 10
+
+# After a failed attempt an upload is retried after this delay, doubled per
+# further failure up to the maximum; the rest of the queue carries on
+PURGE_RETRY_SECONDS = 60
+PURGE_RETRY_MAX_SECONDS = 60 * 60
+
+# Only one process purges at a time
+_PURGE_LOCK_KEY = 50_037
+
+# Per-upload tables, emptied in this order before the upload_log row goes
+PURGE_TABLES = ("cleaned_data", "related_groups_cache")
+
+# Small per-upload bookkeeping, cleared in the final transaction
+PURGE_SIDE_TABLES = (
+    "upload_progress", "related_groups_cache_state", "upload_dup_summary",
+    "upload_ingest_profile"
+)
+
+_wake_event = threading.Event()
+_purger_started = False
+
+
+class UploadDeleted(Exception):
+    """An ingest job's upload was deleted while the job was running."""
+
+
+# ---------------- MARK ----------------
+def mark_deleting(conn, upload_ids: list, requested_by: int) -> list:
+    """
+    Hide uploads right away and queue them for the purger, inside the
+    caller's transaction. Counters and the daily rollup drop them now;
+    the rows themselves are removed later in batches.
+    Returns the ids that were marked (already-deleting ones are skipped).
+    """
+    rows = conn.execute(text(f"""
+        SELECT upload_id,
+               GREATEST(total_records - duplicate_records, 0) AS rows_total,
+               {stats.UPLOAD_STATS_COLUMNS}
+        FROM upload_log
+        WHERE upload_id = ANY(:ids)
+          AND processing_status IS DISTINCT FROM 'deleting'
+        FOR UPDATE
+    """), {"ids": list(upload_ids)}).fetchall()
+
+    if not rows:
+        return []
+
+    marked = [r.upload_id for r in rows]
+    category_groups.mark_uploads_dirty(conn, marked)
+    conn.execute(text("""
+        UPDATE upload_log
+        SET processing_status = 'deleting'
+        WHERE upload_id = ANY(:ids)
+    """), {"ids": marked})
+
+    for row in rows:
+        stats.upload_removed(conn, row._mapping)
+
+    conn.execute(text("""
+        INSERT INTO upload_purge_queue (upload_id, requested_by, rows_total)
+        SELECT * FROM UNNEST(CAST(:ids AS BIGINT[]), CAST(:by AS INT[]), CAST(:totals AS BIGINT[]))
+        ON CONFLICT (upload_id) DO NOTHING
+    """), {
+        "ids": marked,
+        "by": [requested_by] * len(marked),
+        "totals": [r.rows_total for r in rows]
+    })
+    return marked
+
+
+def is_deleted(conn, upload_id: int) -> bool:
+    """True once the upload is queued for purge, or already purged."""
+    row = conn.execute(
+        text("SELECT processing_status FROM upload_log WHERE upload_id = :uid"),
+        {"uid": upload_id}
+    ).fetchone()
+    return row is None or row.processing_status == "deleting"
+
+
+def check_not_deleted(upload_id: int):
+    """Raise UploadDeleted if the upload was deleted; ingest jobs call this
+    before each write so a deleted upload stops being filled."""
+    with engine.connect() as conn:
+        if is_deleted(conn, upload_id):
+            raise UploadDeleted(upload_id)
+
+
+def sweep_after_job(upload_id: int) -> bool:
+    """
+    Call when an ingest job for upload_id has ended. If the upload was
+    deleted meanwhile, the job may have committed rows after the purger
+    went through them; queue the upload again so those are removed too.
+    """
+    with engine.begin() as conn:
+        if not is_deleted(conn, upload_id):
+            return False
+        conn.execute(text("""
+            INSERT INTO upload_purge_queue (upload_id, rows_total)
+            VALUES (:uid, 0)
+            ON CONFLICT (upload_id) DO NOTHING
+        """), {"uid": upload_id})
+    wake()
+    return True
+
+
+def wake():
+    """Start purging now instead of at the next idle tick (this process only)."""
+    _wake_event.set()
+
+
+def purge_status(conn, user: dict) -> list:
+    """Queued deletions the user can see, with rows removed so far."""
+    sql = """
+        SELECT q.upload_id, ul.filename, q.rows_total, q.rows_deleted,
+               q.requested_at, q.updated_at, q.attempts, q.last_error
+        FROM upload_purge_queue q
+        JOIN upload_log ul ON ul.upload_id = q.upload_id
+    """
+    params = {}
+    if user["role"] != "admin":
+        sql += " WHERE ul.created_by_user_id = :uid"
+        params["uid"] = user["id"]
+    sql += " ORDER BY q.requested_at, q.upload_id"
+
+    return [
+        {
+            "upload_id": r.upload_id,
+            "filename": r.filename,
+            "rows_total": r.rows_total,
+            "rows_deleted": r.rows_deleted,
+            "percent": (
+                min(100, int(r.rows_deleted * 100 / r.rows_total))
+                if r.rows_total else 0
+            ),
+            "requested_at": str(r.requested_at),
+            "updated_at": str(r.updated_at),
+            "attempts": r.attempts,
+            "last_error": r.last_error
+        }
+        for r in conn.execute(text(sql), params).fetchall()
+    ]
+
+
+# ---------------- PURGE ----------------
+def _delete_batch(conn, table: str, upload_id: int) -> int:
+    res = conn.execute(text(f"""
+        DELETE FROM {table}
+        WHERE id IN (
+            SELECT id FROM {table}
+            WHERE upload_id = :uid
+            LIMIT :n
+        )
+    """), {"uid": upload_id, "n": PURGE_BATCH_ROWS})
+    return res.rowcount
+
+
+def purge_upload(conn, upload_id: int):
+    """
+    Remove one queued upload, one bounded batch per transaction, so no
+    single statement holds locks for long. Safe to resume after a crash.
+    """
+    for table in PURGE_TABLES:
+        while True:
+            removed = _delete_batch(conn, table, upload_id)
+            if table == "cleaned_data" and removed:
+                conn.execute(text("""
+                    UPDATE upload_purge_queue
+                    SET rows_deleted = rows_deleted + :n, updated_at = NOW()
+                    WHERE upload_id = :uid
+                """), {"n": removed, "uid": upload_id})
+            conn.commit()
+            if removed < PURGE_BATCH_ROWS:
+                break
+
+    # Anything written meanwhile (e.g. a job that was still running) is
+    # small; drop it with the upload_log row in one transaction.
+    for table in PURGE_TABLES + PURGE_SIDE_TABLES:
+        conn.execute(
+            text(f"DELETE FROM {table} WHERE upload_id = :uid"), {"uid": upload_id}
+        )
+    conn.execute(text("""
+        DELETE FROM upload_log
+        WHERE upload_id = :uid AND processing_status = 'deleting'
+    """), {"uid": upload_id})
+    conn.execute(
+        text("DELETE FROM upload_purge_queue WHERE upload_id = :uid"), {"uid": upload_id}
+    )
+    conn.commit()
+
+
+def _record_failure(conn, upload_id: int, error: Exception):
+    conn.execute(text("""
+        UPDATE upload_purge_queue
+        SET attempts = attempts + 1,
+            last_error = :err,
+            retry_at = NOW() + INTERVAL '1 second' * LEAST(
+                :base * POWER(2, attempts), :max
+            ),
+            updated_at = NOW()
+        WHERE upload_id = :uid
+    """), {
+        "uid": upload_id, "err": str(error)[:1000],
+        "base": PURGE_RETRY_SECONDS, "max": PURGE_RETRY_MAX_SECONDS
+    })
+    conn.commit()
+
+
+def run_purger():
+    """
+    Drain upload_purge_queue, oldest request first. An upload that fails
+    is backed off (retry_at) and the drain moves on to the next one.
+    """
+    with engine.connect() as conn:
+        got_lock = conn.execute(
+            text("SELECT pg_try_advisory_lock(:k)"), {"k": _PURGE_LOCK_KEY}
+        ).scalar()
+        conn.commit()
+        if not got_lock:
+            return
+
+        try:
+            while True:
+                upload_id = conn.execute(text("""
+                    SELECT upload_id FROM upload_purge_queue
+                    WHERE retry_at IS NULL OR retry_at <= NOW()
+                    ORDER BY requested_at, upload_id
+                    LIMIT 1
+                """)).scalar()
+                conn.commit()
+                if upload_id is None:
+                    break
+
+                try:
+                    purge_upload(conn, upload_id)
+                    print(f"[PURGE] Removed upload_id={upload_id}")
+                except Exception as e:
+                    conn.rollback()
+                    print(f"[PURGE] Purging upload_id={upload_id} failed, will retry: {e}")
+                    _record_failure(conn, upload_id, e)
+        finally:
+            conn.execute(
+                text("SELECT pg_advisory_unlock(:k)"), {"k": _PURGE_LOCK_KEY}
+            )
+            conn.commit()
+
+
+def _purge_loop():
+    while True:
+        _wake_event.wait(PURGE_IDLE_SECONDS)
+        _wake_event.clear()
+        try:
+            run_purger()
+        except Exception as e:
+            print(f"[PURGE] Purger failed: {e}")
+
+
+def start_purger():
+    global _purger_started
+    if _purger_started:
+        return
+    _purger_started = True
+    threading.Thread(target=_purge_loop, name="upload-purger", daemon=True).start()
@@ -0,0 +1,285 @@
+import contextvars
+import json
+import queue
+import random
+import re
+import threading
+import time
+
+from sqlalchemy import event, text
+
+import metrics
+
+# Per-request SQL accounting, hooked onto the shared engine by db.py.
+# The HTTP middleware in main.py opens a RequestQueries for each request;
+# statements run outside a request (background jobs) only hit the slow log.
+
+# Add X-DB-Queries / X-DB-Time-Ms / X-DB-Slowest-Ms to every response
+QUERY_DEBUG_HEADERS = False
+
+# Statements slower than this are printed as [SLOWSQL]
+SLOW_QUERY_MS = 500
+
+# Requests running more statements than their budget print [QUERYBUDGET]
+QUERY_BUDGET = 25
+ROUTE_QUERY_BUDGETS = {
+    "/admin/dashboard-stats": 10,
+    "/uploads": 10,
+}
+
+# Longest statement text kept for logs
+SQL_LOG_CHARS = 400
+
+# Opt-in: re-run a sample of slow read-only statements under
+# EXPLAIN (ANALYZE, BUFFERS) on a background thread and keep the plan in
+# slow_query_explains. ANALYZE executes the statement again, so keep the
+# rate low; it runs in a READ ONLY transaction with a statement timeout.
+EXPLAIN_CAPTURE = False
+EXPLAIN_THRESHOLD_MS = 1000
+EXPLAIN_SAMPLE_RATE = 0.2
+EXPLAIN_TIMEOUT_MS = 60_000
+# The same statement on the same route is captured at most this often
+EXPLAIN_COOLDOWN_SECONDS = 10 * 60
+# Captures waiting for the worker beyond this are dropped
+EXPLAIN_QUEUE_SIZE = 20
+# Captured plans kept (oldest removed first)
+EXPLAIN_KEEP_ROWS = 500
+
+# Request parameters never stored with a plan
+REDACTED_PARAMS = {"token", "password", "access_token"}
+
+# Only plain reads are re-run; anything that writes, locks or has side
+# effects is skipped
+_READ_ONLY_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_SIDE_EFFECT_RE = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|FOR\s+UPDATE|FOR\s+SHARE|"
+    r"pg_notify|pg_advisory\w*|pg_try_advisory\w*|nextval|setval)\b",
+    re.IGNORECASE
+)
+
+_current = contextvars.ContextVar("request_queries", default=None)
+_engine = None
+_explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+_explain_recent: dict = {}
+_explain_lock = threading.Lock()
+_explainer_started = False
+
+
+class RequestQueries:
+    __slots__ = ("path", "method", "scope", "params", "count", "seconds",
+                 "slowest_seconds", "slowest_sql")
+
+    def __init__(self, path: str, method: str = None, scope: dict = None,
+                 params: dict = None):
+        self.path = path
+        self.method = method
+        # The ASGI scope; the router fills in scope["route"] once matched
+        self.scope = scope or {}
+        self.params = params or {}
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_sql = None
+
+    @property
+    def route(self) -> str:
+        return getattr(self.scope.get("route"), "path", self.path)
+
+    def headers(self) -> dict:
+        return {
+            "X-DB-Queries": str(self.count),
+            "X-DB-Time-Ms": f"{self.seconds * 1000:.1f}",
+            "X-DB-Slowest-Ms": f"{self.slowest_seconds * 1000:.1f}",
+        }
+
+
+def _short_sql(statement: str) -> str:
+    return " ".join(statement.split())[:SQL_LOG_CHARS]
+
+
+# ---------------- REQUEST SCOPE ----------------
+def begin_request(path: str, method: str = None, scope: dict = None,
+                  params: dict = None):
+    """Start counting for the current request. Returns (stats, reset token)."""
+    stats = RequestQueries(path, method, scope, params)
+    return stats, _current.set(stats)
+
+
+def end_request(token, stats: RequestQueries, method: str, route: str):
+    """Stop counting and warn if the route went over its query budget."""
+    _current.reset(token)
+    budget = ROUTE_QUERY_BUDGETS.get(route, QUERY_BUDGET)
+    if stats.count > budget:
+        metrics.QUERY_BUDGET_EXCEEDED.inc(route=route)
+        print(
+            f"[QUERYBUDGET] {method} {stats.path} ran {stats.count} queries "
+            f"(budget {budget}) in {stats.seconds * 1000:.0f} ms; slowest "
+            f"{stats.slowest_seconds * 1000:.0f} ms: {_short_sql(stats.slowest_sql or '')}"
+        )
+
+
+def current():
+    return _current.get()
+
+
+# ---------------- ENGINE HOOKS ----------------
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+        if elapsed > stats.slowest_seconds:
+            stats.slowest_seconds = elapsed
+            stats.slowest_sql = statement
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        metrics.SLOW_QUERIES.inc()
+        where = stats.path if stats is not None else "background"
+        print(f"[SLOWSQL] {elapsed * 1000:.0f} ms ({where}): {_short_sql(statement)}")
+
+    if (EXPLAIN_CAPTURE and stats is not None
+            and elapsed * 1000 >= EXPLAIN_THRESHOLD_MS):
+        _maybe_capture(stats, statement, parameters, elapsed)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def install(engine):
+    global _engine
+    _engine = engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ---------------- EXPLAIN CAPTURE ----------------
+def _maybe_capture(stats: RequestQueries, statement: str, parameters,
+                   elapsed: float):
+    if isinstance(parameters, (list, tuple)) and parameters and \
+            isinstance(parameters[0], (list, tuple, dict)):
+        return  # executemany
+    if not _READ_ONLY_RE.match(statement) or _SIDE_EFFECT_RE.search(statement):
+        return
+    if random.random() >= EXPLAIN_SAMPLE_RATE:
+        return
+
+    route = stats.route
+    key = (route, hash(" ".join(statement.split())))
+    now = time.monotonic()
+    with _explain_lock:
+        if now - _explain_recent.get(key, -EXPLAIN_COOLDOWN_SECONDS) < EXPLAIN_COOLDOWN_SECONDS:
+            return
+        _explain_recent[key] = now
+
+    try:
+        _explain_queue.put_nowait({
+            "route": route,
+            "method": stats.method,
+            "request_params": {
+                k: ("***" if k in REDACTED_PARAMS else v)
+                for k, v in stats.params.items()
+            },
+            "statement": statement,
+            "parameters": parameters,
+            "duration_ms": round(elapsed * 1000, 1),
+        })
+    except queue.Full:
+        pass
+
+
+def _explain(job: dict):
+    # A raw DBAPI connection: its statements never reach the engine events
+    raw = _engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute("SET TRANSACTION READ ONLY")
+        cur.execute(f"SET LOCAL statement_timeout = {int(EXPLAIN_TIMEOUT_MS)}")
+        cur.execute(
+            "EXPLAIN (ANALYZE, BUFFERS, FORMAT TEXT) " + job["statement"],
+            job["parameters"] or None
+        )
+        plan = "\n".join(r[0] for r in cur.fetchall())
+        raw.rollback()
+
+        cur.execute("""
+            INSERT INTO slow_query_explains
+                (route, method, request_params, statement, statement_params,
+                 duration_ms, plan)
+            VALUES (%s, %s, %s::jsonb, %s, %s::jsonb, %s, %s)
+        """, (
+            job["route"], job["method"],
+            json.dumps(job["request_params"], default=str),
+            job["statement"],
+            json.dumps(job["parameters"], default=str),
+            job["duration_ms"], plan
+        ))
+        cur.execute("""
+            DELETE FROM slow_query_explains
+            WHERE id <= (
+                SELECT id FROM slow_query_explains
+                ORDER BY id DESC OFFSET %s LIMIT 1
+            )
+        """, (EXPLAIN_KEEP_ROWS,))
+        raw.commit()
+        cur.close()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+def _explain_loop():
+    while True:
+        job = _explain_queue.get()
+        try:
+            _explain(job)
+            print(f"[EXPLAIN] Captured plan for {job['route']} "
+                  f"({job['duration_ms']:.0f} ms)")
+        except Exception as e:
+            print(f"[EXPLAIN] Could not capture plan for {job['route']}: {e}")
+
+
+def start_explainer():
+    """Start the capture worker; a no-op unless EXPLAIN_CAPTURE is on."""
+    global _explainer_started
+    if not EXPLAIN_CAPTURE or _explainer_started:
+        return
+    _explainer_started = True
+    threading.Thread(target=_explain_loop, name="explain-capture", daemon=True).start()
+
+
+def read_explains(conn, route: str = None, limit: int = 50) -> list:
+    rows = conn.execute(text("""
+        SELECT id, captured_at, route, method, request_params,
+               duration_ms, LEFT(statement, 300) AS statement_preview
+        FROM slow_query_explains
+        WHERE CAST(:route AS TEXT) IS NULL OR route = :route
+        ORDER BY captured_at DESC, id DESC
+        LIMIT :limit
+    """), {"route": route, "limit": limit}).mappings().all()
+    return [{**dict(r), "captured_at": str(r["captured_at"])} for r in rows]
+
+
+def read_explain(conn, explain_id: int):
+    row = conn.execute(text("""
+        SELECT id, captured_at, route, method, request_params, statement,
+               statement_params, duration_ms, plan
+        FROM slow_query_explains
+        WHERE id = :id
+    """), {"id": explain_id}).mappings().first()
+    return {**dict(row), "captured_at": str(row["captured_at"])} if row else None
@@ -0,0 +1,383 @@
+import threading
+import time
+
+from sqlalchemy import text
+
+from db import engine
+
+# Derived dashboard sections are recomputed at most this often per process
+STATS_TTL_SECONDS = 30
+
+# How often the orphan scan, full recount and rollup repair run in the
+# background
+STATS_JOB_INTERVAL_SECONDS = 15 * 60
+
+# Any constant works — it just has to be unique to this job
+_STATS_JOB_LOCK_KEY = 50_031
+
+COUNTERS = (
+    "users_total",
+    "users_active",
+    "files_total",
+    "files_processing",
+    "files_failed",
+    "records_total",
+    "orphaned_rows",
+)
+
+_ttl_cache: dict = {}
+_ttl_lock = threading.Lock()
+_job_started = False
+
+
+# ---------------- TTL CACHE ----------------
+def cached(key, loader, ttl: int = STATS_TTL_SECONDS):
+    """Return loader() memoized under key for ttl seconds (per process)."""
+    now = time.monotonic()
+    with _ttl_lock:
+        hit = _ttl_cache.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+
+    value = loader()
+
+    with _ttl_lock:
+        _ttl_cache[key] = (now + ttl, value)
+    return value
+
+
+def invalidate_cache():
+    with _ttl_lock:
+        _ttl_cache.clear()
+
+
+# ---------------- COUNTERS ----------------
+def bump(conn, **deltas):
+    """
+    Add deltas to the named counters inside the caller's transaction,
+    so counters commit (or roll back) together with the change they track.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+
+    values = ", ".join(f"(:n{i}, :v{i})" for i in range(len(deltas)))
+    params = {}
+    for i, (name, delta) in enumerate(deltas.items()):
+        params[f"n{i}"] = name
+        params[f"v{i}"] = int(delta)
+
+    conn.execute(text(f"""
+        INSERT INTO dashboard_counters (name, value)
+        VALUES {values}
+        ON CONFLICT (name) DO UPDATE
+        SET value = dashboard_counters.value + EXCLUDED.value,
+            updated_at = NOW()
+    """), params)
+
+
+def set_counter(conn, name: str, value: int):
+    conn.execute(text("""
+        INSERT INTO dashboard_counters (name, value)
+        VALUES (:n, :v)
+        ON CONFLICT (name) DO UPDATE
+        SET value = EXCLUDED.value,
+            updated_at = NOW()
+    """), {"n": name, "v": int(value)})
+
+
+def read_counters(conn) -> dict:
+    rows = conn.execute(
+        text("SELECT name, value, updated_at FROM dashboard_counters")
+    ).fetchall()
+
+    counters = {name: 0 for name in COUNTERS}
+    counters.update({r.name: int(r.value) for r in rows})
+    counters["orphans_checked_at"] = next(
+        (str(r.updated_at) for r in rows if r.name == "orphaned_rows"), None
+    )
+    return counters
+
+
+def _upload_deltas(row, sign: int) -> dict:
+    failed = row["processing_status"] == "failed" or row["status"] == "FAILED"
+    return {
+        "files_total":      sign,
+        "files_processing": sign if row["processing_status"] == "processing" else 0,
+        "files_failed":     sign if failed else 0,
+        "records_total":    sign * (row["total_records"] or 0),
+    }
+
+
+def _rollup_deltas(row, sign: int) -> dict:
+    failed = row["processing_status"] == "failed" or row["status"] == "FAILED"
+    return {
+        "files":      sign,
+        "records":    sign * (row["total_records"] or 0),
+        "duplicates": sign * (row["duplicate_records"] or 0),
+        "failures":   sign if failed else 0,
+    }
+
+
+def _bump_rollup(conn, day, user_id, deltas: dict):
+    if user_id is None or not any(deltas.values()):
+        return
+
+    conn.execute(text("""
+        INSERT INTO upload_daily_rollup
+            (day, user_id, files, records, duplicates, failures)
+        VALUES (:day, :uid, :files, :records, :duplicates, :failures)
+        ON CONFLICT (day, user_id) DO UPDATE
+        SET files      = upload_daily_rollup.files      + EXCLUDED.files,
+            records    = upload_daily_rollup.records    + EXCLUDED.records,
+            duplicates = upload_daily_rollup.duplicates + EXCLUDED.duplicates,
+            failures   = upload_daily_rollup.failures   + EXCLUDED.failures
+    """), {"day": day, "uid": user_id, **deltas})
+
+
+def _net(after: dict, before: dict) -> dict:
+    return {k: after[k] - before[k] for k in after}
+
+
+# Upload events take a mapping with processing_status, status,
+# total_records, duplicate_records, created_by_user_id and day
+# (uploaded_at::date) — see UPLOAD_STATS_COLUMNS.
+UPLOAD_STATS_COLUMNS = """
+    processing_status, status, total_records, duplicate_records,
+    created_by_user_id, uploaded_at::date AS day
+"""
+
+
+def upload_added(conn, row):
+    bump(conn, **_upload_deltas(row, 1))
+    _bump_rollup(conn, row["day"], row["created_by_user_id"], _rollup_deltas(row, 1))
+
+
+def upload_removed(conn, row):
+    bump(conn, **_upload_deltas(row, -1))
+    _bump_rollup(conn, row["day"], row["created_by_user_id"], _rollup_deltas(row, -1))
+
+
+def upload_changed(conn, before, after):
+    bump(conn, **_net(_upload_deltas(after, 1), _upload_deltas(before, 1)))
+    _bump_rollup(
+        conn, after["day"], after["created_by_user_id"],
+        _net(_rollup_deltas(after, 1), _rollup_deltas(before, 1))
+    )
+
+
+def users_changed(conn, total: int = 0, active: int = 0):
+    bump(conn, users_total=total, users_active=active)
+
+
+def rollup_transfer(conn, from_user_id: int, to_user_id: int):
+    """Move a user's rollup rows to another user (delete_user 'transfer')."""
+    conn.execute(text("""
+        INSERT INTO upload_daily_rollup
+            (day, user_id, files, records, duplicates, failures)
+        SELECT day, :to_uid, files, records, duplicates, failures
+        FROM upload_daily_rollup
+        WHERE user_id = :from_uid
+        ON CONFLICT (day, user_id) DO UPDATE
+        SET files      = upload_daily_rollup.files      + EXCLUDED.files,
+            records    = upload_daily_rollup.records    + EXCLUDED.records,
+            duplicates = upload_daily_rollup.duplicates + EXCLUDED.duplicates,
+            failures   = upload_daily_rollup.failures   + EXCLUDED.failures
+    """), {"from_uid": from_user_id, "to_uid": to_user_id})
+    rollup_forget_user(conn, from_user_id)
+
+
+def rollup_forget_user(conn, user_id: int):
+    conn.execute(
+        text("DELETE FROM upload_daily_rollup WHERE user_id = :uid"),
+        {"uid": user_id}
+    )
+
+
+# ---------------- ROLLUP READS ----------------
+def activity_series(conn, days: int):
+    return conn.execute(text("""
+        SELECT day AS date,
+               SUM(files)   AS files,
+               SUM(records) AS records
+        FROM upload_daily_rollup
+        WHERE day >= CURRENT_DATE - :days
+        GROUP BY day
+        HAVING SUM(files) > 0
+        ORDER BY day
+    """), {"days": days}).fetchall()
+
+
+def user_breakdown(conn):
+    return conn.execute(text("""
+        SELECT
+            u.email,
+            COALESCE(r.files, 0)       AS files,
+            COALESCE(r.records, 0)     AS records,
+            COALESCE(r.duplicates, 0)  AS duplicates,
+            CASE
+                WHEN r.records > 0
+                THEN (r.duplicates::float / r.records * 100)
+                ELSE 0
+            END                        AS avg_dup_rate
+        FROM users u
+        LEFT JOIN (
+            SELECT user_id,
+                   SUM(files)      AS files,
+                   SUM(records)    AS records,
+                   SUM(duplicates) AS duplicates
+            FROM upload_daily_rollup
+            GROUP BY user_id
+        ) r ON r.user_id = u.id
+        WHERE u.role != 'admin'
+        ORDER BY files DESC
+    """)).fetchall()
+
+
+# ---------------- BACKGROUND JOB ----------------
+def recount(conn):
+    """Recompute every counter except orphaned_rows from the base tables."""
+    conn.execute(text("""
+        WITH live AS (
+            -- uploads queued for purge already left the counters
+            SELECT processing_status, status, total_records
+            FROM upload_log
+            WHERE processing_status IS DISTINCT FROM 'deleting'
+        )
+        INSERT INTO dashboard_counters (name, value)
+        SELECT name, value FROM (
+            SELECT 'users_total'  AS name, COUNT(*) AS value FROM users
+            UNION ALL
+            SELECT 'users_active', COUNT(*) FILTER (WHERE is_active = true) FROM users
+            UNION ALL
+            SELECT 'files_total', COUNT(*) FROM live
+            UNION ALL
+            SELECT 'files_processing',
+                   COUNT(*) FILTER (WHERE processing_status = 'processing')
+            FROM live
+            UNION ALL
+            SELECT 'files_failed',
+                   COUNT(*) FILTER (WHERE processing_status = 'failed'
+                                       OR status = 'FAILED')
+            FROM live
+            UNION ALL
+            SELECT 'records_total', COALESCE(SUM(total_records), 0) FROM live
+        ) c
+        ON CONFLICT (name) DO UPDATE
+        SET value = EXCLUDED.value,
+            updated_at = NOW()
+    """))
+
+
+# What upload_daily_rollup should hold, straight from upload_log
+_ROLLUP_FROM_UPLOADS = """
+    SELECT
+        uploaded_at::date AS day,
+        created_by_user_id AS user_id,
+        COUNT(*) AS files,
+        COALESCE(SUM(total_records), 0) AS records,
+        COALESCE(SUM(duplicate_records), 0) AS duplicates,
+        COUNT(*) FILTER (WHERE processing_status = 'failed'
+                            OR status = 'FAILED') AS failures
+    FROM upload_log
+    WHERE created_by_user_id IS NOT NULL
+      AND processing_status IS DISTINCT FROM 'deleting'
+    GROUP BY uploaded_at::date, created_by_user_id
+"""
+
+
+def rebuild_rollup(conn) -> int:
+    """
+    Bring upload_daily_rollup in line with upload_log (backfill / repair).
+    Only rows that drifted are written, so a pass over a correct table
+    touches nothing. Returns the rows fixed or removed.
+    """
+    fixed = conn.execute(text(f"""
+        INSERT INTO upload_daily_rollup
+            (day, user_id, files, records, duplicates, failures)
+        SELECT day, user_id, files, records, duplicates, failures
+        FROM ({_ROLLUP_FROM_UPLOADS}) e
+        ON CONFLICT (day, user_id) DO UPDATE
+        SET files      = EXCLUDED.files,
+            records    = EXCLUDED.records,
+            duplicates = EXCLUDED.duplicates,
+            failures   = EXCLUDED.failures
+        WHERE (upload_daily_rollup.files, upload_daily_rollup.records,
+               upload_daily_rollup.duplicates, upload_daily_rollup.failures)
+              IS DISTINCT FROM
+              (EXCLUDED.files, EXCLUDED.records,
+               EXCLUDED.duplicates, EXCLUDED.failures)
+    """)).rowcount
+    removed = conn.execute(text(f"""
+        DELETE FROM upload_daily_rollup r
+        WHERE NOT EXISTS (
+            SELECT 1 FROM ({_ROLLUP_FROM_UPLOADS}) e
+            WHERE e.day = r.day AND e.user_id = r.user_id
+        )
+    """)).rowcount
+    return fixed + removed
+
+
+def refresh_orphans(conn):
+    """The expensive anti-join — only ever run from the background job."""
+    conn.execute(text("""
+        INSERT INTO dashboard_counters (name, value)
+        SELECT 'orphaned_rows', COUNT(*)
+        FROM cleaned_data cd
+        LEFT JOIN upload_log ul ON ul.upload_id = cd.upload_id
+        WHERE ul.upload_id IS NULL
+        ON CONFLICT (name) DO UPDATE
+        SET value = EXCLUDED.value,
+            updated_at = NOW()
+    """))
+
+
+def run_stats_job():
+    """
+    One pass of the scheduled job. An advisory lock makes sure only one
+    worker process does the scan when several are running.
+    """
+    with engine.connect() as conn:
+        got_lock = conn.execute(
+            text("SELECT pg_try_advisory_lock(:k)"), {"k": _STATS_JOB_LOCK_KEY}
+        ).scalar()
+        if not got_lock:
+            return
+
+        try:
+            recount(conn)
+            conn.commit()
+            # Like the counters, the rollup is kept by deltas; repair drift
+            drifted = rebuild_rollup(conn)
+            conn.commit()
+            if drifted:
+                print(f"[STATS] Repaired {drifted} upload_daily_rollup rows")
+            refresh_orphans(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute(
+                text("SELECT pg_advisory_unlock(:k)"), {"k": _STATS_JOB_LOCK_KEY}
+            )
+            conn.commit()
+
+    invalidate_cache()
+
+
+def _stats_loop():
+    while True:
+        try:
+            run_stats_job()
+        except Exception as e:
+            print(f"[STATS] Background stats job failed: {e}")
+        time.sleep(STATS_JOB_INTERVAL_SECONDS)
+
+
+def start_stats_job():
+    global _job_started
+    if _job_started:
+        return
+    _job_started = True
+    threading.Thread(target=_stats_loop, name="stats-job", daemon=True).start()
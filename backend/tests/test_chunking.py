@@ -0,0 +1,142 @@
+import io
+import threading
+from contextlib import closing
+
+import pandas as pd
+import pytest
+
+import chunking
+from chunking import MemoryBudget, adaptive_chunks
+from profiling import StageTimer
+
+
+def _reader(rows: int, chunksize: int = 10):
+    csv = "email,phone\n" + "".join(f"u{i}@example.com,{i}\n" for i in range(rows))
+    return pd.read_csv(io.StringIO(csv), chunksize=chunksize, dtype=str)
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """Probe 10 rows, then aim for chunks of 40 rows of this test's data."""
+    monkeypatch.setattr(chunking, "CHUNK_PROBE_ROWS", 10)
+    monkeypatch.setattr(chunking, "CHUNK_MIN_ROWS", 5)
+    monkeypatch.setattr(chunking, "CHUNK_MAX_ROWS", 1_000)
+    probe = next(iter(_reader(10)))
+    row_bytes = chunking.frame_bytes(probe) / len(probe)
+    monkeypatch.setattr(chunking, "CHUNK_TARGET_BYTES", int(row_bytes * 40))
+    return row_bytes * chunking.CHUNK_WORKING_FACTOR
+
+
+# ---------------- MEMORY BUDGET ----------------
+def test_acquire_grants_what_is_left_but_at_least_minimum():
+    budget = MemoryBudget(100)
+
+    assert budget.acquire(70, 10) == 70
+    assert budget.acquire(70, 10) == 30
+    assert budget.used == 100
+
+
+def test_lone_reservation_may_exceed_total():
+    budget = MemoryBudget(100)
+
+    assert budget.acquire(500, 500) == 500
+    budget.release(500)
+    assert budget.used == 0
+
+
+def test_acquire_waits_until_minimum_fits():
+    budget = MemoryBudget(100)
+    budget.acquire(90, 90)
+    granted = []
+    waiter = threading.Thread(target=lambda: granted.append(budget.acquire(50, 20)))
+    waiter.start()
+
+    waiter.join(0.2)
+    assert waiter.is_alive() and not granted
+
+    budget.release(90)
+    waiter.join(5)
+    assert granted == [50]
+
+
+def test_release_never_goes_negative():
+    budget = MemoryBudget(100)
+    budget.acquire(10, 10)
+    budget.release(50)
+    budget.release(0)
+
+    assert budget.used == 0
+
+
+def test_chunk_rows_stays_within_bounds():
+    assert chunking.chunk_rows(chunking.CHUNK_TARGET_BYTES) == chunking.CHUNK_MIN_ROWS
+    assert chunking.chunk_rows(0) == chunking.CHUNK_MAX_ROWS
+    assert chunking.chunk_rows(1024) == chunking.CHUNK_TARGET_BYTES // 1024
+
+
+# ---------------- ADAPTIVE CHUNKS ----------------
+def test_chunks_sized_from_probe_and_budget_released(small_chunks):
+    budget = MemoryBudget(10 ** 9)
+
+    sizes = [len(c) for c in adaptive_chunks(_reader(100), budget=budget)]
+
+    assert sizes == [10, 40, 40, 10]
+    assert budget.used == 0
+
+
+def test_chunk_holds_its_reservation_until_the_next(small_chunks):
+    budget = MemoryBudget(10 ** 9)
+    chunks = adaptive_chunks(_reader(100), budget=budget)
+
+    first = next(chunks)
+    assert budget.used == int(len(first) * small_chunks)
+    second = next(chunks)
+    assert budget.used == int(len(second) * small_chunks)
+    chunks.close()
+    assert budget.used == 0
+
+
+def test_closing_mid_file_releases_the_budget(small_chunks):
+    budget = MemoryBudget(10 ** 9)
+
+    with pytest.raises(RuntimeError):
+        with closing(adaptive_chunks(_reader(100), budget=budget)) as chunks:
+            for _ in chunks:
+                raise RuntimeError("copy failed")
+
+    assert budget.used == 0
+
+
+def test_chunks_shrink_when_the_budget_is_busy(small_chunks):
+    budget = MemoryBudget(int(100 * small_chunks))
+    budget.acquire(int(80 * small_chunks), 0)  # another upload
+
+    sizes = [len(c) for c in adaptive_chunks(_reader(60), budget=budget)]
+
+    assert sizes[0] == 10
+    assert max(sizes[1:]) <= 20
+    assert sum(sizes) == 60
+    assert budget.used == int(80 * small_chunks)
+
+
+def test_header_only_csv_yields_one_empty_chunk():
+    budget = MemoryBudget(10 ** 9)
+    reader = pd.read_csv(io.StringIO("email,phone\n"), chunksize=10, dtype=str)
+
+    chunks = list(adaptive_chunks(reader, budget=budget))
+
+    assert [len(c) for c in chunks] == [0]
+    assert list(chunks[0].columns) == ["email", "phone"]
+    assert budget.used == 0
+
+
+def test_timer_separates_reads_from_budget_waits(small_chunks):
+    timer = StageTimer()
+
+    list(adaptive_chunks(_reader(100), budget=MemoryBudget(10 ** 9), timer=timer))
+
+    report = timer.report()
+    assert report["read"]["rows"] == 100
+    assert report["read"]["calls"] == 5  # four chunks and the empty end
+    assert report["memory_wait"]["calls"] == 5
+    assert report["memory_wait"]["rows"] == 0
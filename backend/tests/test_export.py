@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+
+import openpyxl
+import pytest
+
+import export
+
+
+def _sheets(path):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return {
+            ws.title: [list(r) for r in ws.iter_rows(values_only=True)]
+            for ws in workbook.worksheets
+        }
+    finally:
+        workbook.close()
+
+
+def test_xlsx_spills_to_new_sheets_with_header(tmp_path, monkeypatch):
+    # Three data rows per sheet
+    monkeypatch.setattr(export, "XLSX_MAX_ROWS", 4)
+    path = str(tmp_path / "out.xlsx")
+    rows = [{"email": f"user{i}@example.com", "phone": str(i)} for i in range(7)]
+
+    written = export.write_xlsx(path, ["email", "phone"], rows)
+
+    assert written == 7
+    sheets = _sheets(path)
+    assert list(sheets) == ["Cleaned Data", "Cleaned Data (2)", "Cleaned Data (3)"]
+    assert [len(s) for s in sheets.values()] == [4, 4, 2]
+    for sheet in sheets.values():
+        assert sheet[0] == ["email", "phone"]
+    assert sheets["Cleaned Data (3)"][1] == ["user6@example.com", "6"]
+
+
+def test_xlsx_exact_sheet_fill_does_not_add_empty_sheet(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "XLSX_MAX_ROWS", 4)
+    path = str(tmp_path / "out.xlsx")
+
+    export.write_xlsx(path, ["a"], ({"a": str(i)} for i in range(6)))
+
+    assert list(_sheets(path)) == ["Cleaned Data", "Cleaned Data (2)"]
+
+
+def test_xlsx_without_rows_keeps_header(tmp_path):
+    path = str(tmp_path / "out.xlsx")
+
+    assert export.write_xlsx(path, ["a", "b"], []) == 0
+    assert _sheets(path) == {"Cleaned Data": [["a", "b"]]}
+
+
+def test_xlsx_keeps_values_as_text(tmp_path):
+    path = str(tmp_path / "out.xlsx")
+
+    export.write_xlsx(path, ["v"], [{"v": "=1+1"}, {"v": "007"}])
+
+    assert _sheets(path)["Cleaned Data"][1:] == [["=1+1"], ["007"]]
+
+
+# ---------------- ARTIFACT CACHE ----------------
+def _artifact(cache_dir, name, size, age_seconds):
+    path = cache_dir / name
+    path.write_bytes(b"x" * size)
+    used = time.time() - age_seconds
+    os.utime(path, (used, used))
+    return path
+
+
+def test_evict_removes_least_recently_used_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CACHE_DIR", str(tmp_path))
+    oldest = _artifact(tmp_path, "1_csv_none.csv", 100, 3000)
+    older = _artifact(tmp_path, "2_csv_none.csv", 100, 2000)
+    newest = _artifact(tmp_path, "3_csv_none.csv", 100, 1000)
+
+    assert export.evict_artifacts(max_bytes=150) == 2
+
+    assert not oldest.exists() and not older.exists()
+    assert newest.exists()
+
+
+def test_evict_keeps_artifacts_within_grace_period(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CACHE_DIR", str(tmp_path))
+    stale = _artifact(tmp_path, "1_csv_none.csv", 100, 3000)
+    streaming = _artifact(tmp_path, "2_csv_none.csv", 100, 10)
+
+    assert export.evict_artifacts(max_bytes=50) == 1
+
+    assert not stale.exists()
+    assert streaming.exists()
+
+
+def test_evict_ignores_partial_files_and_fitting_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CACHE_DIR", str(tmp_path))
+    partial = _artifact(tmp_path, "1_csv_none.csv.1.2.partial", 1000, 3000)
+    kept = _artifact(tmp_path, "2_csv_none.csv", 100, 3000)
+
+    assert export.evict_artifacts(max_bytes=100) == 0
+
+    assert partial.exists() and kept.exists()
+
+
+def test_store_artifact_builds_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CACHE_DIR", str(tmp_path / "cache"))
+    builds = []
+
+    def build(path):
+        builds.append(path)
+        with open(path, "w") as f:
+            f.write("a,b\n")
+        return 0
+
+    path, st = export.store_artifact(7, "csv", "none", build)
+    again, st_again = export.store_artifact(7, "csv", "none", build)
+
+    assert len(builds) == 1
+    assert path == again == export.artifact_path(7, "csv", "none")
+    assert export.artifact_etag(st) == export.artifact_etag(st_again)
+    assert [p.name for p in (tmp_path / "cache").iterdir()] == ["7_csv_none.csv"]
+
+
+def test_failed_build_leaves_nothing_behind(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CACHE_DIR", str(tmp_path))
+
+    def build(path):
+        with open(path, "w") as f:
+            f.write("half")
+        raise RuntimeError("database went away")
+
+    with pytest.raises(RuntimeError):
+        export.store_artifact(7, "csv", "none", build)
+
+    assert list(tmp_path.iterdir()) == []
+    assert export.get_artifact(7, "csv", "none") is None
+
+
+def test_get_artifact_moves_atime_but_keeps_etag(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CACHE_DIR", str(tmp_path))
+    path = _artifact(tmp_path, "7_csv_none.csv", 10, 3000)
+    before = os.stat(path)
+
+    _, st = export.get_artifact(7, "csv", "none")
+
+    after = os.stat(path)
+    assert after.st_atime > before.st_atime
+    assert after.st_mtime_ns == before.st_mtime_ns
+    assert export.artifact_etag(st) == export.artifact_etag(after)
+
+
+def test_invalidate_artifacts_only_touches_given_uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CACHE_DIR", str(tmp_path))
+    _artifact(tmp_path, "7_csv_none.csv", 10, 0)
+    _artifact(tmp_path, "7_parquet_zstd.parquet", 10, 0)
+    other = _artifact(tmp_path, "70_csv_none.csv", 10, 0)
+
+    assert export.invalidate_artifacts([7]) == 2
+
+    assert [p.name for p in tmp_path.iterdir()] == [other.name]
+
+
+def test_invalidate_waits_for_in_flight_build_and_drops_its_result(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CACHE_DIR", str(tmp_path))
+    building = threading.Event()
+    finish = threading.Event()
+    results = []
+
+    def build(path):
+        with open(path, "w") as f:
+            f.write("a\n")
+        building.set()
+        finish.wait(5)
+
+    builder = threading.Thread(
+        target=lambda: results.append(export.store_artifact(7, "csv", "none", build))
+    )
+    builder.start()
+    assert building.wait(5)
+
+    invalidator = threading.Thread(target=export.invalidate_artifacts, args=([7],))
+    invalidator.start()
+    invalidator.join(0.2)
+    assert invalidator.is_alive()  # waits for the build, leaves its .partial alone
+
+    finish.set()
+    builder.join(5)
+    invalidator.join(5)
+
+    assert results  # the build published without error
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_build_is_dropped_when_upload_is_no_longer_valid(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_CACHE_DIR", str(tmp_path))
+
+    def build(path):
+        with open(path, "w") as f:
+            f.write("a\n")
+
+    with pytest.raises(export.ArtifactInvalidated):
+        export.store_artifact(7, "csv", "none", build, still_valid=lambda: False)
+
+    assert list(tmp_path.iterdir()) == []
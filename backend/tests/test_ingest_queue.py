@@ -0,0 +1,242 @@
+import threading
+
+import pytest
+
+import ingest_queue
+from ingest_queue import IngestScheduler
+
+MB = 1024 * 1024
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(ingest_queue, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def published(monkeypatch):
+    events = []
+    monkeypatch.setattr(
+        ingest_queue.progress, "publish",
+        lambda upload_id, percent, status, message, **kw:
+            events.append((upload_id, status, kw.get("queue_position")))
+    )
+    return events
+
+
+def _scheduler(workers=4, fast_lane_workers=1) -> IngestScheduler:
+    sched = IngestScheduler(workers, fast_lane_workers)
+    sched._started = True  # drive dispatch by hand, no worker threads
+    return sched
+
+
+def _claim(sched, fast_lane=False):
+    with sched._cond:
+        job = sched._claim(fast_lane)
+    return job.upload_id if job else None
+
+
+# ---------------- ORDERING / CAPS ----------------
+def test_smallest_file_goes_first(clock):
+    sched = _scheduler()
+    sched.submit(1, 10, 300 * MB, print)
+    sched.submit(2, 20, 5 * MB, print)
+    sched.submit(3, 30, 40 * MB, print)
+
+    assert [_claim(sched) for _ in range(3)] == [2, 3, 1]
+
+
+def test_equal_rank_is_first_come_first_served(clock):
+    sched = _scheduler()
+    for upload_id in (1, 2, 3):
+        sched.submit(upload_id, upload_id, MB, print)
+
+    assert [_claim(sched) for _ in range(3)] == [1, 2, 3]
+
+
+def test_user_cap_lets_other_users_through(clock):
+    sched = _scheduler()
+    for upload_id in (1, 2, 3):
+        sched.submit(upload_id, 10, MB, print)
+    sched.submit(4, 20, 100 * MB, print)
+
+    claimed = [_claim(sched) for _ in range(3)]
+
+    assert claimed == [1, 2, 4]
+    assert _claim(sched) is None  # upload 3 waits for one of user 10's jobs
+
+    sched._finish(sched._running[1])
+    assert _claim(sched) == 3
+
+
+def test_fast_lane_only_takes_small_files(clock):
+    sched = _scheduler()
+    sched.submit(1, 10, ingest_queue.FAST_LANE_BYTES + 1, print)
+
+    assert _claim(sched, fast_lane=True) is None
+    assert _claim(sched) == 1
+
+
+def test_fast_lane_never_takes_every_worker():
+    assert IngestScheduler(1, 1).fast_lane_workers == 0
+    assert IngestScheduler(4, 1).fast_lane_workers == 1
+
+
+# ---------------- AGING ----------------
+def test_waiting_makes_a_file_rank_smaller(clock):
+    big = ingest_queue._Job(1, 10, 500 * MB, print, ())
+    before = big.rank(clock.now)
+    clock.now += 60
+
+    assert big.rank(clock.now) == before - 60 * ingest_queue.SJF_AGING_BYTES_PER_SEC
+
+
+def test_overdue_jobs_go_first_oldest_first(clock):
+    sched = _scheduler()
+    sched.submit(1, 10, 900 * MB, print)
+    clock.now += 1
+    sched.submit(2, 20, 800 * MB, print)
+    clock.now += ingest_queue.SJF_MAX_WAIT_SECONDS
+    sched.submit(3, 30, 1, print)
+
+    assert [_claim(sched) for _ in range(3)] == [1, 2, 3]
+
+
+@pytest.mark.parametrize("aging", [ingest_queue.SJF_AGING_BYTES_PER_SEC, 0])
+def test_big_file_runs_while_small_files_keep_arriving(clock, monkeypatch, aging):
+    """One worker; a small upload arrives every 10 s and takes 10 s to run."""
+    monkeypatch.setattr(ingest_queue, "SJF_AGING_BYTES_PER_SEC", aging)
+    sched = _scheduler(workers=1, fast_lane_workers=0)
+    sched.submit(0, 1, 4 * 1024 * MB, print)
+    queued_at = clock.now
+
+    for tick in range(1, 1_000):
+        sched.submit(tick, 100 + tick, MB, print)
+        upload_id = _claim(sched)
+        clock.now += 10
+        sched._finish(sched._running[upload_id])
+        if upload_id == 0:
+            break
+    else:
+        pytest.fail("big upload never ran")
+
+    assert clock.now - queued_at <= ingest_queue.SJF_MAX_WAIT_SECONDS + 10
+
+
+# ---------------- POSITIONS / ETA ----------------
+def test_estimates_replay_queue_onto_free_workers(clock):
+    sched = _scheduler(workers=2, fast_lane_workers=0)
+    sched.bytes_per_sec = MB
+    sched.submit(1, 10, 100 * MB, print)
+    assert _claim(sched) == 1
+    clock.now += 40  # upload 1 has about 60 s left
+    sched.submit(2, 20, 30 * MB, print)
+    sched.submit(3, 30, 20 * MB, print)
+    sched.submit(4, 40, 50 * MB, print)
+
+    estimates = [(j.upload_id, pos, eta) for j, pos, eta in sched._estimates()]
+
+    assert estimates == [(3, 1, 20), (2, 2, 50), (4, 3, 100)]
+
+
+def test_publish_positions_skips_started_jobs(clock, published):
+    sched = _scheduler()
+    sched.submit(1, 10, MB, print)
+    sched.submit(2, 20, 2 * MB, print)
+    estimates = sched._estimates()
+    assert _claim(sched) == 1
+    sched._estimates = lambda: estimates  # a snapshot taken before the claim
+
+    sched._publish_positions(force=True)
+
+    assert published == [(2, "queued", 2)]
+
+
+def test_publish_positions_only_sends_changes_unless_forced(clock, published):
+    sched = _scheduler()
+    sched.submit(1, 10, MB, print)
+
+    sched._publish_positions(force=False)
+    sched._publish_positions(force=False)
+    assert published == [(1, "queued", 1)]
+
+    sched._publish_positions(force=True)
+    assert len(published) == 2
+
+
+def test_finish_updates_rate_and_frees_the_user(clock):
+    sched = _scheduler()
+    start_rate = sched.bytes_per_sec
+    sched.submit(1, 10, 100 * MB, print)
+    job = sched._running.get(_claim(sched))
+    clock.now += 10
+
+    sched._finish(job)
+
+    rate = 10 * MB
+    assert sched.bytes_per_sec == pytest.approx(
+        start_rate + ingest_queue.ETA_SMOOTHING * (rate - start_rate)
+    )
+    assert sched._user_running == {} and sched._running == {}
+
+
+def test_state_lists_running_and_queued(clock):
+    sched = _scheduler()
+    sched.submit(1, 10, MB, print)
+    sched.submit(2, 20, 2 * MB, print)
+    _claim(sched)
+    clock.now += 5
+
+    state = sched.state()
+
+    assert [r["upload_id"] for r in state["running"]] == [1]
+    assert state["running"][0]["running_seconds"] == 5
+    assert [(q["upload_id"], q["position"]) for q in state["queued"]] == [(2, 1)]
+
+
+# ---------------- CANCEL ----------------
+def test_cancel_drops_only_queued_jobs(clock):
+    sched = _scheduler()
+    sched.submit(1, 10, 1 * MB, print)
+    sched.submit(2, 20, 2 * MB, print)
+    sched.submit(3, 30, 3 * MB, print)
+    assert _claim(sched) == 1
+
+    assert sched.cancel([1, 2, 99]) == [2]
+
+    assert [j.upload_id for j in sched._queued] == [3]
+    assert 1 in sched._running
+    assert sched._changed.is_set()
+
+
+def test_cancel_with_nothing_queued_changes_nothing(clock):
+    sched = _scheduler()
+
+    assert sched.cancel([1]) == []
+    assert not sched._changed.is_set()
+
+
+# ---------------- WORKERS ----------------
+def test_workers_run_jobs_and_survive_failures(published):
+    sched = IngestScheduler(workers=2, fast_lane_workers=0)
+    done = threading.Event()
+    ran = []
+
+    def fail():
+        raise RuntimeError("bad file")
+
+    sched.submit(1, 10, MB, fail)
+    sched.submit(2, 10, MB, lambda: (ran.append(2), done.set()))
+
+    assert done.wait(5)
+    assert ran == [2]
@@ -0,0 +1,94 @@
+import pytest
+
+import metrics
+from profiling import StageTimer
+
+
+@pytest.fixture
+def registry():
+    """Drop metrics a test registers so they don't leak into render()."""
+    before = list(metrics._registry)
+    yield
+    metrics._registry[:] = before
+
+
+def test_counter_renders_help_type_and_labelled_values(registry):
+    c = metrics.Counter("test_requests_total", "Requests", ("route",))
+    c.inc(route="/b")
+    c.inc(2, route="/a")
+    c.inc(route="/a")
+
+    assert c.render() == [
+        "# HELP test_requests_total Requests",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{route="/a"} 3',
+        'test_requests_total{route="/b"} 1',
+    ]
+
+
+def test_unlabelled_metric_reads_zero_before_first_update(registry):
+    c = metrics.Counter("test_plain_total", "Plain")
+
+    assert c.render()[-1] == "test_plain_total 0"
+
+
+def test_label_values_are_escaped(registry):
+    g = metrics.Gauge("test_gauge", "Gauge", ("name",))
+    g.set(1, name='a"b\\c\nd')
+
+    assert g.render()[-1] == 'test_gauge{name="a\\"b\\\\c\\nd"} 1'
+
+
+def test_gauge_inc_dec_and_callback(registry):
+    g = metrics.Gauge("test_busy", "Busy")
+    g.inc(3)
+    g.dec()
+    assert g.render()[-1] == "test_busy 2"
+
+    cb = metrics.Gauge("test_cb", "Callback", callback=lambda: 1.5)
+    assert cb.render()[-1] == "test_cb 1.5"
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    h = metrics.Histogram("test_seconds", "Seconds", ("stage",), buckets=(1, 0.1))
+    for value in (0.05, 0.5, 5):
+        h.observe(value, stage="read")
+
+    assert h.render()[2:] == [
+        'test_seconds_bucket{stage="read",le="0.1"} 1',
+        'test_seconds_bucket{stage="read",le="1.0"} 2',
+        'test_seconds_bucket{stage="read",le="+Inf"} 3',
+        'test_seconds_sum{stage="read"} 5.55',
+        'test_seconds_count{stage="read"} 3',
+    ]
+
+
+def test_render_skips_a_failing_metric(registry):
+    metrics.Gauge("test_broken", "Broken", callback=lambda: 1 / 0)
+    metrics.Counter("test_after_total", "After").inc()
+
+    out = metrics.render()
+
+    assert "test_broken " not in out
+    assert "test_after_total 1\n" in out
+    assert out.endswith("\n")
+
+
+def test_observe_ingest_records_each_stage(registry, monkeypatch):
+    stage_seconds = metrics.Histogram("test_stage_seconds", "Stages", ("stage",))
+    rows = metrics.Counter("test_rows_total", "Rows", ("format",))
+    monkeypatch.setattr(metrics, "INGEST_STAGE_SECONDS", stage_seconds)
+    monkeypatch.setattr(metrics, "ROWS_INGESTED", rows)
+    timer = StageTimer()
+    for name in ("read", "copy"):
+        with timer.stage(name, rows=10):
+            pass
+
+    metrics.observe_ingest(timer, "csv", 10)
+
+    counts = [l for l in stage_seconds.render() if "_count" in l]
+    assert counts == [
+        'test_stage_seconds_count{stage="copy"} 1',
+        'test_stage_seconds_count{stage="read"} 1',
+    ]
+    assert rows.render()[-1] == 'test_rows_total{format="csv"} 10'
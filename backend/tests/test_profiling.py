@@ -0,0 +1,108 @@
+import threading
+import tracemalloc
+
+import pytest
+
+import profiling
+from profiling import StageTimer, percentile
+
+
+def test_stage_passes_add_up():
+    timer = StageTimer()
+    for rows in (10, 20, 30):
+        with timer.stage("copy", rows=rows):
+            pass
+
+    copy = timer.report()["copy"]
+    assert copy["rows"] == 60
+    assert copy["calls"] == 3
+    assert copy["seconds"] >= 0
+
+
+def test_rows_can_be_set_inside_the_stage():
+    timer = StageTimer()
+    with timer.stage("read") as stage:
+        stage["rows"] = 42
+
+    assert timer.report()["read"]["rows"] == 42
+
+
+def test_stage_is_recorded_when_it_raises():
+    timer = StageTimer()
+    with pytest.raises(ValueError):
+        with timer.stage("normalize", rows=5):
+            raise ValueError("bad cell")
+
+    assert timer.report()["normalize"]["calls"] == 1
+
+
+def test_report_lists_known_stages_first():
+    timer = StageTimer()
+    for name in ("memory_wait", "cache", "read", "dedup"):
+        with timer.stage(name, rows=1):
+            pass
+
+    assert list(timer.report()) == ["read", "dedup", "cache", "memory_wait"]
+
+
+def test_stage_without_rows_has_no_rate():
+    timer = StageTimer()
+    with timer.stage("memory_wait"):
+        pass
+
+    assert timer.report()["memory_wait"]["rows_per_sec"] is None
+
+
+def test_rss_is_recorded_without_a_sampler_thread():
+    before = threading.active_count()
+    timer = StageTimer()
+    with timer.stage("read", rows=1):
+        assert threading.active_count() == before
+
+    if profiling.current_rss():
+        assert timer.report()["read"]["peak_rss_mb"] > 0
+
+
+def test_sampler_thread_stops_with_the_stage():
+    timer = StageTimer(sample_rss=True)
+    with timer.stage("read", rows=1):
+        assert any(t.name == "stage-sampler" for t in threading.enumerate())
+
+    assert not any(t.name == "stage-sampler" for t in threading.enumerate())
+
+
+def test_memory_summary_when_tracing_is_off():
+    timer = StageTimer()
+    with timer.stage("read", rows=1):
+        pass
+
+    assert timer.memory_peak() is None
+    assert timer.memory_summary() == "tracemalloc off"
+
+
+def test_trace_memory_records_peak_and_our_allocation_site():
+    was_tracing = tracemalloc.is_tracing()
+    timer = StageTimer(trace_memory=True)
+    try:
+        with timer.stage("normalize", rows=1):
+            blob = [bytearray(1024 * 1024) for _ in range(8)]
+        del blob
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    name, py_peak, sites = timer.memory_peak()
+    assert name == "normalize"
+    assert py_peak > 5 * 1024 * 1024
+    assert sites[0]["site"].startswith("tests/test_profiling.py:")
+    assert timer.report()["normalize"]["py_peak_mb"] > 5
+    assert timer.memory_summary().startswith("peak ")
+
+
+def test_percentile_nearest_rank():
+    values = [5, 1, 4, 2, 3]
+
+    assert percentile(values, 50) == 3
+    assert percentile(values, 95) == 5
+    assert percentile(values, 0) == 1
+    assert percentile([], 50) is None
@@ -0,0 +1,215 @@
+from contextlib import contextmanager
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+import purge
+
+
+class Result:
+    def __init__(self, rows=(), scalar=None, rowcount=0):
+        self._rows = list(rows)
+        self._scalar = scalar
+        self.rowcount = rowcount
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def scalar(self):
+        return self._scalar
+
+
+class ScriptedConn:
+    """
+    Stands in for a Connection. Each statement is recorded; `respond` picks
+    the Result for it from (sql, params), defaulting to an empty one.
+    """
+
+    def __init__(self, respond=None):
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.respond = respond or (lambda sql, params: None)
+
+    def execute(self, statement, params=None):
+        sql, params = str(statement), params or {}
+        self.statements.append((sql, params))
+        return self.respond(sql, params) or Result()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def matching(self, fragment: str) -> list:
+        return [(s, p) for s, p in self.statements if fragment in s]
+
+
+class FakeEngine:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextmanager
+    def connect(self):
+        yield self.conn
+
+    @contextmanager
+    def begin(self):
+        yield self.conn
+
+
+def _row(upload_id, rows_total, **extra):
+    fields = dict(
+        upload_id=upload_id, rows_total=rows_total,
+        processing_status="ready", status="SUCCESS",
+        total_records=rows_total, duplicate_records=0,
+        created_by_user_id=7, day=date(2026, 10, 1),
+    )
+    fields.update(extra)
+    return SimpleNamespace(_mapping=fields, **fields)
+
+
+# ---------------- mark_deleting ----------------
+def test_mark_deleting_selects_only_uploads_not_already_deleting():
+    conn = ScriptedConn()
+
+    assert purge.mark_deleting(conn, [1, 2], requested_by=3) == []
+
+    sql, params = conn.statements[0]
+    assert "processing_status IS DISTINCT FROM 'deleting'" in sql
+    assert params == {"ids": [1, 2]}
+    # Nothing found: nothing is hidden, counted down or queued
+    assert len(conn.statements) == 1
+
+
+def test_mark_deleting_queues_only_the_uploads_it_found():
+    # Upload 2 was already deleting, so the SELECT only returns upload 1
+    def respond(sql, params):
+        if "FOR UPDATE" in sql:
+            return Result(rows=[_row(1, 500)])
+
+    conn = ScriptedConn(respond)
+
+    assert purge.mark_deleting(conn, [1, 2], requested_by=3) == [1]
+
+    [(_, hidden)] = conn.matching("SET processing_status = 'deleting'")
+    assert hidden == {"ids": [1]}
+    [(_, queued)] = conn.matching("INSERT INTO upload_purge_queue")
+    assert queued == {"ids": [1], "by": [3], "totals": [500]}
+    # Counted down once, for upload 1 only
+    assert len(conn.matching("upload_daily_rollup")) == 1
+
+
+# ---------------- purge_upload ----------------
+def test_purge_upload_deletes_in_batches_then_finishes_in_one_transaction(monkeypatch):
+    monkeypatch.setattr(purge, "PURGE_BATCH_ROWS", 10)
+    batches = {"cleaned_data": [10, 10, 3], "related_groups_cache": [0]}
+
+    def respond(sql, params):
+        for table, left in batches.items():
+            if f"DELETE FROM {table}\n" in sql and "LIMIT" in sql:
+                return Result(rowcount=left.pop(0))
+
+    conn = ScriptedConn(respond)
+    purge.purge_upload(conn, 42)
+
+    assert batches == {"cleaned_data": [], "related_groups_cache": []}
+    progress = [p["n"] for _, p in conn.matching("rows_deleted = rows_deleted + :n")]
+    assert progress == [10, 10, 3]
+    # One commit per batch, plus the final one
+    assert conn.commits == 4 + 1
+
+
+def test_purge_upload_clears_side_tables_with_the_upload_log_row():
+    conn = ScriptedConn()
+    purge.purge_upload(conn, 42)
+
+    final = [s for s, _ in conn.statements if "LIMIT" not in s]
+    for table in purge.PURGE_TABLES + purge.PURGE_SIDE_TABLES:
+        assert any(f"DELETE FROM {table} WHERE upload_id" in s for s in final)
+    [(log_sql, _)] = conn.matching("DELETE FROM upload_log")
+    assert "processing_status = 'deleting'" in log_sql
+    # upload_log goes before the queue row, in the same transaction
+    order = [s for s, _ in conn.statements]
+    assert order.index(log_sql) < len(order) - 1
+    assert "DELETE FROM upload_purge_queue" in order[-1]
+
+
+# ---------------- run_purger ----------------
+def test_run_purger_backs_off_a_failing_upload_and_carries_on(monkeypatch):
+    queue = [1, 2]
+
+    def respond(sql, params):
+        if "pg_try_advisory_lock" in sql:
+            return Result(scalar=True)
+        if "SELECT upload_id FROM upload_purge_queue" in sql:
+            return Result(scalar=queue[0] if queue else None)
+
+    conn = ScriptedConn(respond)
+    monkeypatch.setattr(purge, "engine", FakeEngine(conn))
+
+    purged = []
+
+    def purge_upload(conn, upload_id):
+        queue.remove(upload_id)  # a failed upload is backed off, out of reach
+        if upload_id == 1:
+            raise RuntimeError("lock timeout")
+        purged.append(upload_id)
+
+    monkeypatch.setattr(purge, "purge_upload", purge_upload)
+
+    purge.run_purger()
+
+    assert purged == [2]
+    assert conn.rollbacks == 1
+    [(backoff_sql, backoff)] = conn.matching("attempts = attempts + 1")
+    assert "retry_at" in backoff_sql
+    assert backoff["uid"] == 1 and backoff["err"] == "lock timeout"
+    assert conn.matching("pg_advisory_unlock")
+
+
+def test_run_purger_skips_uploads_waiting_to_be_retried(monkeypatch):
+    def respond(sql, params):
+        if "pg_try_advisory_lock" in sql:
+            return Result(scalar=True)
+
+    conn = ScriptedConn(respond)
+    monkeypatch.setattr(purge, "engine", FakeEngine(conn))
+
+    purge.run_purger()
+
+    [(pick, _)] = conn.matching("SELECT upload_id FROM upload_purge_queue")
+    assert "retry_at IS NULL OR retry_at <= NOW()" in pick
+
+
+# ---------------- after an ingest job ----------------
+@pytest.mark.parametrize("status, requeued", [
+    ("ready", False), ("deleting", True), (None, True),
+])
+def test_sweep_after_job_requeues_only_deleted_uploads(monkeypatch, status, requeued):
+    def respond(sql, params):
+        if "SELECT processing_status FROM upload_log" in sql and status:
+            return Result(rows=[SimpleNamespace(processing_status=status)])
+
+    conn = ScriptedConn(respond)
+    monkeypatch.setattr(purge, "engine", FakeEngine(conn))
+    purge._wake_event.clear()
+
+    assert purge.sweep_after_job(42) is requeued
+    assert bool(conn.matching("INSERT INTO upload_purge_queue")) is requeued
+    assert purge._wake_event.is_set() is requeued
+
+
+def test_check_not_deleted_raises_for_deleting_upload(monkeypatch):
+    def respond(sql, params):
+        return Result(rows=[SimpleNamespace(processing_status="deleting")])
+
+    monkeypatch.setattr(purge, "engine", FakeEngine(ScriptedConn(respond)))
+
+    with pytest.raises(purge.UploadDeleted):
+        purge.check_not_deleted(42)
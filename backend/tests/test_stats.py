@@ -0,0 +1,129 @@
+from datetime import date
+
+import pytest
+
+import stats
+
+
+class RecordingConn:
+    """Stands in for a Connection; keeps (sql, params) of each statement."""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params or {}))
+
+    def counter_deltas(self) -> dict:
+        out = {}
+        for sql, params in self.statements:
+            if "dashboard_counters" not in sql:
+                continue
+            for key, name in params.items():
+                if key.startswith("n"):
+                    out[name] = out.get(name, 0) + params["v" + key[1:]]
+        return out
+
+    def rollup_deltas(self) -> list:
+        return [
+            params for sql, params in self.statements
+            if "upload_daily_rollup" in sql
+        ]
+
+
+def _upload(processing_status="processing", status="PROCESSING",
+            total_records=0, duplicate_records=0, user_id=7):
+    return {
+        "processing_status": processing_status, "status": status,
+        "total_records": total_records, "duplicate_records": duplicate_records,
+        "created_by_user_id": user_id, "day": date(2026, 10, 1),
+    }
+
+
+READY = dict(processing_status="ready", status="SUCCESS",
+             total_records=100, duplicate_records=10)
+
+
+@pytest.fixture
+def conn():
+    return RecordingConn()
+
+
+def test_new_upload_counts_as_processing(conn):
+    stats.upload_added(conn, _upload())
+
+    assert conn.counter_deltas() == {"files_total": 1, "files_processing": 1}
+    assert conn.rollup_deltas() == [{
+        "day": date(2026, 10, 1), "uid": 7,
+        "files": 1, "records": 0, "duplicates": 0, "failures": 0,
+    }]
+
+
+def test_processing_to_ready_moves_records_only(conn):
+    before = _upload()
+    after = _upload(**READY)
+
+    stats.upload_changed(conn, before, after)
+
+    assert conn.counter_deltas() == {"files_processing": -1, "records_total": 100}
+    assert conn.rollup_deltas() == [{
+        "day": date(2026, 10, 1), "uid": 7,
+        "files": 0, "records": 100, "duplicates": 10, "failures": 0,
+    }]
+
+
+def test_processing_to_failed_counts_a_failure(conn):
+    stats.upload_changed(
+        conn, _upload(), _upload(processing_status="failed", status="FAILED")
+    )
+
+    assert conn.counter_deltas() == {"files_processing": -1, "files_failed": 1}
+    assert conn.rollup_deltas()[0]["failures"] == 1
+
+
+def test_unchanged_upload_writes_nothing(conn):
+    stats.upload_changed(conn, _upload(**READY), _upload(**READY))
+
+    assert conn.statements == []
+
+
+def test_add_then_remove_nets_to_zero(conn):
+    failed = _upload(processing_status="failed", status="FAILED", total_records=5)
+    stats.upload_added(conn, failed)
+    stats.upload_removed(conn, failed)
+
+    assert set(conn.counter_deltas().values()) == {0}
+    totals = {
+        k: sum(d[k] for d in conn.rollup_deltas())
+        for k in ("files", "records", "duplicates", "failures")
+    }
+    assert totals == {"files": 0, "records": 0, "duplicates": 0, "failures": 0}
+
+
+def test_ownerless_upload_skips_the_rollup(conn):
+    stats.upload_removed(conn, _upload(user_id=None, **READY))
+
+    assert conn.counter_deltas() == {"files_total": -1, "records_total": -100}
+    assert conn.rollup_deltas() == []
+
+
+def test_status_failed_counts_even_when_processing_status_does_not():
+    deltas = stats._upload_deltas(_upload(processing_status="ready", status="FAILED"), 1)
+
+    assert deltas["files_failed"] == 1
+    assert stats._rollup_deltas(_upload(status="FAILED"), -1)["failures"] == -1
+
+
+def test_missing_record_counts_are_zero():
+    row = _upload(total_records=None, duplicate_records=None)
+
+    assert stats._upload_deltas(row, 1)["records_total"] == 0
+    assert stats._rollup_deltas(row, 1)["duplicates"] == 0
+
+
+def test_users_changed_skips_zero_deltas(conn):
+    stats.users_changed(conn, total=-1)
+
+    assert conn.counter_deltas() == {"users_total": -1}
+    stats.users_changed(conn)
+    assert len(conn.statements) == 1
@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import text
 
 from db import engine
-from auth import get_current_user
+from auth import get_current_user, invalidate_user
 from security import hash_password
 from permissions import admin_only
+import stats
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -50,6 +51,7 @@ def create_user(
                     "r": role
                 }
             )
+            stats.users_changed(conn, total=1, active=1)
         except:
             raise HTTPException(status_code=400, detail="User exists")
 
@@ -65,14 +67,19 @@ def set_user_status(
     admin_only(user)
 
     with engine.begin() as conn:
-        conn.execute(
+        res = conn.execute(
             text("""
                 UPDATE users
                 SET is_active = :a
                 WHERE id = :id
+                  AND is_active IS DISTINCT FROM :a
             """),
             {"a": is_active, "id": user_id}
         )
+        if res.rowcount:
+            stats.users_changed(conn, active=1 if is_active else -1)
+
+    invalidate_user(user_id)
 
     return {"success": True}
 
@@ -98,4 +105,6 @@ def change_role(
             {"r": role, "id": user_id}
         )
 
+    invalidate_user(user_id)
+
     return {"success": True}
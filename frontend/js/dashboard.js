@@ -474,6 +474,65 @@ function renderFeed(data) {
     }).join("");
 }
 
+// ── INGESTION PROFILES ───────────────────────────────────────────────────────
+// A stage is flagged when it ran at under half the median rows/sec
+const PROFILE_SLOW_FACTOR = 0.5;
+
+function fmtSeconds(s) {
+    if (s === null || s === undefined) return "—";
+    if (s >= 3600) return (s / 3600).toFixed(1) + "h";
+    if (s >= 60)   return (s / 60).toFixed(1) + "m";
+    return s.toFixed(1) + "s";
+}
+
+function renderProfiles(data) {
+    const tbody = document.getElementById("profileBody");
+    if (!data.profiles || data.profiles.length === 0) {
+        tbody.innerHTML = `<tr><td colspan="8" class="feed-loading">No profiles yet</td></tr>`;
+        return;
+    }
+    const baseline = data.baseline || {};
+
+    tbody.innerHTML = data.profiles.map(p => {
+        const stages = Object.entries(p.stages || {}).map(([name, s]) => {
+            const median = baseline[name];
+            const slow = median && s.rows_per_sec !== null
+                && s.rows_per_sec < median * PROFILE_SLOW_FACTOR;
+            const title = `${fmt(s.rows)} rows · ${s.rows_per_sec !== null ? fmt(Math.round(s.rows_per_sec)) + " rows/s" : "—"}`
+                + (median ? ` (median ${fmt(Math.round(median))})` : "")
+                + (s.peak_rss_mb ? ` · peak ${s.peak_rss_mb} MB` : "")
+                + (s.py_peak_mb ? ` · python peak ${s.py_peak_mb} MB` : "")
+                + (s.top_allocations || []).map(t => `\n  ${t.size_mb} MB ${t.site}`).join("");
+            return `<span class="profile-stage${slow ? " profile-stage--slow" : ""}" title="${title}">${name} ${fmtSeconds(s.seconds)}</span>`;
+        }).join("");
+
+        const status = p.outcome === "failed"
+            ? ` <span class="badge badge--failed">Failed</span>` : "";
+
+        return `<tr>
+            <td><span class="feed-filename" title="${p.filename}">📄 ${p.filename}</span>${status}</td>
+            <td><span class="feed-user" title="${p.uploaded_by || ""}">${p.uploaded_by || "—"}</span></td>
+            <td><span class="feed-num">${fmt(p.total_records)}</span></td>
+            <td><span class="feed-num">${fmtSeconds(p.total_seconds)}</span></td>
+            <td><span class="feed-num">${p.rows_per_sec !== null ? fmt(Math.round(p.rows_per_sec)) : "—"}</span></td>
+            <td><span class="feed-num">${p.peak_rss_mb !== null ? fmt(Math.round(p.peak_rss_mb)) : "—"}</span></td>
+            <td><span class="feed-num">${p.chunks ?? "—"}</span></td>
+            <td>${stages}</td>
+        </tr>`;
+    }).join("");
+}
+
+async function loadIngestProfiles() {
+    const order = document.getElementById("profileOrder")?.value || "slowest";
+    try {
+        const res = await authFetch(`/admin/ingest-profiles?order=${order}&limit=10`);
+        if (!res || !res.ok) return;
+        renderProfiles(await res.json());
+    } catch (err) {
+        console.error(err);
+    }
+}
+
 // ── MAIN LOAD — called by showPanel() in upload.js ───────────────────────────
 async function loadDashboard() {
     try {
@@ -491,6 +550,7 @@ async function loadDashboard() {
         renderFileTypeChart(d.file_types);
         renderStatusChart(d.processing_status);
         renderFeed(d.recent_activity);
+        loadIngestProfiles();
 
     } catch (err) {
         console.error(err);
@@ -505,10 +505,8 @@ function exportData(format) {
             const url = URL.createObjectURL(blob);
             const a = document.createElement("a");
             a.href = url;
-            a.download =
-                format === "excel"
-                    ? `cleaned_${uploadId}.xlsx`
-                    : `cleaned_${uploadId}.csv`;
+            const ext = { excel: "xlsx", parquet: "parquet" }[format] || "csv";
+            a.download = `cleaned_${uploadId}.${ext}`;
             document.body.appendChild(a);
             a.click();
             a.remove();
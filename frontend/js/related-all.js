@@ -136,76 +136,18 @@ async function exportCSV() {
     btn.innerHTML = `<div class="spin-sm"></div> Exporting…`;
 
     try {
-        let allGroups = [];
-        let exportPage = 1;
-        const EXPORT_BATCH = 100;
-
-        while (true) {
-            const p = new URLSearchParams();
-            if (selUsr) p.append("user_id", selUsr);
-            if (selCat) p.append("category_id", selCat);
-            if (searchQ) p.append("search", searchQ);
-            p.append("match_type", tab);
-            p.append("sort", document.getElementById("sortSel").value);
-            p.append("page", exportPage);
-            p.append("page_size", EXPORT_BATCH);
-
-            const r = await af("/related-grouped-all?" + p.toString());
-            if (!r.ok) { toast("Export failed", "error"); return; }
-            const d = await r.json();
-
-            allGroups = allGroups.concat(d.groups);
-            btn.innerHTML = `<div class="spin-sm"></div> Fetching groups ${allGroups.length}/${d.total_groups}…`;
-
-            if (allGroups.length >= d.total_groups) break;
-            exportPage++;
-        }
-
-        if (!allGroups.length) { toast("No data to export", "error"); return; }
-
-        const allCols = new Set();
-        allGroups.forEach(g => (g.records || []).forEach(rec => Object.keys(rec.data || {}).forEach(k => allCols.add(k))));
-        const cols = [...allCols].filter(c => !c.startsWith("original_") && !c.startsWith("raw_"));
-
-        const headers = ["Match Type", "Match Key", "Source File", "Category", ...cols];
-        const rows = [headers];
-
-        btn.innerHTML = `<div class="spin-sm"></div> Fetching records…`;
-
-        for (const g of allGroups) {
-            let records = g.records || [];
-            if (g.record_count > records.length) {
-                const rp = new URLSearchParams();
-                rp.append("group_key", g.raw_key);
-                rp.append("match_type", g.match_type);
-                rp.append("page", 1);
-                rp.append("page_size", Math.min(g.record_count, 5000));
-                if (selUsr) rp.append("user_id", selUsr);
-                if (selCat) rp.append("category_id", selCat);
-                const rr = await af("/related-group-records?" + rp.toString());
-                if (rr.ok) { const rd = await rr.json(); records = rd.records; }
-            }
-
-            records.forEach(rec => {
-                const row = [
-                    g.match_type.toUpperCase(),
-                    g.match_key,
-                    rec.filename,
-                    rec.category || "",
-                    ...cols.map(c => {
-                        const v = rec.data?.[c];
-                        return (v == null || v === "nan" || v === "") ? "" : String(v);
-                    })
-                ];
-                rows.push(row);
-            });
-        }
-
-        const csv = rows.map(r =>
-            r.map(cell => `"${String(cell).replace(/"/g, '""')}"`).join(",")
-        ).join("\n");
-
-        const blob = new Blob([csv], { type: "text/csv;charset=utf-8;" });
+        const p = new URLSearchParams();
+        if (selUsr) p.append("user_id", selUsr);
+        if (selCat) p.append("category_id", selCat);
+        if (searchQ) p.append("search", searchQ);
+        p.append("match_type", tab);
+        p.append("format", "csv");
+
+        // Server streams every group with all member rows in one response
+        const r = await af("/related-grouped-all/export?" + p.toString());
+        if (!r.ok) { toast("Export failed", "error"); return; }
+        const blob = await r.blob();
+
         const url = URL.createObjectURL(blob);
         const a = document.createElement("a");
         a.href = url;
@@ -213,7 +155,7 @@ async function exportCSV() {
         a.download = `related-records-${ts}.csv`;
         a.click();
         URL.revokeObjectURL(url);
-        toast(`Exported ${rows.length - 1} records ✓`, "success");
+        toast("Export complete ✓", "success");
 
     } catch (e) {
         console.error(e);
@@ -344,6 +286,7 @@ async function loadFileView(area) {
     const d = await r.json();
     const tot = d.total_files, tp = Math.ceil(tot / FS), st = (page - 1) * FS;
     setRI(tot, st, Math.min(st + FS, tot), "file");
+    if (d.pending_files) toast(`${d.pending_files} older file${d.pending_files !== 1 ? "s are" : " is"} still being summarised and will appear shortly`, "info");
 
     if (!d.files.length) {
         area.innerHTML = emptyHTML("No files with related records", "No duplicate contacts found in any file with the current filters.");
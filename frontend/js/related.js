@@ -80,6 +80,13 @@ async function loadStats() {
         const res = await authFetch(`/related-grouped-stats?upload_id=${uploadId}`);
         if (!res.ok) throw new Error("Failed to load grouped stats");
         const stats = await res.json();
+        if (stats.summary_status === "pending") {
+            // Older upload: the server is summarising it in the background
+            ["statDuplicateEmails", "statDuplicatePhones", "statBoth"]
+                .forEach(id => document.getElementById(id).innerText = "…");
+            setTimeout(loadStats, 5000);
+            return;
+        }
         document.getElementById("statDuplicateEmails").innerText = stats.email_records;
         document.getElementById("statEmailRecords").innerText = `${stats.email_groups} groups`;
         document.getElementById("statDuplicatePhones").innerText = stats.phone_records;
@@ -13,6 +13,9 @@ let selectedFiles = []; // Changed to array for multiple files
 let categoriesCache = [];
 let allUploads = [];
 let filteredUploads = [];
+// Keyset cursors: pageCursors[n - 1] is the cursor that loads page n
+let pageCursors = JSON.parse(sessionStorage.getItem("uploadPageCursors") || "[null]");
+let hasNextPage = false;
 let selectedUserId = null;
 let selectedCategoryId = null;
 const PAGE_SIZE = 10;
@@ -613,31 +616,8 @@ async function upload() {
         progressText.textContent = `Uploading file ${i + 1}/${selectedFiles.length}: ${file.name}`;
 
         const uploadId = Date.now() * 1000 + i; // Unique ID for each file
-        const sseUrl = `/upload-progress/${uploadId}?token=${localStorage.getItem("access_token")}`;
-        const eventSource = new EventSource(sseUrl);
 
         const uploadSuccess = await new Promise((resolve) => {
-            eventSource.onmessage = (e) => {
-                try {
-                    const data = JSON.parse(e.data);
-                    const pct = data.percent || 0;
-                    progressFill.style.width = pct + "%";
-                    progressText.textContent = `Uploading file ${i + 1}/${selectedFiles.length}: ${file.name} (${pct}%)`;
-                    if (data.status === "done") {
-                        progressFill.style.width = "100%";
-                        eventSource.close();
-                    }
-                    if (data.status === "error") {
-                        eventSource.close();
-                        resolve(false);
-                    }
-                } catch (err) { console.error("SSE parse error:", err); }
-            };
-            eventSource.onerror = () => {
-                eventSource.close();
-                resolve(false);
-            };
-
             // Send file
             (async () => {
                 try {
@@ -647,7 +627,6 @@ async function upload() {
                         `/upload?category_id=${categorySelect.value}&upload_id_hint=${uploadId}`,
                         { method: "POST", body: fd }
                     );
-                    eventSource.close();
 
                     if (res.status === 409) {
                         failedFiles.push(`${file.name} (already uploaded)`);
@@ -673,8 +652,9 @@ async function upload() {
                     }
                     if (result.success) {
                         successCount++;
+                        progressFill.style.width = "100%";
                         if (result.status === "processing") {
-                            pollUploadStatus(result.upload_id);
+                            trackUpload(result.upload_id, file.name);
                         }
                         resolve(true);
                     } else {
@@ -682,7 +662,6 @@ async function upload() {
                         resolve(false);
                     }
                 } catch (err) {
-                    eventSource.close();
                     failedFiles.push(`${file.name} (network error)`);
                     failureCount++;
                     resolve(false);
@@ -713,28 +692,86 @@ async function upload() {
     checkUploadReady();
 }
 
-function pollUploadStatus(uploadId) {
-    const maxAttempts = 120;
-    let attempts = 0;
-    const interval = setInterval(async () => {
-        attempts++;
-        if (attempts > maxAttempts) { clearInterval(interval); return; }
-        try {
-            const res = await authFetch(`/upload/${uploadId}/status`);
-            if (!res.ok) { clearInterval(interval); return; }
-            const data = await res.json();
-            if (data.processing_status === "ready") {
-                clearInterval(interval);
-                showToast(`✅ Processing complete! ${fmtNum(data.total_records)} records ready.`, "success", 4000);
-                loadUploads();
-                loadCategories();
-            } else if (data.processing_status === "failed") {
-                clearInterval(interval);
-                showToast("❌ File processing failed. Please try again.", "error", 5000);
-                loadUploads();
-            }
-        } catch (err) { clearInterval(interval); }
-    }, 5000);
+// ─── PROCESSING PROGRESS ──────────────────────────────────────────────────────
+// One EventSource carries progress for all of this user's uploads. A batched
+// status call every 15 s catches anything the stream missed.
+const pendingUploads = new Map(); // upload_id -> file name
+let progressSource = null;
+let statusTimer = null;
+let refreshTimer = null;
+
+function trackUpload(uploadId, fileName) {
+    pendingUploads.set(String(uploadId), fileName);
+    if (!progressSource) {
+        progressSource = new EventSource(`/upload-progress?token=${localStorage.getItem("access_token")}`);
+        progressSource.onmessage = (e) => {
+            try { handleProgressEvent(JSON.parse(e.data)); }
+            catch (err) { console.error("SSE parse error:", err); }
+        };
+    }
+    if (!statusTimer) statusTimer = setInterval(checkPendingUploads, 15000);
+}
+
+function handleProgressEvent(data) {
+    const id = String(data.upload_id);
+    if (!pendingUploads.has(id)) return;
+    if (data.status === "done") finishUpload(id, "ready", data.message);
+    else if (data.status === "error") finishUpload(id, "failed");
+    else updateProgressBadge(id, data);
+}
+
+function updateProgressBadge(id, data) {
+    const badge = document.getElementById(`progress-${id}`);
+    if (!badge) return;
+    if (data.queue_position) {
+        const eta = data.eta_seconds < 60 ? "<1 min" : `~${Math.round(data.eta_seconds / 60)} min`;
+        badge.textContent = `⏳ Queued #${data.queue_position} · ${eta}`;
+    } else if (data.status === "processing") {
+        badge.textContent = `⏳ Processing ${data.percent}%`;
+    }
+    badge.title = data.message || "";
+}
+
+async function checkPendingUploads() {
+    if (pendingUploads.size === 0) { stopTracking(); return; }
+    try {
+        const res = await authFetch("/uploads/status", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ upload_ids: [...pendingUploads.keys()].map(Number) })
+        });
+        if (!res.ok) return;
+        const rows = await res.json();
+        rows.forEach(r => {
+            const id = String(r.upload_id);
+            if (r.processing_status === "ready") finishUpload(id, "ready", `${fmtNum(r.total_records)} records ready`);
+            else if (r.processing_status === "failed") finishUpload(id, "failed");
+        });
+    } catch (err) { console.error("Status check failed:", err); }
+}
+
+function finishUpload(id, outcome, message) {
+    const fileName = pendingUploads.get(id);
+    if (fileName === undefined) return;
+    pendingUploads.delete(id);
+
+    if (outcome === "ready") {
+        showToast(`✅ Processing complete! ${fileName}: ${message}.`, "success", 4000);
+    } else {
+        showToast(`❌ Processing failed for ${fileName}. Please try again.`, "error", 5000);
+    }
+
+    // Many files can finish together — refresh the lists once
+    clearTimeout(refreshTimer);
+    refreshTimer = setTimeout(() => { loadUploads(); loadCategories(); }, 1000);
+
+    if (pendingUploads.size === 0) stopTracking();
+}
+
+function stopTracking() {
+    clearInterval(statusTimer);
+    statusTimer = null;
+    if (progressSource) { progressSource.close(); progressSource = null; }
 }
 
 function clearUploadFields() {
@@ -877,14 +914,33 @@ async function loadUploads(showSkeleton = false) {
         });
     }
 
-    const url = "/uploads" + (params.toString() ? "?" + params.toString() : "");
+    // A cursor is a position in upload order; without one for this page
+    // (e.g. a stale URL) fall back to the first page
+    if (page > 1 && !pageCursors[page - 1]) page = 1;
+    if (page === 1) pageCursors = [null];
+    params.append("limit", PAGE_SIZE);
+    if (pageCursors[page - 1]) params.append("cursor", pageCursors[page - 1]);
+
+    const url = "/uploads?" + params.toString();
 
     try {
         const res = await authFetch(url);
         if (!res.ok) { showToast("Failed to load uploads", "error"); tableSkeleton.style.display = "none"; return; }
 
-        allUploads = await res.json();
+        const result = await res.json();
+        if (result.uploads.length === 0 && page > 1) {
+            // Last row of this page went away (e.g. deleted) — step back
+            page--;
+            updateURL();
+            return loadUploads(showSkeleton);
+        }
+
+        allUploads = result.uploads;
         filteredUploads = [...allUploads];
+        hasNextPage = !!result.next_cursor;
+        pageCursors = pageCursors.slice(0, page);
+        if (hasNextPage) pageCursors.push(result.next_cursor);
+        sessionStorage.setItem("uploadPageCursors", JSON.stringify(pageCursors));
         tableSkeleton.style.display = "none";
         clearSelection();
 
@@ -940,9 +996,7 @@ function fmtDate(dateStr) {
 
 // ─── RENDER TABLE ─────────────────────────────────────────────────────────────
 function renderTable() {
-    const totalPages = Math.ceil(filteredUploads.length / PAGE_SIZE);
-    const start = (page - 1) * PAGE_SIZE;
-    const data = filteredUploads.slice(start, start + PAGE_SIZE);
+    const data = filteredUploads;
 
     const pageIds = data.map(r => r.upload_id);
     const allPageSelected = pageIds.length > 0 && pageIds.every(id => selectedUploadIds.has(id));
@@ -981,7 +1035,7 @@ function renderTable() {
 
         let totalCell, totalAttr = "";
         if (isProcessing) {
-            totalCell = '<span class="processing-badge">⏳ Processing...</span>';
+            totalCell = `<span class="processing-badge" id="progress-${r.upload_id}">⏳ Processing...</span>`;
         } else if (isFailed) {
             totalCell = '<span class="failed-badge">❌ Failed</span>';
         } else {
@@ -1042,15 +1096,13 @@ function renderTable() {
 
     html += `</tbody>`;
     uploadTable.innerHTML = html;
-    renderPagination(totalPages);
+    renderPagination();
     updateBulkBar();
 }
 
 // ─── BULK SELECT ──────────────────────────────────────────────────────────────
 function toggleSelectAll(checkbox) {
-    const start = (page - 1) * PAGE_SIZE;
-    const data = filteredUploads.slice(start, start + PAGE_SIZE);
-    data.forEach(r => {
+    filteredUploads.forEach(r => {
         const canDelete = currentUser.role === "admin" || r.created_by_user_id === currentUser.id;
         if (!canDelete) return;
         if (checkbox.checked) selectedUploadIds.add(r.upload_id);
@@ -1070,9 +1122,7 @@ function toggleRowSelect(checkbox, uploadId) {
     else selectedUploadIds.delete(uploadId);
     const row = document.getElementById(`row-${uploadId}`);
     if (row) row.classList.toggle("row-selected", checkbox.checked);
-    const start = (page - 1) * PAGE_SIZE;
-    const data = filteredUploads.slice(start, start + PAGE_SIZE);
-    const allSelected = data.map(r => r.upload_id).every(id => selectedUploadIds.has(id));
+    const allSelected = filteredUploads.map(r => r.upload_id).every(id => selectedUploadIds.has(id));
     const selectAll = document.getElementById("selectAllCheckbox");
     if (selectAll) selectAll.checked = allSelected;
     updateBulkBar();
@@ -1121,26 +1171,45 @@ async function bulkDelete() {
     }
 }
 
+async function bulkExport() {
+    const ids = Array.from(selectedUploadIds);
+    if (ids.length === 0) return;
+    // The browser downloads the link itself, so the ZIP streams to disk
+    // instead of being buffered here; it can't send our Authorization
+    // header, hence the short-lived download token.
+    const res = await authFetch("/export/download-token", { method: "POST" });
+    if (!res || !res.ok) {
+        showToast("Export failed", "error");
+        return;
+    }
+    const { token: downloadToken } = await res.json();
+    const params = new URLSearchParams();
+    ids.forEach(id => params.append("upload_ids", id));
+    params.append("token", downloadToken);
+    showToast(`Preparing ZIP of ${ids.length} file${ids.length !== 1 ? "s" : ""}...`, "success", 2500);
+    const a = document.createElement("a");
+    a.href = `/export/zip?${params.toString()}`;
+    a.download = "uploads.zip";
+    document.body.appendChild(a);
+    a.click();
+    a.remove();
+}
+
 // ─── PAGINATION ───────────────────────────────────────────────────────────────
-function renderPagination(totalPages) {
+function renderPagination() {
     pagination.innerHTML = "";
-    if (totalPages <= 1) return;
+    if (page === 1 && !hasNextPage) return;
     const prev = document.createElement("button");
     prev.innerText = "Previous";
     prev.disabled = page === 1;
-    prev.onclick = () => { page--; updateURL(); renderTable(); window.scrollTo({ top: 0, behavior: "smooth" }); };
+    prev.onclick = () => goToPage(page - 1);
     pagination.appendChild(prev);
-    let start = Math.max(1, page - 2);
-    let end = Math.min(totalPages, page + 2);
-    if (start > 1) addPage(1);
-    if (start > 2) pagination.append(document.createTextNode("..."));
-    for (let i = start; i <= end; i++) addPage(i);
-    if (end < totalPages - 1) pagination.append(document.createTextNode("..."));
-    if (end < totalPages) addPage(totalPages);
+    for (let i = Math.max(1, page - 2); i <= page; i++) addPage(i);
+    if (hasNextPage) addPage(page + 1);
     const next = document.createElement("button");
     next.innerText = "Next";
-    next.disabled = page === totalPages;
-    next.onclick = () => { page++; updateURL(); renderTable(); window.scrollTo({ top: 0, behavior: "smooth" }); };
+    next.disabled = !hasNextPage;
+    next.onclick = () => goToPage(page + 1);
     pagination.appendChild(next);
 }
 
@@ -1148,10 +1217,17 @@ function addPage(n) {
     const b = document.createElement("button");
     b.innerText = n;
     if (n === page) b.classList.add("active");
-    b.onclick = () => { page = n; updateURL(); renderTable(); window.scrollTo({ top: 0, behavior: "smooth" }); };
+    b.onclick = () => goToPage(n);
     pagination.appendChild(b);
 }
 
+function goToPage(n) {
+    page = n;
+    updateURL();
+    loadUploads();
+    window.scrollTo({ top: 0, behavior: "smooth" });
+}
+
 // ─── CATEGORY CRUD ────────────────────────────────────────────────────────────
 async function renameCategory(id, oldName) {
     const name = prompt("Rename category", oldName);
@@ -1309,7 +1385,7 @@ function updateURL() {
 
 function resumePollingForProcessingFiles() {
     const processing = allUploads.filter(r => r.processing_status === 'processing');
-    processing.forEach(r => pollUploadStatus(r.upload_id));
+    processing.forEach(r => trackUpload(r.upload_id, r.filename));
 }
 
 function fmtNum(n) {